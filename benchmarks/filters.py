@@ -0,0 +1,103 @@
+"""Filter throughput with 100 handlers.
+
+Evaluates the filters of 100 message handlers against a stream of messages,
+once through the synchronous fast path the dispatcher uses for pure filters
+and once with every predicate turned into a coroutine, as the built-in
+filters used to be.
+
+    python benchmarks/filters.py [messages]
+"""
+
+import asyncio
+import sys
+import time
+
+from pyrobale import filters
+from pyrobale.objects import Message
+from pyrobale.objects.utils import pythonize
+
+
+def make_handlers(count: int = 100):
+    expressions = []
+    for i in range(count):
+        kind = i % 5
+        if kind == 0:
+            expressions.append(filters.combine(filters.private, filters.equals(f"word{i}")))
+        elif kind == 1:
+            expressions.append(filters.combine(filters.text & filters.startswith(f"/cmd{i}")))
+        elif kind == 2:
+            expressions.append(filters.combine(filters.group | filters.digit))
+        elif kind == 3:
+            expressions.append(filters.combine(~filters.photo, filters.regex(rf"^item{i}\b")))
+        else:
+            expressions.append(filters.combine(filters.text, filters.equals([f"a{i}", f"b{i}", f"c{i}"])))
+    return expressions
+
+
+def as_coroutines(expression):
+    """Rebuilds an expression with every predicate wrapped in a coroutine function."""
+    if isinstance(expression, filters.Not):
+        return filters.Not(as_coroutines(expression.children[0]))
+    if isinstance(expression, (filters.And, filters.Or)):
+        return type(expression)(*map(as_coroutines, expression.children))
+    func = expression.func
+
+    async def check(event, client):
+        return func(event, client)
+    return filters.Filter(check, expression.inv, memoize=False)
+
+
+def make_messages(count: int):
+    messages = []
+    for i in range(count):
+        raw = {
+            "message_id": i,
+            "date": 0,
+            "chat": {"id": i, "type": "private" if i % 2 else "group"},
+            "from": {"id": i, "is_bot": False, "first_name": "user"},
+            "text": f"word{i % 100}" if i % 3 else str(i),
+        }
+        messages.append(Message(**pythonize(raw)))
+    return messages
+
+
+def run_sync(expressions, messages) -> int:
+    passed = 0
+    for message in messages:
+        for expression in expressions:
+            if expression.check_nowait(message):
+                passed += 1
+    return passed
+
+
+async def run_async(expressions, messages) -> int:
+    passed = 0
+    for message in messages:
+        for expression in expressions:
+            if await expression.evaluate(message):
+                passed += 1
+    return passed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    expressions = make_handlers()
+    messages = make_messages(count)
+    checks = count * len(expressions)
+
+    start = time.perf_counter()
+    passed_sync = run_sync(expressions, messages)
+    sync_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    passed_async = asyncio.run(run_async([as_coroutines(e) for e in expressions], messages))
+    async_elapsed = time.perf_counter() - start
+
+    assert passed_sync == passed_async
+    print(f"{count} messages x {len(expressions)} handlers, {passed_sync} matches")
+    print(f"sync fast path: {checks / sync_elapsed:12,.0f} checks/s  {sync_elapsed * 1e6 / count:8.1f} us/message")
+    print(f"coroutines:     {checks / async_elapsed:12,.0f} checks/s  {async_elapsed * 1e6 / count:8.1f} us/message")
+
+
+if __name__ == "__main__":
+    main()
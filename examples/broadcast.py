@@ -0,0 +1,25 @@
+from pyrobale import Client, Message
+from pyrobale.StateMachine import SQLiteStorage
+
+bot = Client("YOUR_BOT_TOKEN")
+
+ADMIN_ID = 123456789
+USER_IDS = range(1000, 2000)
+
+
+@bot.on_command("broadcast")
+async def broadcast(message: Message):
+    if message.user.id != ADMIN_ID:
+        return
+    # running /broadcast again after a restart resumes job "news-1"
+    report = await bot.broadcast(
+        USER_IDS,
+        "We have news!",
+        job_id="news-1",
+        storage=SQLiteStorage("broadcasts.db"),
+        rate=20,
+    )
+    await message.reply(f"sent {report.sent}, handled {report.processed} at {report.throughput:.1f}/s")
+
+
+bot.run()
@@ -0,0 +1,23 @@
+import hashlib
+
+from pyrobale import Client, Message
+
+bot = Client("YOUR_BOT_TOKEN", process_workers=4)
+
+
+@bot.on_command("hash", process=True)
+def slow_hash(message: Message):
+    # runs on a worker process, the reply is sent by the bot's process
+    digest = (message.text or "").encode()
+    for _ in range(1_000_000):
+        digest = hashlib.sha256(digest).digest()
+    message.reply(digest.hex())
+
+
+@bot.on_command("ping")
+def ping(message: Message):
+    message.reply("pong")
+
+
+if __name__ == "__main__":
+    bot.run()
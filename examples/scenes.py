@@ -0,0 +1,27 @@
+from pyrobale import Client, Message
+
+bot = Client("YOUR_BOT_TOKEN")
+
+signup = bot.scene("signup", ttl=120)
+
+
+@bot.on_command("start")
+async def start(message: Message):
+    await message.reply("what's your name?")
+    bot.enter_scene(message.user, signup)
+
+
+@signup.step("name")
+async def name(message: Message, ctx):
+    ctx.update_data(name=message.text)
+    await message.reply("how old are you?")
+    ctx.next()
+
+
+@signup.step("age")
+async def age(message: Message, ctx):
+    await message.reply(f"Hi {ctx.data['name']}, you are {message.text}!")
+    ctx.finish()
+
+
+bot.run()
@@ -0,0 +1,20 @@
+from pyrobale import Client, Message
+from pyrobale.sharding import run_sharded
+
+
+def make_bot() -> Client:
+    bot = Client("YOUR_BOT_TOKEN")
+
+    @bot.on_message()
+    def word_count(message: Message):
+        # CPU bound work runs on the worker process of the chat
+        counts = {}
+        for word in (message.text or "").split():
+            counts[word] = counts.get(word, 0) + 1
+        message.reply(str(counts))
+
+    return bot
+
+
+if __name__ == "__main__":
+    run_sharded(make_bot, workers=4)
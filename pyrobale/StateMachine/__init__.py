@@ -1,22 +1,219 @@
-from typing import Union, TYPE_CHECKING
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, TYPE_CHECKING
+import asyncio
+import heapq
+import inspect
+import os
+import threading
+import time
+
+from .storage import (
+    BaseStorage,
+    MemoryStorage,
+    WriteBehindStorage,
+    SQLiteStorage,
+    AppendOnlyLogStorage,
+    RedisStorage,
+    normalize_key,
+    _MISSING,
+)
+from . import serializer
+from .scenes import Scene, SceneContext, SceneManager
+from ..log import get_logger
 
 if TYPE_CHECKING:
     from ..objects import User
     from ..client import Client
 
 
+log = get_logger("state")
+
+_DEFAULT = object()
+
+
 class StateMachine:
-    def __init__(self):
-        self.__states = {}
+    """Keeps the state and data of users.
+
+    States can expire after a time to live and the number of tracked users
+    can be bounded, evicting the least recently used ones. Expiry times are
+    kept in a heap, so finding due states never scans all users, and in the
+    "expires" namespace of the storage, so states loaded by :meth:`open`
+    keep their remaining time to live.
+
+    Next to its state every user, chat or user in a chat can have a
+    dictionary of data, like the answers of a form. Data is stored
+    serialized with msgpack (or pickle when msgpack is not installed), so
+    values read from the storage are copies and can be changed freely.
+
+    Args:
+        storage (BaseStorage, optional): where states are kept. Defaults to a MemoryStorage
+        ttl (float, optional): default seconds a state lives after it was set. Defaults to None (forever)
+        max_size (int, optional): maximum number of users with a state, least recently used ones are evicted. Defaults to None
+        on_expire (Callable, optional): called with ``(user_id, state, reason)`` when a state expires
+            ("expired") or is evicted ("evicted"). Can be a coroutine function
+        sweep_interval (float, optional): seconds between checks for expired states. Defaults to 1
+        data_storage (BaseStorage, optional): where data is kept. Defaults to the "data" namespace of storage
+    """
+
+    def __init__(self, storage: Optional[BaseStorage] = None, ttl: Optional[float] = None,
+                 max_size: Optional[int] = None, on_expire: Optional[Callable] = None,
+                 sweep_interval: float = 1.0, data_storage: Optional[BaseStorage] = None):
+        self.storage = storage if storage is not None else MemoryStorage()
+        if data_storage is None:
+            try:
+                data_storage = self.storage.namespace("data")
+            except NotImplementedError:
+                data_storage = MemoryStorage()
+        self.data_storage = data_storage
+        try:
+            self.expiry_storage = self.storage.namespace("expires")
+        except NotImplementedError:
+            self.expiry_storage = MemoryStorage()
+        self.ttl = ttl
+        self.max_size = max_size
+        self.on_expire = on_expire
+        self.sweep_interval = sweep_interval
+        self._lru: "OrderedDict[Any, None]" = OrderedDict()
+        self._expires: Dict[Any, float] = {}
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._counter = 0
+        self._lock = threading.RLock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._callback_tasks: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def loaded(self) -> bool:
+        """Whether :meth:`open` loaded the states, so the in-memory index answers lookups"""
+        return self._loop is not None
+
+    def _forget_expiry(self, key) -> None:
+        if self._expires.pop(key, None) is not None:
+            self.expiry_storage.delete_nowait(key)
+
+    def _track(self, key, ttl, persist: bool = True) -> None:
+        with self._lock:
+            if self.max_size is not None:
+                self._lru[key] = None
+                self._lru.move_to_end(key)
+            if ttl is _DEFAULT:
+                ttl = self.ttl
+            if ttl is None:
+                self._forget_expiry(key)
+            else:
+                expires_at = time.monotonic() + ttl
+                if persist:
+                    # wall clock time, monotonic clocks restart with the process
+                    self.expiry_storage.set_nowait(key, time.time() + ttl)
+                self._expires[key] = expires_at
+                self._counter += 1
+                heapq.heappush(self._heap, (expires_at, self._counter, key))
+                if len(self._heap) > 2 * len(self._expires) + 1024:
+                    # drop entries of states that were set again or deleted
+                    self._heap = [entry for entry in self._heap if self._expires.get(entry[2]) == entry[0]]
+                    heapq.heapify(self._heap)
+            evicted = []
+            if self.max_size is not None:
+                while len(self._lru) > self.max_size:
+                    oldest, _ = self._lru.popitem(last=False)
+                    self._forget_expiry(oldest)
+                    evicted.append(oldest)
+        for oldest in evicted:
+            self._drop(oldest, "evicted")
+
+    def _untrack(self, key) -> None:
+        with self._lock:
+            self._lru.pop(key, None)
+            self._forget_expiry(key)
 
-    def set_state(self, user_id: Union[str, int], state: str):
+    def _touch(self, key) -> bool:
+        """Marks a key as used. Returns False if its state has expired."""
+        with self._lock:
+            expires_at = self._expires.get(key)
+            if expires_at is not None and expires_at <= time.monotonic():
+                expired = True
+            else:
+                expired = False
+                if self.max_size is not None and key in self._lru:
+                    self._lru.move_to_end(key)
+        if expired:
+            self._untrack(key)
+            self._drop(key, "expired")
+        return not expired
+
+    def _drop(self, key, reason: str) -> None:
+        state = self.storage.get_nowait(key, _MISSING)
+        self.storage.delete_nowait(key)
+        if state is not _MISSING and self.on_expire is not None:
+            self._notify(key, state, reason)
+
+    def _notify(self, key, state, reason: str) -> None:
+        try:
+            result = self.on_expire(key, state, reason)
+            if inspect.isawaitable(result):
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    # expired from a sync handler running in a worker thread
+                    if self._loop is None:
+                        raise
+                    asyncio.run_coroutine_threadsafe(result, self._loop)
+                    return
+                task = loop.create_task(result)
+                self._callback_tasks.add(task)
+                task.add_done_callback(self._callback_tasks.discard)
+        except Exception as e:
+            log.exception("Error in state expiry callback: %s", e)
+
+    def expire_due(self) -> int:
+        """Removes every state whose time to live has passed
+
+        Returns:
+            int: number of expired states
+        """
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, _, key = heapq.heappop(self._heap)
+                # skip entries replaced by a later set_state or deleted
+                if self._expires.get(key) == expires_at:
+                    self._forget_expiry(key)
+                    self._lru.pop(key, None)
+                    due.append(key)
+        for key in due:
+            self._drop(key, "expired")
+        return len(due)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.expire_due()
+
+    def set_state(self, user_id: Union[str, int], state: str, ttl: Optional[float] = _DEFAULT):
         """Sets or updates state of a user
 
         Args:
             user_id (string OR integer): unique id of user for setting the state
             state (string): state of user (it can be anything)
+            ttl (float, optional): seconds the state lives, None for forever. Defaults to the ttl of the state machine
         """
-        self.__states[user_id] = state
+        key = normalize_key(user_id)
+        self.storage.set_nowait(key, state)
+        self._track(key, ttl)
+
+    def restore_ttl(self, user_id: Union[str, int], ttl: Optional[float]):
+        """Gives a loaded state a ttl counted from now, unless its expiry was persisted
+
+        Only the in-memory expiry is set, the state is not written again.
+
+        Args:
+            user_id (string OR integer): unique id of user
+            ttl (float): seconds the state lives, None for forever
+        """
+        key = normalize_key(user_id)
+        if self.expiry_storage.get_nowait(key) is None:
+            self._track(key, ttl, persist=False)
 
     def get_state(self, user_id: Union[str, int]) -> str:
         """Gets state of a specified user
@@ -27,11 +224,11 @@ class StateMachine:
         Returns:
             Str: the state of user
         """
-
-        if user_id in self.__states:
-            return self.__states[user_id]
-        else:
-            raise KeyError
+        key = normalize_key(user_id)
+        state = self.storage.get_nowait(key, _MISSING)
+        if state is _MISSING or not self._touch(key):
+            raise KeyError(user_id)
+        return state
 
     def del_state(self, user_id: Union[str, int]):
         """Deletes the saved state of user
@@ -39,11 +236,214 @@ class StateMachine:
         Args:
             user_id (string OR integer): unique if of user to delete its state
         """
-        if user_id in self.__states:
-            del self.__states[user_id]
+        key = normalize_key(user_id)
+        self._untrack(key)
+        if not self.storage.delete_nowait(key):
+            raise KeyError(user_id)
+
+    async def fetch_state(self, user_id: Union[str, int], default: Optional[str] = None) -> Optional[str]:
+        """Gets state of a user through the async storage interface
+
+        Args:
+            user_id (string OR integer): unique id of user for getting the state
+            default (string, optional): returned when the user has no state
+
+        Returns:
+            Str: the state of user
+        """
+        key = normalize_key(user_id)
+        state = await self.storage.get(key, _MISSING)
+        if state is _MISSING or not self._touch(key):
+            return default
+        return state
+
+    @staticmethod
+    def _data_key(user_id: Optional[Union[str, int]], chat_id: Optional[Union[str, int]]) -> Union[str, int]:
+        if chat_id is None:
+            if user_id is None:
+                raise ValueError("user_id or chat_id is required")
+            return normalize_key(user_id)
+        if user_id is None:
+            return f"chat:{chat_id}"
+        return f"{chat_id}:{user_id}"
+
+    def _read_data(self, key) -> Dict[str, Any]:
+        raw = self.data_storage.get_nowait(key)
+        return {} if raw is None else serializer.loads(raw)
+
+    def _write_data(self, key, data: Dict[str, Any]) -> None:
+        if data:
+            self.data_storage.set_nowait(key, serializer.dumps(data))
         else:
-            raise KeyError
-    
+            self.data_storage.delete_nowait(key)
+
+    def get_data(self, user_id: Optional[Union[str, int]] = None,
+                 chat_id: Optional[Union[str, int]] = None) -> Dict[str, Any]:
+        """Gets the data of a user, a chat or a user in a chat
+
+        Args:
+            user_id (string OR integer, optional): unique id of user
+            chat_id (string OR integer, optional): unique id of chat
+
+        Returns:
+            dict: a copy of the data, empty if nothing was saved
+        """
+        return self._read_data(self._data_key(user_id, chat_id))
+
+    def set_data(self, data: Dict[str, Any], user_id: Optional[Union[str, int]] = None,
+                 chat_id: Optional[Union[str, int]] = None):
+        """Replaces the data of a user, a chat or a user in a chat
+
+        Args:
+            data (dict): the new data, an empty dict deletes it
+            user_id (string OR integer, optional): unique id of user
+            chat_id (string OR integer, optional): unique id of chat
+        """
+        key = self._data_key(user_id, chat_id)
+        with self._lock:
+            self._write_data(key, dict(data))
+
+    def update_data(self, user_id: Optional[Union[str, int]] = None, chat_id: Optional[Union[str, int]] = None,
+                    **fields) -> Dict[str, Any]:
+        """Changes some fields of the data of a user, a chat or a user in a chat
+
+        Args:
+            user_id (string OR integer, optional): unique id of user
+            chat_id (string OR integer, optional): unique id of chat
+            **fields: the fields to set
+
+        Returns:
+            dict: the data after the update
+        """
+        key = self._data_key(user_id, chat_id)
+        with self._lock:
+            data = self._read_data(key)
+            data.update(fields)
+            self._write_data(key, data)
+        return data
+
+    def del_data(self, user_id: Optional[Union[str, int]] = None, chat_id: Optional[Union[str, int]] = None) -> bool:
+        """Deletes the data of a user, a chat or a user in a chat
+
+        Args:
+            user_id (string OR integer, optional): unique id of user
+            chat_id (string OR integer, optional): unique id of chat
+
+        Returns:
+            bool: whether there was data to delete
+        """
+        return self.data_storage.delete_nowait(self._data_key(user_id, chat_id))
+
+    def compare_and_set(self, expected: Optional[Dict[str, Any]], new: Dict[str, Any],
+                        user_id: Optional[Union[str, int]] = None,
+                        chat_id: Optional[Union[str, int]] = None) -> bool:
+        """Replaces the data only if it still equals the expected data
+
+        Handlers running concurrently for the same user can use it to avoid
+        overwriting each other's changes.
+
+        Args:
+            expected (dict): the data read before computing the new data, None or {} for no data
+            new (dict): the new data
+            user_id (string OR integer, optional): unique id of user
+            chat_id (string OR integer, optional): unique id of chat
+
+        Returns:
+            bool: whether the data was replaced
+        """
+        key = self._data_key(user_id, chat_id)
+        with self._lock:
+            if self._read_data(key) != (expected or {}):
+                return False
+            self._write_data(key, dict(new))
+        return True
+
+    async def fetch_data(self, user_id: Optional[Union[str, int]] = None,
+                         chat_id: Optional[Union[str, int]] = None) -> Dict[str, Any]:
+        """Gets the data through the async storage interface
+
+        Args:
+            user_id (string OR integer, optional): unique id of user
+            chat_id (string OR integer, optional): unique id of chat
+
+        Returns:
+            dict: a copy of the data, empty if nothing was saved
+        """
+        raw = await self.data_storage.get(self._data_key(user_id, chat_id))
+        return {} if raw is None else serializer.loads(raw)
+
+    def save_snapshot(self, file_name: str):
+        """Saves all states and data to a file
+
+        The snapshot is written to a temporary file first and then moved
+        over the old one, so a crash never leaves a half written snapshot.
+
+        Args:
+            file_name (string): name of the snapshot file
+        """
+        with self._lock:
+            snapshot = {"states": dict(self.storage.items()), "data": dict(self.data_storage.items())}
+        temp_name = f"{file_name}.tmp"
+        with open(temp_name, "wb") as f:
+            f.write(serializer.dumps(snapshot))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, file_name)
+
+    def load_snapshot(self, file_name: str):
+        """Loads states and data saved by :meth:`save_snapshot`
+
+        Args:
+            file_name (string): name of the snapshot file
+        """
+        with open(file_name, "rb") as f:
+            snapshot = serializer.loads(f.read())
+        for key, state in snapshot["states"].items():
+            self.storage.set_nowait(normalize_key(key), state)
+            self._track(normalize_key(key), _DEFAULT)
+        for key, raw in snapshot["data"].items():
+            self.data_storage.set_nowait(normalize_key(key), raw)
+
+    async def open(self):
+        """Loads persisted states from the storage and starts expiring states
+
+        Loaded states keep their persisted expiry, states whose ttl passed
+        meanwhile expire. States without one get the default ttl counted from now.
+        """
+        await self.storage.open()
+        await self.data_storage.open()
+        await self.expiry_storage.open()
+        wall_now, now = time.time(), time.monotonic()
+        for key, _ in self.storage.items():
+            expires_at = self.expiry_storage.get_nowait(key)
+            if expires_at is not None:
+                self._track(key, float(expires_at) - wall_now, persist=False)
+            elif self.ttl is not None or self.max_size is not None:
+                self._track(key, _DEFAULT, persist=False)
+        for key, _ in self.expiry_storage.items():
+            # the state was deleted by another process
+            if key not in self._expires:
+                self.expiry_storage.delete_nowait(key)
+        self.expire_due()
+        self._loop = asyncio.get_running_loop()
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = self._loop.create_task(self._sweep())
+
+    async def flush(self):
+        """Writes pending state and data changes to the storage"""
+        await self.storage.flush()
+        await self.data_storage.flush()
+        await self.expiry_storage.flush()
+
+    async def close(self):
+        """Stops expiring states, flushes pending changes and closes the storage"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        await self.storage.close()
+        await self.data_storage.close()
+        await self.expiry_storage.close()
+
     def save_local(self, file_name: str):
         """Saves the state of all users to a file
 
@@ -51,9 +451,9 @@ class StateMachine:
             file_name (string): name of file to save the state of users
         """
         with open(file_name, "w") as f:
-            for user_id, state in self.__states.items():
+            for user_id, state in self.storage.items():
                 f.write(f"{user_id} {state}\n")
-    
+
     def load_local(self, file_name: str):
         """Loads the state of all users from a file
 
@@ -62,5 +462,5 @@ class StateMachine:
         """
         with open(file_name, "r") as f:
             for line in f:
-                user_id, state = line.split()
-                self.__states[user_id] = state
\ No newline at end of file
+                user_id, state = line.rstrip("\n").split(" ", 1)
+                self.storage.set_nowait(normalize_key(user_id), state)
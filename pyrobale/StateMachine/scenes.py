@@ -0,0 +1,351 @@
+"""Multi-step conversations routed by user state.
+
+A :class:`Scene` is a set of steps, each one a handler registered for a
+state. While a user is at a step their state is ``"<scene>:<step>"``, so
+routing an update is a state lookup followed by a dictionary lookup; no
+coroutine or future is kept alive per conversation, and conversations
+survive restarts when the state machine uses a persistent storage.
+"""
+
+from typing import Any, Callable, Dict, Optional, Tuple, Union, TYPE_CHECKING
+import inspect
+
+from ..objects.enums import UpdatesTypes
+from ..filters import combine
+from ..log import get_logger
+
+if TYPE_CHECKING:
+    from ..client import Client
+
+
+log = get_logger("scenes")
+
+_INHERIT = object()
+
+_UPDATE_KEYS = (
+    ("message", UpdatesTypes.MESSAGE),
+    ("callback_query", UpdatesTypes.CALLBACK_QUERY),
+    ("edited_message", UpdatesTypes.MESSAGE_EDITED),
+)
+
+
+class Scene:
+    """A conversation made of steps.
+
+    Args:
+        name (str): unique name of the scene, used as prefix of the states
+        ttl (float, optional): seconds a user can stay at a step. Defaults to None (the state machine's ttl)
+        on_timeout (Callable, optional): called with a :class:`SceneContext` when a user stays at a step
+            longer than its ttl. Can be a coroutine function
+        pass_commands (bool, optional): let messages starting with "/" reach the regular handlers,
+            so commands like /cancel keep working inside the scene. Defaults to True
+
+    Example:
+        >>> signup = Scene("signup", ttl=300)
+        >>> @signup.step("name")
+        ... async def ask_age(message, ctx):
+        ...     ctx.update_data(name=message.text)
+        ...     await message.reply("How old are you?")
+        ...     ctx.goto("age")
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None, on_timeout: Optional[Callable] = None,
+                 pass_commands: bool = True):
+        if ":" in name:
+            raise ValueError("Scene names cannot contain ':'")
+        self.name = name
+        self.ttl = ttl
+        self.on_timeout = on_timeout
+        self.pass_commands = pass_commands
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._order: list = []
+
+    @property
+    def first_step(self) -> str:
+        if not self._order:
+            raise ValueError(f"Scene {self.name} has no steps")
+        return self._order[0]
+
+    def state_of(self, step: str) -> str:
+        """Returns the state of users at a step"""
+        return f"{self.name}:{step}"
+
+    def next_step(self, step: str) -> Optional[str]:
+        """Returns the step registered after a step, None for the last one"""
+        index = self._order.index(step) + 1
+        return self._order[index] if index < len(self._order) else None
+
+    def add_step(self, name: str, callback: Callable, *filters: Any,
+                 update_type: UpdatesTypes = UpdatesTypes.MESSAGE, ttl: Optional[float] = _INHERIT, **kwargs) -> None:
+        """Registers a step
+
+        Args:
+            name (str): name of the step
+            callback (Callable): called with the event and a :class:`SceneContext`
+            *filters: filters the event must pass to be handled by the step
+            update_type (UpdatesTypes, optional): the update the step handles. Defaults to UpdatesTypes.MESSAGE
+            ttl (float, optional): seconds a user can stay at this step. Defaults to the ttl of the scene
+            **kwargs: extra options of the handler, like `concurrency` and `timeout`
+        """
+        if ":" in name:
+            raise ValueError("Step names cannot contain ':'")
+        step = {
+            "type": update_type,
+            "callback": callback,
+            "filters": combine(*filters),
+            "step": name,
+            "ttl": self.ttl if ttl is _INHERIT else ttl,
+        }
+        step.update(kwargs)
+        if name not in self.steps:
+            self._order.append(name)
+        self.steps[name] = step
+
+    def step(self, name: str, *filters: Any, update_type: UpdatesTypes = UpdatesTypes.MESSAGE,
+             ttl: Optional[float] = _INHERIT, **kwargs):
+        """Decorator registering a step, see :meth:`add_step`"""
+
+        def decorator(callback: Callable):
+            self.add_step(name, callback, *filters, update_type=update_type, ttl=ttl, **kwargs)
+            return callback
+
+        return decorator
+
+
+class SceneContext:
+    """Passed to steps to read and move the conversation of a user.
+
+    Attributes:
+        client (Client): the client
+        scene (Scene): the scene of the user
+        user_id (int): unique id of the user
+        step (str): the step being handled
+    """
+
+    def __init__(self, manager: "SceneManager", scene: Scene, user_id: Union[int, str], step: str):
+        self.manager = manager
+        self.client = manager.client
+        self.scene = scene
+        self.user_id = user_id
+        self.step = step
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        """A copy of the data of the user"""
+        return self.client.state_machine.get_data(self.user_id)
+
+    def update_data(self, **fields) -> Dict[str, Any]:
+        """Changes some fields of the data of the user"""
+        return self.client.state_machine.update_data(self.user_id, **fields)
+
+    def goto(self, step: str) -> None:
+        """Moves the user to another step of the scene"""
+        self.manager.enter(self.user_id, self.scene, step)
+        self.step = step
+
+    def next(self) -> Optional[str]:
+        """Moves the user to the step registered after the current one, finishing the scene after the last one
+
+        Returns:
+            str: the new step, None if the scene was finished
+        """
+        step = self.scene.next_step(self.step)
+        if step is None:
+            self.finish()
+        else:
+            self.goto(step)
+        return step
+
+    def finish(self, clear_data: bool = True) -> None:
+        """Ends the conversation of the user
+
+        Args:
+            clear_data (bool, optional): delete the data of the user too. Defaults to True
+        """
+        self.manager.leave(self.user_id, clear_data)
+
+
+class SceneManager:
+    """Routes updates of users inside scenes to the step they are at.
+
+    Args:
+        client (Client): the client whose state machine keeps the steps of users
+    """
+
+    def __init__(self, client: "Client"):
+        self.client = client
+        self.scenes: Dict[str, Scene] = {}
+        self._hooked = False
+        self._previous_on_expire: Optional[Callable] = None
+
+    def add(self, scene: Scene) -> Scene:
+        """Registers a scene
+
+        Args:
+            scene (Scene): the scene
+
+        Returns:
+            Scene: the scene
+        """
+        if scene.name in self.scenes and self.scenes[scene.name] is not scene:
+            raise ValueError(f"A scene named {scene.name} is already registered")
+        self.scenes[scene.name] = scene
+        if not self._hooked:
+            state_machine = self.client.state_machine
+            self._previous_on_expire = state_machine.on_expire
+            state_machine.on_expire = self._on_expire
+            self._hooked = True
+        return scene
+
+    def resolve(self, state: Any) -> Optional[Tuple[Scene, Dict[str, Any]]]:
+        """Finds the scene and step of a state
+
+        Args:
+            state (Any): a state
+
+        Returns:
+            tuple: the scene and the step, None if the state is not a scene step
+        """
+        if not isinstance(state, str):
+            return None
+        name, _, step = state.partition(":")
+        scene = self.scenes.get(name)
+        if scene is None:
+            return None
+        entry = scene.steps.get(step)
+        return None if entry is None else (scene, entry)
+
+    def enter(self, user_id: Union[int, str], scene: Union[Scene, str], step: Optional[str] = None, **data) -> None:
+        """Puts a user at a step of a scene
+
+        Args:
+            user_id (int OR str): unique id of the user
+            scene (Scene OR str): the scene or its name
+            step (str, optional): the step. Defaults to the first step of the scene
+            **data: fields to set in the data of the user
+        """
+        if isinstance(scene, str):
+            scene = self.scenes[scene]
+        elif scene.name not in self.scenes:
+            self.add(scene)
+        if step is None:
+            step = scene.first_step
+        elif step not in scene.steps:
+            raise KeyError(f"Scene {scene.name} has no step {step}")
+        ttl = scene.steps[step]["ttl"]
+        state_machine = self.client.state_machine
+        if ttl is None:
+            state_machine.set_state(user_id, scene.state_of(step))
+        else:
+            state_machine.set_state(user_id, scene.state_of(step), ttl=ttl)
+        if data:
+            state_machine.update_data(user_id, **data)
+
+    def leave(self, user_id: Union[int, str], clear_data: bool = True) -> None:
+        """Ends the scene of a user
+
+        Args:
+            user_id (int OR str): unique id of the user
+            clear_data (bool, optional): delete the data of the user too. Defaults to True
+        """
+        state_machine = self.client.state_machine
+        try:
+            state_machine.del_state(user_id)
+        except KeyError:
+            pass
+        if clear_data:
+            state_machine.del_data(user_id)
+
+    def current(self, user_id: Union[int, str]) -> Optional[Tuple[str, str]]:
+        """Returns the scene name and step of a user, None if the user is not in a scene"""
+        try:
+            resolved = self.resolve(self.client.state_machine.get_state(user_id))
+        except KeyError:
+            return None
+        return None if resolved is None else (resolved[0].name, resolved[1]["step"])
+
+    def restore(self) -> None:
+        """Applies the ttl of steps to loaded states whose expiry was not persisted"""
+        state_machine = self.client.state_machine
+        try:
+            items = list(state_machine.storage.items())
+        except NotImplementedError:
+            return
+        for user_id, state in items:
+            resolved = self.resolve(state)
+            if resolved is not None and resolved[1]["ttl"] is not None:
+                state_machine.restore_ttl(user_id, resolved[1]["ttl"])
+
+    async def dispatch(self, update: Dict[str, Any]) -> bool:
+        """Runs the step a user is at for an update
+
+        Args:
+            update (dict): the raw update
+
+        Returns:
+            bool: whether a step handled the update
+        """
+        for key, update_type in _UPDATE_KEYS:
+            raw = update.get(key)
+            if raw:
+                break
+        else:
+            return False
+        user_id = (raw.get("from") or {}).get("id")
+        if user_id is None:
+            return False
+
+        resolved = self.resolve(await self._state_of(user_id))
+        if resolved is None:
+            return False
+        scene, step = resolved
+
+        if step["type"] == UpdatesTypes.PHOTO:
+            if update_type != UpdatesTypes.MESSAGE or "photo" not in raw:
+                return False
+            update_type = UpdatesTypes.MESSAGE
+        elif step["type"] != update_type:
+            return False
+        if scene.pass_commands and key == "message" and (raw.get("text") or "").startswith("/"):
+            return False
+
+        event = self.client._convert_event(update_type, raw)
+        callback = step["callback"]
+        handler_name = getattr(callback, "__qualname__", repr(callback))
+        if event is None or not await self.client._passes_filters(step, event, handler_name):
+            return False
+        context = SceneContext(self, scene, user_id, step["step"])
+        await self.client._submit_handler(step, callback, handler_name, event, context)
+        return True
+
+    async def _state_of(self, user_id: Union[int, str]) -> Optional[str]:
+        state_machine = self.client.state_machine
+        if state_machine.loaded:
+            try:
+                return state_machine.get_state(user_id)
+            except KeyError:
+                return None
+            except NotImplementedError:
+                pass
+        # the index was never loaded, or the storage only has async reads
+        return await state_machine.fetch_state(user_id)
+
+    def _on_expire(self, user_id, state, reason: str):
+        results = []
+        if self._previous_on_expire is not None:
+            results.append(self._previous_on_expire(user_id, state, reason))
+        resolved = self.resolve(state) if reason == "expired" else None
+        if resolved is not None and resolved[0].on_timeout is not None:
+            scene, step = resolved
+            results.append(scene.on_timeout(SceneContext(self, scene, user_id, step["step"])))
+        awaitables = [result for result in results if inspect.isawaitable(result)]
+        if awaitables:
+            return self._await_all(awaitables)
+
+    @staticmethod
+    async def _await_all(awaitables) -> None:
+        for awaitable in awaitables:
+            try:
+                await awaitable
+            except Exception as e:
+                log.exception("Error in scene timeout callback: %s", e)
@@ -0,0 +1,56 @@
+"""Compact binary serialization of per-user data.
+
+msgpack is used when it is installed and can encode the value, pickle
+protocol 5 otherwise. The first byte of every payload names the format,
+so data written with one serializer stays readable when msgpack is
+installed or removed later.
+"""
+
+from typing import Any
+import pickle
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+MSGPACK = b"M"
+PICKLE = b"P"
+
+
+def dumps(value: Any) -> bytes:
+    """Serializes a value
+
+    Args:
+        value (Any): the value to serialize
+
+    Returns:
+        bytes: the serialized value
+    """
+    if msgpack is not None:
+        try:
+            return MSGPACK + msgpack.packb(value, use_bin_type=True)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    return PICKLE + pickle.dumps(value, protocol=5)
+
+
+def loads(data: bytes) -> Any:
+    """Deserializes a value created by :func:`dumps`
+
+    Args:
+        data (bytes): the serialized value
+
+    Returns:
+        Any: the value
+    """
+    data = bytes(data)
+    kind, payload = data[:1], data[1:]
+    if kind == MSGPACK:
+        if msgpack is None:
+            raise RuntimeError("msgpack is required to read this data, install it with `pip install msgpack`")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if kind == PICKLE:
+        return pickle.loads(payload)
+    raise ValueError("Unknown serialization format")
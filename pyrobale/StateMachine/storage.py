@@ -0,0 +1,498 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple, Union
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ..log import get_logger
+
+
+log = get_logger("storage")
+
+_MISSING = object()
+_DELETED = object()
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def normalize_key(key: Union[str, int]) -> Union[str, int]:
+    """Normalizes a storage key so ``"123"`` and ``123`` address the same entry.
+
+    Args:
+        key (string OR integer): the key to normalize
+
+    Returns:
+        int for numeric keys, the original key otherwise
+    """
+    if isinstance(key, int):
+        return key
+    if isinstance(key, str) and key.lstrip("-").isdigit():
+        return int(key)
+    return key
+
+
+class BaseStorage:
+    """Interface of state storages.
+
+    The async methods are the storage interface. Storages shipped with
+    pyrobale also keep every entry in memory and implement the ``*_nowait``
+    methods, which the synchronous :class:`StateMachine` API uses for O(1)
+    lookups without awaiting.
+    """
+
+    async def open(self) -> None:
+        """Loads persisted entries. Called by the client before polling."""
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        """Writes pending changes."""
+
+    async def close(self) -> None:
+        """Flushes pending changes and releases resources."""
+        await self.flush()
+
+    def get_nowait(self, key: Hashable, default: Any = None) -> Any:
+        raise NotImplementedError(f"{type(self).__name__} only supports async access")
+
+    def set_nowait(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError(f"{type(self).__name__} only supports async access")
+
+    def delete_nowait(self, key: Hashable) -> bool:
+        raise NotImplementedError(f"{type(self).__name__} only supports async access")
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        raise NotImplementedError
+
+    def namespace(self, name: str) -> "BaseStorage":
+        """Returns a storage of the same kind for another set of keys, like per-user data.
+
+        Args:
+            name (str): name of the namespace
+
+        Returns:
+            BaseStorage: the storage of the namespace
+        """
+        raise NotImplementedError
+
+
+class MemoryStorage(BaseStorage):
+    """Keeps entries in a dictionary. Nothing survives a restart."""
+
+    def __init__(self):
+        self._data: Dict[Hashable, Any] = {}
+
+    async def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    async def set(self, key, value):
+        self.set_nowait(key, value)
+
+    async def delete(self, key):
+        return self.delete_nowait(key)
+
+    def get_nowait(self, key, default=None):
+        return self._data.get(key, default)
+
+    def set_nowait(self, key, value):
+        self._data[key] = value
+
+    def delete_nowait(self, key):
+        return self._data.pop(key, _MISSING) is not _MISSING
+
+    def items(self):
+        return iter(list(self._data.items()))
+
+    def namespace(self, name):
+        return MemoryStorage()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+
+class WriteBehindStorage(MemoryStorage):
+    """An in-memory index persisted in batches.
+
+    Reads are served from memory. Writes update memory immediately and are
+    queued; the queue is written when it reaches ``batch_size`` entries or
+    ``flush_interval`` seconds after the first queued write, whichever comes
+    first. Subclasses implement :meth:`_load` and :meth:`_write_batch`.
+
+    Keys missing from memory are read from the backend, for entries written
+    by other processes. A key found absent there is remembered for
+    ``miss_ttl`` seconds (up to ``max_misses`` keys), so lookups of users
+    without an entry don't reach the backend every time; writing the key
+    forgets it. Both limits are attributes of every write-behind storage.
+
+    Writes made from other threads, like sync handlers, update memory at
+    once and are queued on the loop the storage was opened on.
+
+    Callables in ``flush_callbacks`` are called at the start of every flush,
+    so owners can queue values that are costly to serialize once per batch
+    instead of on every change.
+
+    Args:
+        batch_size (int, optional): Number of pending writes that triggers a flush. Defaults to 500.
+        flush_interval (float, optional): Maximum seconds a write stays pending. Defaults to 1.
+        miss_ttl (float, optional): Seconds a key found absent is answered from memory. Defaults to 5.
+        max_misses (int, optional): Maximum number of absent keys remembered. Defaults to 10000.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, miss_ttl: float = 5.0,
+                 max_misses: int = 10000):
+        super().__init__()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.miss_ttl = miss_ttl
+        self.max_misses = max_misses
+        self._misses: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._pending: Dict[Hashable, Any] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.flush_callbacks: List[Callable[[], None]] = []
+
+    async def _load(self) -> Dict[Hashable, Any]:
+        raise NotImplementedError
+
+    async def _write_batch(self, batch: Dict[Hashable, Any]) -> None:
+        """Persists a batch. Deleted keys have the ``_DELETED`` sentinel as value."""
+        raise NotImplementedError
+
+    async def _fetch(self, key: Hashable) -> Any:
+        """Reads a key missing from memory from the backend, for entries written by other processes."""
+        return _MISSING
+
+    async def open(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        loaded = await self._load()
+        # entries written before opening win over persisted ones
+        loaded.update(self._data)
+        self._data = loaded
+        self._misses.clear()
+
+    async def get(self, key, default=None):
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING and key not in self._pending:
+            expires_at = self._misses.get(key)
+            if expires_at is not None and expires_at > time.monotonic():
+                return default
+            value = await self._fetch(key)
+            if value is _MISSING:
+                self._remember_miss(key)
+                return default
+            self._misses.pop(key, None)
+            self._data[key] = value
+        return default if value is _MISSING else value
+
+    def _remember_miss(self, key) -> None:
+        if self.miss_ttl <= 0 or self.max_misses <= 0:
+            return
+        self._misses[key] = time.monotonic() + self.miss_ttl
+        self._misses.move_to_end(key)
+        while len(self._misses) > self.max_misses:
+            self._misses.popitem(last=False)
+
+    def set_nowait(self, key, value):
+        self._data[key] = value
+        self._misses.pop(key, None)
+        self._queue(key, value)
+
+    def delete_nowait(self, key):
+        existed = super().delete_nowait(key)
+        self._remember_miss(key)
+        self._queue(key, _DELETED)
+        return existed
+
+    def _queue(self, key, value) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed() and _running_loop() is not loop:
+            try:
+                loop.call_soon_threadsafe(self._queue, key, value)
+                return
+            except RuntimeError:
+                # closed meanwhile
+                pass
+        self._pending[key] = value
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        loop = _running_loop()
+        if loop is None:
+            # written by the next flush() or close()
+            return
+        if len(self._pending) >= self.batch_size:
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = loop.create_task(self.flush())
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_interval, self._flush_later)
+
+    def _flush_later(self) -> None:
+        self._flush_handle = None
+        if self._pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> None:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+            for callback in self.flush_callbacks:
+                callback()
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                try:
+                    await self._write_batch(batch)
+                except Exception:
+                    # keep the failed batch unless newer writes replaced it
+                    batch.update(self._pending)
+                    self._pending = batch
+                    log.exception("Writing %d state changes failed", len(batch))
+                    raise
+
+
+class SQLiteStorage(WriteBehindStorage):
+    """Persists entries in an SQLite database in WAL mode.
+
+    WAL lets several bot processes share one database file. Batches are
+    written in a single transaction on a worker thread.
+
+    Args:
+        path (str): Path of the database file.
+        table (str, optional): Name of the table. Defaults to "states".
+        batch_size (int, optional): Number of pending writes that triggers a flush. Defaults to 500.
+        flush_interval (float, optional): Maximum seconds a write stays pending. Defaults to 1.
+    """
+
+    def __init__(self, path: str, table: str = "states", batch_size: int = 500, flush_interval: float = 1.0):
+        super().__init__(batch_size, flush_interval)
+        if not table.isidentifier():
+            raise ValueError("table must be a valid identifier")
+        self.path = path
+        self.table = table
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def namespace(self, name):
+        return SQLiteStorage(self.path, f"{self.table}_{name}", self.batch_size, self.flush_interval)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value)")
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    def _load_sync(self) -> Dict[Hashable, Any]:
+        with self._lock:
+            rows = self._connect().execute(f"SELECT key, value FROM {self.table}").fetchall()
+        return {normalize_key(key): value for key, value in rows}
+
+    def _fetch_sync(self, key: Hashable) -> Any:
+        with self._lock:
+            row = self._connect().execute(f"SELECT value FROM {self.table} WHERE key = ?", (str(key),)).fetchone()
+        return _MISSING if row is None else row[0]
+
+    def _write_sync(self, batch: Dict[Hashable, Any]) -> None:
+        upserts = [(str(key), value) for key, value in batch.items() if value is not _DELETED]
+        deletes = [(str(key),) for key, value in batch.items() if value is _DELETED]
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                if upserts:
+                    connection.executemany(
+                        f"INSERT INTO {self.table} (key, value) VALUES (?, ?) "
+                        f"ON CONFLICT(key) DO UPDATE SET value = excluded.value", upserts)
+                if deletes:
+                    connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", deletes)
+
+    async def _load(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self._load_sync)
+
+    async def _fetch(self, key):
+        return await asyncio.get_running_loop().run_in_executor(None, self._fetch_sync, key)
+
+    async def _write_batch(self, batch):
+        await asyncio.get_running_loop().run_in_executor(None, self._write_sync, batch)
+
+    async def close(self) -> None:
+        await super().close()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class AppendOnlyLogStorage(WriteBehindStorage):
+    """Persists entries as an append-only log of JSON lines.
+
+    Each change appends one line, so a batch costs one sequential write.
+    The log is replayed on open and compacted when it holds more than
+    ``compact_ratio`` times as many lines as live entries.
+
+    Args:
+        path (str): Path of the log file.
+        batch_size (int, optional): Number of pending writes that triggers a flush. Defaults to 500.
+        flush_interval (float, optional): Maximum seconds a write stays pending. Defaults to 1.
+        compact_ratio (float, optional): Lines per live entry that trigger a compaction. Defaults to 4.
+        fsync (bool, optional): fsync the log after each batch. Defaults to False.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 compact_ratio: float = 4.0, fsync: bool = False):
+        super().__init__(batch_size, flush_interval)
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.fsync = fsync
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def namespace(self, name):
+        return AppendOnlyLogStorage(f"{self.path}.{name}", self.batch_size, self.flush_interval,
+                                    self.compact_ratio, self.fsync)
+
+    @staticmethod
+    def _encode(value: Any) -> Any:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return {"b64": base64.b64encode(bytes(value)).decode()}
+        return value
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        if isinstance(value, dict) and "b64" in value:
+            return base64.b64decode(value["b64"])
+        return value
+
+    def _load_sync(self) -> Dict[Hashable, Any]:
+        data: Dict[Hashable, Any] = {}
+        if not os.path.exists(self.path):
+            return data
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a torn last line from a crash mid-write
+                    log.warning("Skipping corrupt line in %s", self.path)
+                    continue
+                lines += 1
+                if len(entry) == 2:
+                    data[entry[0]] = self._decode(entry[1])
+                else:
+                    data.pop(entry[0], None)
+        self._lines = lines
+        return data
+
+    def _write_sync(self, batch: Dict[Hashable, Any]) -> None:
+        lines = [
+            json.dumps([key] if value is _DELETED else [key, self._encode(value)], ensure_ascii=False) + "\n"
+            for key, value in batch.items()
+        ]
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._lines += len(lines)
+
+    def _compact_sync(self, snapshot: Dict[Hashable, Any]) -> None:
+        temp_path = self.path + ".tmp"
+        with self._lock:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for key, value in snapshot.items():
+                    f.write(json.dumps([key, self._encode(value)], ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._lines = len(snapshot)
+
+    async def _load(self):
+        return await asyncio.get_running_loop().run_in_executor(None, self._load_sync)
+
+    async def _write_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_sync, batch)
+        if self._lines > max(len(self._data), 1) * self.compact_ratio and self._lines > 1000:
+            await self.compact()
+
+    async def compact(self) -> None:
+        """Rewrites the log with one line per live entry."""
+        await asyncio.get_running_loop().run_in_executor(None, self._compact_sync, dict(self._data))
+
+
+class RedisStorage(WriteBehindStorage):
+    """Persists entries in a Redis hash through any Redis-compatible async client.
+
+    The client only needs the ``hget``, ``hset``, ``hdel`` and ``hgetall``
+    coroutines of ``redis.asyncio.Redis``, so compatible servers and
+    in-process stand-ins work as well. No Redis package is required by
+    pyrobale itself.
+
+    Args:
+        redis: The async Redis-compatible client.
+        key (str, optional): Name of the hash holding the entries. Defaults to "pyrobale:states".
+        batch_size (int, optional): Number of pending writes that triggers a flush. Defaults to 500.
+        flush_interval (float, optional): Maximum seconds a write stays pending. Defaults to 1.
+        decode_values (bool, optional): Decode values returned as bytes to str. Defaults to True.
+    """
+
+    def __init__(self, redis: Any, key: str = "pyrobale:states", batch_size: int = 500,
+                 flush_interval: float = 1.0, decode_values: bool = True):
+        super().__init__(batch_size, flush_interval)
+        self.redis = redis
+        self.key = key
+        self.decode_values = decode_values
+
+    def namespace(self, name):
+        # namespaces hold binary data, so values are kept as bytes
+        return RedisStorage(self.redis, f"{self.key}:{name}", self.batch_size, self.flush_interval, False)
+
+    @staticmethod
+    def _decode(value: Any) -> Any:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _decode_value(self, value: Any) -> Any:
+        return self._decode(value) if self.decode_values else value
+
+    async def _load(self):
+        entries = await self.redis.hgetall(self.key)
+        return {normalize_key(self._decode(key)): self._decode_value(value) for key, value in entries.items()}
+
+    async def _fetch(self, key):
+        value = await self.redis.hget(self.key, str(key))
+        return _MISSING if value is None else self._decode_value(value)
+
+    async def _write_batch(self, batch):
+        upserts = {str(key): value for key, value in batch.items() if value is not _DELETED}
+        deletes = [str(key) for key, value in batch.items() if value is _DELETED]
+        if upserts:
+            await self.redis.hset(self.key, mapping=upserts)
+        if deletes:
+            await self.redis.hdel(self.key, *deletes)
@@ -0,0 +1,256 @@
+"""Sending one message to many chats.
+
+A :class:`Broadcast` sends to every chat id of an iterable or async
+iterable with a bounded number of concurrent requests under a
+:class:`~pyrobale.ratelimit.RateLimiter`. The outcome of every recipient is
+written to a storage, so a broadcast started again with the same job id and
+a persistent storage (like :class:`~pyrobale.StateMachine.SQLiteStorage`)
+skips the chats it already handled.
+"""
+
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Optional, Union, TYPE_CHECKING
+import asyncio
+import re
+import time
+import uuid
+import zlib
+
+import aiohttp
+
+from ..objects.enums import BroadcastOutcome
+from ..exceptions import ForbiddenException, NotFoundException, PyroBaleException, TooManyRequestsException
+from ..StateMachine.storage import BaseStorage, MemoryStorage, normalize_key
+from ..ratelimit import RateLimiter
+from ..log import get_logger
+
+if TYPE_CHECKING:
+    from ..client import Client
+
+
+log = get_logger("broadcast")
+
+Send = Callable[["Client", Union[int, str]], Awaitable[Any]]
+
+_RETRIED = (PyroBaleException, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class BroadcastReport:
+    """Progress and throughput of a broadcast.
+
+    Attributes:
+        job_id (str): Id of the broadcast, pass it again to resume.
+        outcomes (dict): Number of recipients per BroadcastOutcome handled by this run.
+        skipped (int): Recipients handled by a previous run.
+        elapsed (float): Seconds since the run started.
+        finished (bool): Whether every recipient was handled.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.outcomes: Dict[BroadcastOutcome, int] = {outcome: 0 for outcome in BroadcastOutcome}
+        self.skipped = 0
+        self.rate_limit_waits = 0.0
+        self.finished = False
+        self._started = time.monotonic()
+        self._ended: Optional[float] = None
+
+    @property
+    def processed(self) -> int:
+        return sum(self.outcomes.values())
+
+    @property
+    def sent(self) -> int:
+        return self.outcomes[BroadcastOutcome.SENT]
+
+    @property
+    def elapsed(self) -> float:
+        return (self._ended if self._ended is not None else time.monotonic()) - self._started
+
+    @property
+    def throughput(self) -> float:
+        """Recipients handled per second"""
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            **{outcome.value: count for outcome, count in self.outcomes.items()},
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(self.throughput, 2),
+            "rate_limit_waits": round(self.rate_limit_waits, 3),
+            "finished": self.finished,
+        }
+
+    def __repr__(self) -> str:
+        return f"BroadcastReport({self.to_dict()})"
+
+
+def storage_name(job_id: str) -> str:
+    """Returns the storage namespace of a job, safe as an SQLite table name"""
+    name = re.sub(r"\W", "_", job_id)
+    if name != job_id:
+        # keep ids differing only in replaced characters apart
+        name = f"{name}_{zlib.crc32(job_id.encode()):08x}"
+    return f"broadcast_{name}"
+
+
+def classify(error: BaseException) -> BroadcastOutcome:
+    """Returns the outcome of a recipient whose send raised an error"""
+    if isinstance(error, ForbiddenException):
+        return BroadcastOutcome.BLOCKED if "block" in str(error).lower() else BroadcastOutcome.FORBIDDEN
+    if isinstance(error, NotFoundException):
+        return BroadcastOutcome.NOT_FOUND
+    return BroadcastOutcome.FAILED
+
+
+class Broadcast:
+    """Sends a message to many chats.
+
+    Args:
+        client (Client): The client sending the messages.
+        chat_ids (Iterable OR AsyncIterable): The recipients, read lazily.
+        send (Callable): Called with the client and a chat id, returns the awaitable sending to it.
+        job_id (str, optional): Id of the broadcast, used to resume it. Defaults to a random id.
+        storage (BaseStorage, optional): Storage the outcomes are written to. Defaults to a MemoryStorage.
+        concurrency (int, optional): Maximum sends in flight. Defaults to 20.
+        rate_limiter (RateLimiter, optional): Limiter every send waits for. Defaults to 20 sends per second.
+        retries (int, optional): Retries of sends failing with a transient error. Defaults to 3.
+        on_progress (Callable, optional): Called with the BroadcastReport every ``progress_interval`` seconds and at the end.
+        progress_interval (float, optional): Seconds between progress reports. Defaults to 10.
+    """
+
+    def __init__(self, client: "Client", chat_ids: Union[Iterable, AsyncIterable], send: Send,
+                 job_id: Optional[str] = None, storage: Optional[BaseStorage] = None, concurrency: int = 20,
+                 rate_limiter: Optional[RateLimiter] = None, retries: int = 3,
+                 on_progress: Optional[Callable[[BroadcastReport], Any]] = None, progress_interval: float = 10):
+        self.client = client
+        self.chat_ids = chat_ids
+        self.send = send
+        self.job_id = job_id or uuid.uuid4().hex
+        self.storage = (storage if storage is not None else MemoryStorage()).namespace(storage_name(self.job_id))
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(20, name="broadcast")
+        self.retries = retries
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.report = BroadcastReport(self.job_id)
+        self._stopping = False
+
+    def stop(self) -> None:
+        """Stops the broadcast after the sends in flight, it can be resumed later."""
+        self._stopping = True
+
+    def outcomes(self) -> Dict[Union[int, str], BroadcastOutcome]:
+        """Returns the outcome of every recipient handled so far, including previous runs"""
+        return {chat_id: BroadcastOutcome(value) for chat_id, value in self.storage.items()}
+
+    async def _recipients(self):
+        if hasattr(self.chat_ids, "__aiter__"):
+            async for chat_id in self.chat_ids:
+                yield chat_id
+        else:
+            for chat_id in self.chat_ids:
+                yield chat_id
+
+    async def _deliver(self, chat_id: Union[int, str]) -> BroadcastOutcome:
+        attempt = 0
+        while True:
+            self.report.rate_limit_waits += await self.rate_limiter.acquire()
+            try:
+                await self.send(self.client, chat_id)
+                return BroadcastOutcome.SENT
+            except TooManyRequestsException as e:
+                self.rate_limiter.pause(e.retry_after)
+                error = e
+            except (ForbiddenException, NotFoundException) as e:
+                return classify(e)
+            except _RETRIED as e:
+                error = e
+            except Exception as e:
+                log.exception("Broadcast %s to %s failed: %s", self.job_id, chat_id, e)
+                return BroadcastOutcome.FAILED
+            attempt += 1
+            if attempt > self.retries:
+                log.warning("Broadcast %s to %s failed: %s", self.job_id, chat_id, error)
+                return BroadcastOutcome.FAILED
+            if not isinstance(error, TooManyRequestsException):
+                await asyncio.sleep(min(2 ** attempt * 0.5, 30))
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        metrics = self.client.metrics
+        while True:
+            chat_id = await queue.get()
+            try:
+                if chat_id is None:
+                    return
+                outcome = await self._deliver(chat_id)
+                self.storage.set_nowait(chat_id, outcome.value)
+                self.report.outcomes[outcome] += 1
+                if metrics is not None:
+                    metrics.broadcast_recipients.inc(outcome=outcome.value)
+            finally:
+                queue.task_done()
+
+    async def _report_progress(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            self._progress()
+
+    def _progress(self) -> None:
+        log.info("Broadcast %s: %d handled, %d sent, %.1f/s", self.job_id, self.report.processed,
+                 self.report.sent, self.report.throughput)
+        if self.on_progress is not None:
+            try:
+                self.on_progress(self.report)
+            except Exception as e:
+                log.exception("Error in broadcast progress callback: %s", e)
+
+    async def _produce(self, queue: asyncio.Queue, done: set, workers: int) -> None:
+        async for chat_id in self._recipients():
+            if self._stopping:
+                break
+            chat_id = normalize_key(chat_id)
+            if chat_id in done:
+                self.report.skipped += 1
+                continue
+            done.add(chat_id)
+            await queue.put(chat_id)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def run(self) -> BroadcastReport:
+        """Sends to every recipient not handled by a previous run of the job.
+
+        Returns:
+            BroadcastReport: The outcome counts and throughput of this run.
+
+        Raises:
+            Exception: An error of the storage or of reading the recipients, the sends in flight are cancelled.
+        """
+        await self.storage.open()
+        done = {chat_id for chat_id, _ in self.storage.items()}
+        if self.client.metrics is not None and self.rate_limiter.on_wait is None:
+            self.rate_limiter.on_wait = self.client.metrics.observe_rate_limit_wait
+
+        queue: asyncio.Queue = asyncio.Queue(self.concurrency * 2)
+        loop = asyncio.get_running_loop()
+        workers = [loop.create_task(self._work(queue)) for _ in range(self.concurrency)]
+        producer = loop.create_task(self._produce(queue, done, len(workers)))
+        progress = loop.create_task(self._report_progress()) if self.progress_interval else None
+        try:
+            # an error ending a worker or the producer is raised here, not left blocking the queue
+            await asyncio.gather(producer, *workers)
+            self.report.finished = not self._stopping
+        finally:
+            producer.cancel()
+            for task in workers:
+                task.cancel()
+            if progress is not None:
+                progress.cancel()
+            self.report._ended = time.monotonic()
+            await self.storage.close()
+        self._progress()
+        return self.report
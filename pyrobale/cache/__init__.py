@@ -0,0 +1,320 @@
+"""Caches for API lookups.
+
+:class:`TTLCache` is a size bounded, least recently used cache whose entries
+expire after a time to live. Concurrent lookups of a missing key share one
+load, and "negative" results (a user who is not a member, a chat that was
+not found) can be kept for a shorter time than positive ones.
+
+:class:`MembershipCache` uses it for ``getChatMember`` and
+``getChatAdministrators`` results. The client invalidates its entries when
+members join or leave and when it bans, restricts or promotes someone.
+
+:class:`SingleFlight` caches nothing: it lets identical requests that are
+in flight at the same time share one call.
+"""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple, Type, Union
+import asyncio
+import copy
+import time
+
+from ..exceptions import NotFoundException, ForbiddenException
+
+
+_MISSING = object()
+
+JOINED_STATUSES = frozenset(("member", "creator", "administrator"))
+
+
+class _Raised:
+    """A cached exception, raised again on every hit."""
+
+    __slots__ = ("exception",)
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+class TTLCache:
+    """An LRU cache with expiring entries and coalesced loads.
+
+    Args:
+        ttl (float, optional): Seconds an entry is kept. Defaults to 60.
+        negative_ttl (float, optional): Seconds negative entries are kept. Defaults to ``ttl``.
+        max_size (int, optional): Maximum number of entries, least recently used ones are evicted. Defaults to 10000.
+        is_negative (Callable, optional): Tells whether a loaded value is negative.
+        negative_exceptions (tuple, optional): Exceptions raised by loaders that are cached as negative entries.
+    """
+
+    def __init__(self, ttl: float = 60, negative_ttl: Optional[float] = None, max_size: Optional[int] = 10000,
+                 is_negative: Optional[Callable[[Any], bool]] = None,
+                 negative_exceptions: Tuple[Type[BaseException], ...] = ()):
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_size = max_size
+        self.is_negative = is_negative
+        self.negative_exceptions = negative_exceptions
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns a cached value without loading it.
+
+        Args:
+            key (Hashable): The key.
+            default (Any, optional): Returned when the key is missing or expired.
+
+        Returns:
+            Any: The cached value.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        value = entry[1]
+        if isinstance(value, _Raised):
+            raise value.exception
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Stores a value.
+
+        Args:
+            key (Hashable): The key.
+            value (Any): The value.
+            ttl (float, optional): Seconds to keep it. Defaults to the ttl matching the value.
+        """
+        if ttl is None:
+            negative = isinstance(value, _Raised) or (self.is_negative is not None and self.is_negative(value))
+            ttl = self.negative_ttl if negative else self.ttl
+        if ttl <= 0:
+            self._entries.pop(key, None)
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns a cached value, loading it once for all concurrent callers when missing.
+
+        Args:
+            key (Hashable): The key.
+            loader (Callable): Returns an awaitable loading the value.
+
+        Returns:
+            Any: The value.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop and not task.done():
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # versions are compared from now on, the task may start after an invalidation
+            task = loop.create_task(self._load(key, loader, self._version))
+            self._inflight[key] = task
+        # a cancelled caller must not cancel the load shared with others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], version: int) -> Any:
+        try:
+            value = await loader()
+        except self.negative_exceptions as e:
+            if self._version == version:
+                self.set(key, _Raised(e))
+            raise
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        # entries invalidated while loading would be stale
+        if self._version == version:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """Removes an entry and forgets loads of it that are in flight.
+
+        Args:
+            key (Hashable): The key.
+        """
+        self._version += 1
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Removes every entry whose key matches a predicate.
+
+        Args:
+            predicate (Callable): Called with each key.
+        """
+        self._version += 1
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+        for key in [key for key in self._inflight if predicate(key)]:
+            del self._inflight[key]
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        self._version += 1
+        self._entries.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+def _chat_key(chat_id: Union[int, str]) -> Union[int, str]:
+    if isinstance(chat_id, str) and chat_id.lstrip("-").isdigit():
+        return int(chat_id)
+    return chat_id
+
+
+class MembershipCache:
+    """Caches chat members and chat administrators.
+
+    Members who are not in the chat, and lookups the API refused, are
+    negative entries: they are kept ``negative_ttl`` seconds so a user who
+    just joined a channel is noticed quickly.
+
+    Args:
+        ttl (float, optional): Seconds a member or administrator list is kept. Defaults to 60.
+        negative_ttl (float, optional): Seconds negative entries are kept. Defaults to 10.
+        max_size (int, optional): Maximum number of cached members. Defaults to 10000.
+        admins_max_size (int, optional): Maximum number of cached administrator lists. Defaults to 1000.
+    """
+
+    def __init__(self, ttl: float = 60, negative_ttl: float = 10, max_size: Optional[int] = 10000,
+                 admins_max_size: Optional[int] = 1000):
+        negative_exceptions = (NotFoundException, ForbiddenException)
+        self.members = TTLCache(ttl, negative_ttl, max_size,
+                                is_negative=lambda member: not member or member.get("status") not in JOINED_STATUSES,
+                                negative_exceptions=negative_exceptions)
+        self.admins = TTLCache(ttl, negative_ttl, admins_max_size, negative_exceptions=negative_exceptions)
+
+    async def get_member(self, chat_id: Union[int, str], user_id: int,
+                         loader: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Returns the raw chat member, loading it when missing."""
+        return await self.members.get_or_load((_chat_key(chat_id), int(user_id)), loader)
+
+    async def get_admins(self, chat_id: Union[int, str], loader: Callable[[], Awaitable[list]]) -> list:
+        """Returns the raw administrator list of a chat, loading it when missing."""
+        return await self.admins.get_or_load(_chat_key(chat_id), loader)
+
+    def invalidate_member(self, chat_id: Union[int, str], user_id: int) -> None:
+        """Forgets a member and the administrators of their chat."""
+        chat_id = _chat_key(chat_id)
+        self.members.invalidate((chat_id, int(user_id)))
+        self.admins.invalidate(chat_id)
+
+    def invalidate_chat(self, chat_id: Union[int, str]) -> None:
+        """Forgets every member and the administrators of a chat."""
+        chat_id = _chat_key(chat_id)
+        self.members.invalidate_where(lambda key: key[0] == chat_id)
+        self.admins.invalidate(chat_id)
+
+    def observe_update(self, update: Dict[str, Any]) -> None:
+        """Invalidates members who joined or left a chat in an update."""
+        message = update.get("message")
+        if not message or ("new_chat_members" not in message and "left_chat_member" not in message):
+            return
+        chat = message.get("chat") or {}
+        chats = [chat.get("id")]
+        if chat.get("username"):
+            chats.append("@" + chat["username"])
+        users = list(message.get("new_chat_members") or [])
+        if message.get("left_chat_member"):
+            users.append(message["left_chat_member"])
+        for chat_id in chats:
+            if chat_id is None:
+                continue
+            for user in users:
+                if user.get("id") is not None:
+                    self.invalidate_member(chat_id, user["id"])
+
+    def clear(self) -> None:
+        self.members.clear()
+        self.admins.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"members": self.members.stats(), "admins": self.admins.stats()}
+
+
+COALESCED_METHODS = frozenset(("getChat", "getChatMember", "getMe", "getChatMembersCount", "getFile"))
+
+
+class SingleFlight:
+    """Shares one call between identical calls running at the same time.
+
+    The result is shared too, so every caller but the last one to resume
+    gets a deep copy and callers can change what they receive.
+
+    Args:
+        methods (Iterable[str], optional): Names of the methods to coalesce. Defaults to COALESCED_METHODS.
+    """
+
+    def __init__(self, methods: Optional[Iterable[str]] = None):
+        self.methods = set(COALESCED_METHODS if methods is None else methods)
+        self._calls: Dict[Hashable, List] = {}
+        self.calls: Dict[str, int] = {}
+        self.coalesced: Dict[str, int] = {}
+        self.on_coalesced: Optional[Callable[[str], None]] = None
+
+    async def do(self, name: str, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Runs a call, or waits for the identical call in flight.
+
+        Args:
+            name (str): Name of the method, used for the counters.
+            key (Hashable): Identifies identical calls.
+            call (Callable): Returns the awaitable making the call.
+
+        Returns:
+            Any: The result of the call.
+        """
+        loop = asyncio.get_running_loop()
+        flight = self._calls.get(key)
+        if flight is not None and flight[0].get_loop() is loop and not flight[0].done():
+            flight[1] += 1
+            self.coalesced[name] = self.coalesced.get(name, 0) + 1
+            if self.on_coalesced is not None:
+                self.on_coalesced(name)
+        else:
+            flight = [loop.create_task(call()), 1]
+            self._calls[key] = flight
+            flight[0].add_done_callback(lambda task: self._forget(key, flight))
+            self.calls[name] = self.calls.get(name, 0) + 1
+        try:
+            # a cancelled caller must not cancel the call shared with others
+            result = await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+        return result if flight[1] == 0 else copy.deepcopy(result)
+
+    def _forget(self, key: Hashable, flight: List) -> None:
+        if self._calls.get(key) is flight:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"calls": dict(self.calls), "coalesced": dict(self.coalesced)}
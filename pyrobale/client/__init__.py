@@ -1,6 +1,6 @@
-from typing import Optional, TypeAlias, Union, List, Dict, Any, Callable, Awaitable
-from concurrent.futures import ThreadPoolExecutor
-import traceback
+from typing import Optional, TypeAlias, Union, List, Dict, Any, Callable, Awaitable, Iterable, AsyncIterable
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import concurrent.futures
 import inspect
 
 from ..objects.animation import Animation
@@ -45,16 +45,40 @@ from ..objects.webappdata import WebAppData
 from ..objects.update import Update
 from ..objects.webappinfo import WebAppInfo
 from ..objects.utils import *
-from ..objects.enums import UpdatesTypes, ChatAction, ChatType, ChatPermissions, TransactionStatus
+from ..objects.enums import UpdatesTypes, ChatAction, ChatType, ChatPermissions, TransactionStatus, OverflowPolicy, MatchType
 from ..objects.transaction import Transaction
-from ..StateMachine import StateMachine
-from ..exceptions import NotFoundException, InvalidTokenException, PyroBaleException, ForbiddenException
+from ..StateMachine import StateMachine, BaseStorage, Scene, SceneManager
+from ..metrics import MetricsRegistry, ClientMetrics, api_method
+from ..tracing import Tracer, NoOpTracer
+from ..cache import MembershipCache, SingleFlight, JOINED_STATUSES
+from ..broadcast import Broadcast, BroadcastReport
+from ..ratelimit import RateLimiter
+from ..filters import update_scope, combine
+from ..log import get_logger
+from ..monitor import LoopMonitor, executor_stats
+from .runner import HandlerRunner
+from .autoreply import AutoReplyRouter
+from .sender import BackgroundSender
+from .batch import BatchResult, run_batch
+from .payments import TransactionWatcher
+from .offsets import UpdateOffsets
+from ..exceptions import NotFoundException, InvalidTokenException, PyroBaleException, ForbiddenException, TooManyRequestsException
+import os
+import re
 import time
 from enum import Enum, member
 import asyncio
 from json import loads, JSONDecodeError, dumps
 import aiohttp
 import functools
+import contextlib
+import contextvars
+
+
+log = get_logger("client")
+dispatcher_log = get_logger("dispatcher")
+filters_log = get_logger("filters")
+polling_log = get_logger("polling")
 
 
 class Client:
@@ -65,6 +89,33 @@ class Client:
         base_url (str, optional): The base URL for the API. Defaults to "https://tapi.bale.ai/bot".
         async_mode (bool, optional): Force async mode. If None, auto-detected.
         max_workers (int, optional): Maximum number of worker threads for handlers. Defaults to 50.
+        metrics (MetricsRegistry, optional): Registry to record client and transport metrics in. Defaults to None (disabled).
+        tracer (Tracer, optional): Tracer creating spans across the update lifecycle. Defaults to a no-op tracer.
+        loop_monitor (LoopMonitor, optional): Monitor for event loop lag and blocking callbacks. Defaults to None.
+        max_concurrent_handlers (int, optional): Maximum handler calls running at once. Defaults to None (unlimited).
+        overflow_policy (OverflowPolicy, optional): What to do with a handler call when a concurrency limit is reached. Defaults to OverflowPolicy.WAIT.
+        handler_timeout (float, optional): Default timeout of handler calls in seconds. Defaults to None.
+        drain_timeout (float, optional): Seconds `stop` waits for running handlers before cancelling them. Defaults to 10.
+        state_storage (BaseStorage, optional): Storage of user states, like SQLiteStorage. Defaults to a MemoryStorage.
+        state_machine (StateMachine, optional): State machine to use instead of one built on `state_storage`, for example with a ttl or max_size.
+        waiter_timeout (float, optional): Default timeout of `wait_for` calls in seconds. Defaults to None (wait forever).
+        max_waiters (int, optional): Maximum pending `wait_for` calls, the oldest one times out when exceeded. Defaults to None.
+        membership_cache (MembershipCache, optional): Cache of chat members and administrators. Defaults to None (disabled).
+        coalesce_methods (Iterable[str], optional): API methods whose identical concurrent calls share one request.
+            Defaults to getChat, getChatMember, getMe, getChatMembersCount and getFile, an empty list disables it.
+        identity_file (str, optional): File the bot identity is saved to, so startup does not wait for `get_me`. Defaults to None.
+        connection_limit (int, optional): Maximum open connections of the pooled HTTP session. Defaults to 100.
+        batch_concurrency (int, optional): Calls in flight of batch methods like `ban_many`. Defaults to 10.
+        batch_rate (float, optional): Calls per second of batch methods, None disables the limit. Defaults to 30.
+        payment_poll_interval (float, optional): Seconds before the first inquiry of a transaction answered by
+            `handle_pre_checkout_query`, later inquiries back off. Defaults to 2.
+        payment_deadline (float, optional): Seconds a transaction is inquired before giving up. Defaults to 900.
+        offset_storage (BaseStorage, optional): Storage the polling offset and recent update ids are committed to,
+            like SQLiteStorage, so a restarted bot resumes after the last dispatched update. Defaults to a MemoryStorage.
+        dedup_window (int, optional): Number of recent update ids remembered to drop duplicate updates. Defaults to 1000.
+        process_workers (int, optional): Processes running the handlers marked with `process`. Defaults to the number of CPUs.
+        sender_workers (int, optional): Requests of `send_message_nowait` sent at the same time. Defaults to 4.
+        max_pending_sends (int, optional): Maximum queued `send_message_nowait` requests. Defaults to None (unbounded).
 
     Returns:
         Client: The client instance.
@@ -72,17 +123,53 @@ class Client:
 
     def __init__(self, token: str, base_url: str = "https://tapi.bale.ai/bot",
                  async_mode: Optional[bool] = None, max_workers: int = 50,
-                 handle_pre_checkout_query: Optional[bool] = False):
+                 handle_pre_checkout_query: Optional[bool] = False,
+                 metrics: Optional[MetricsRegistry] = None,
+                 tracer: Optional[Tracer] = None,
+                 loop_monitor: Optional[LoopMonitor] = None,
+                 max_concurrent_handlers: Optional[int] = None,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.WAIT,
+                 handler_timeout: Optional[float] = None,
+                 drain_timeout: Optional[float] = 10,
+                 state_storage: Optional[BaseStorage] = None,
+                 state_machine: Optional[StateMachine] = None,
+                 waiter_timeout: Optional[float] = None,
+                 max_waiters: Optional[int] = None,
+                 membership_cache: Optional[MembershipCache] = None,
+                 coalesce_methods: Optional[Iterable[str]] = None,
+                 identity_file: Optional[str] = None,
+                 sender_workers: int = 4,
+                 max_pending_sends: Optional[int] = None,
+                 connection_limit: int = 100,
+                 batch_concurrency: int = 10,
+                 batch_rate: Optional[float] = 30,
+                 payment_poll_interval: float = 2,
+                 payment_deadline: float = 900,
+                 offset_storage: Optional[BaseStorage] = None,
+                 dedup_window: int = 1000,
+                 process_workers: Optional[int] = None):
         self.token = token
         self.base_url = base_url
         self.requests_base = base_url + token
         self.handle_pre_checkout_query = handle_pre_checkout_query
+        self.transactions = TransactionWatcher(self, interval=payment_poll_interval, deadline=payment_deadline)
 
         self.handlers = []
         self._waiters = []
         self.running = False
-        self.last_update_id = 0
-        self.state_machine = StateMachine()
+        self.offsets = UpdateOffsets(offset_storage, dedup_window)
+        self.state_machine = state_machine if state_machine is not None else StateMachine(state_storage)
+        self.scenes = SceneManager(self)
+        self.waiter_timeout = waiter_timeout
+        self.max_waiters = max_waiters
+        self.membership_cache = membership_cache
+        self.single_flight = SingleFlight(coalesce_methods)
+        self.sender = BackgroundSender(self, sender_workers, max_pending_sends)
+        self.connection_limit = connection_limit
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batch_concurrency = batch_concurrency
+        self.batch_limiter = RateLimiter(batch_rate, name="batch") if batch_rate else None
         self.tick_handlers = []
         self.ready_handlers = []
         self.dc_handlers = []
@@ -94,6 +181,19 @@ class Client:
             thread_name_prefix="pyrobale_handler"
         )
 
+        self.process_workers = process_workers
+        self._process_executor: Optional[ProcessPoolExecutor] = None
+
+        self.handler_runner = HandlerRunner(max_concurrent_handlers, overflow_policy, handler_timeout)
+        self.drain_timeout = drain_timeout
+
+        self.loop_monitor = loop_monitor
+        if loop_monitor is not None and loop_monitor.executor is None:
+            loop_monitor.executor = self.handler_executor
+
+        self.metrics: Optional[ClientMetrics] = ClientMetrics(metrics, self) if metrics is not None else None
+        self.tracer: Tracer = tracer if tracer is not None else NoOpTracer()
+
         if async_mode is None:
             try:
                 loop = asyncio.get_event_loop()
@@ -104,31 +204,138 @@ class Client:
             self._async_mode = async_mode
 
         self.me: User|None = None
+        self.identity_file = identity_file
+        self._identity_task: Optional[asyncio.Task] = None
+        self._mention_pattern = None
         self.check_defined_message = True
-        self.defined_messages = {}
+        self.auto_replies = AutoReplyRouter(self)
+
+    @property
+    def last_update_id(self) -> int:
+        """Id of the last dispatched update, polling continues after it."""
+        return self.offsets.offset
+
+    @last_update_id.setter
+    def last_update_id(self, update_id: int) -> None:
+        self.offsets.offset = update_id
+
+    @property
+    def defined_messages(self) -> Dict[str, Any]:
+        """Replies to messages whose text is exactly a key, a text or a function called with the Message."""
+        return self.auto_replies.exact
+
+    @defined_messages.setter
+    def defined_messages(self, messages: Dict[str, Any]) -> None:
+        self.auto_replies.exact = dict(messages)
+
+    def add_auto_reply(self, key: str, reply: Union[str, Callable], match: MatchType = MatchType.EXACT) -> None:
+        """Replies to messages matching a key.
+
+        Args:
+            key (str): The text, prefix or regex pattern to match.
+            reply (Union[str, Callable]): The reply text, or a function called with the Message.
+            match (MatchType, optional): How the key is matched. Defaults to MatchType.EXACT.
+        """
+        self.auto_replies.add(key, reply, match)
 
     def build_api_url(self, base: str, endpoint: str) -> str:
         return f"{base}/{endpoint}"
 
 
-    async def make_post(self, url: str, data: dict = None, headers: dict = None) -> dict:
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Returns the pooled HTTP session, made on the running event loop if the loop it was made on is closed."""
+        loop = asyncio.get_running_loop()
+        session = self._session
+        if session is None or session.closed or self._session_loop is not loop:
+            if session is not None and not session.closed:
+                if not self._session_loop.is_closed():
+                    raise RuntimeError("The pooled session belongs to another running event loop")
+                # made on the loop of a previous sync call, nothing can be using it
+                session.connector._close()
+                session.detach()
+            connector = aiohttp.TCPConnector(limit=self.connection_limit, ttl_dns_cache=300)
+            session = self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return session
+
+    @contextlib.asynccontextmanager
+    async def _request_session(self):
+        """Yields the pooled session, or a session closed after the request on another running loop.
+
+        Sync calls from handler threads run on short-lived loops of their
+        own while the pooled session serves the loop of the client.
+        """
+        home = self._session_loop
+        if home is None or home is asyncio.get_running_loop() or home.is_closed() or self._session is None:
+            yield self._get_session()
+            return
         async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=data, headers=headers) as response:
+            yield session
+
+    async def close_session(self) -> None:
+        """Closes the pooled HTTP session, the next call opens a new one."""
+        session, self._session = self._session, None
+        if session is not None and not session.closed and self._session_loop is asyncio.get_running_loop():
+            await session.close()
+
+    @contextlib.contextmanager
+    def _observe_call(self, url: str):
+        """Records metrics and a tracing span around an outbound API call."""
+        call = {"status": "error"}
+        start = time.perf_counter()
+        with self.tracer.start_span("api_call", method=api_method(url)) as span:
+            try:
+                yield call
+            finally:
+                span.set_attribute("status", call["status"])
+                if self.metrics is not None:
+                    self.metrics.observe_api_call(url, call["status"], time.perf_counter() - start)
+
+    async def make_post(self, url: str, data: dict = None, headers: dict = None) -> dict:
+        method = api_method(url)
+        if headers is None and method in self.single_flight.methods:
+            key = ("POST", url, dumps(data, sort_keys=True, default=str))
+            return await self.single_flight.do(method, key, lambda: self._make_post(url, data, headers))
+        return await self._make_post(url, data, headers)
+
+    async def make_post_raw(self, url: str, body: bytes) -> dict:
+        """Posts a request body that is already serialized as JSON."""
+        return await self._make_post(url, body=body)
+
+    async def _make_post(self, url: str, data: dict = None, headers: dict = None, body: Optional[bytes] = None) -> dict:
+        if body is not None:
+            request = {"data": body, "headers": {"Content-Type": "application/json"}}
+        else:
+            request = {"json": data, "headers": headers}
+        with self._observe_call(url) as call:
+            async with self._request_session() as session, session.post(url, **request) as response:
+                call["status"] = response.status
                 json = await response.json()
                 if json['ok']:
                     return json
                 else:
+                    call["status"] = json.get('error_code', response.status)
                     if json['error_code'] == 404:
                         raise NotFoundException(f"Error not found 404 : {json['description'] if json['description'] else 'No description returned in error'}")
                     elif json['error_code'] == 403:
                         raise ForbiddenException(f"Error Forbidden 403 : {json['description'] if json['description'] else 'No description returned in error'}")
+                    elif json['error_code'] == 429:
+                        raise TooManyRequestsException(f"Too many requests 429 : {json.get('description') or 'No description'}",
+                                                       (json.get('parameters') or {}).get('retry_after', 1))
                     else:
                         raise PyroBaleException(f"unknown error : {json['description'] if json['description'] else 'No description!'}")
 
 
     async def make_get(self, url: str, headers: dict = None) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers) as response:
+        method = api_method(url)
+        if headers is None and method in self.single_flight.methods:
+            return await self.single_flight.do(method, ("GET", url), lambda: self._make_get(url, headers))
+        return await self._make_get(url, headers)
+
+    async def _make_get(self, url: str, headers: dict = None) -> dict:
+        with self._observe_call(url) as call:
+            async with self._request_session() as session, session.get(url, headers=headers) as response:
+                call["status"] = response.status
                 if not response.status == 200:
                     raise PyroBaleException("Unwanted Error from bale: "+str(response.status))
                 json = await response.json()
@@ -136,6 +343,7 @@ class Client:
                     if 'result' in json.keys():
                         return json
                     else:
+                        call["status"] = json.get('error_code', response.status)
                         if json['error_code'] == 404:
                             raise NotFoundException(f"Error not found 404 : {json['description'] if json['description'] else 'No description returned in error'}")
                         elif json['error_code'] == 403:
@@ -144,19 +352,24 @@ class Client:
                             raise PyroBaleException(f"unknown error : {json['description'] if json['description'] else 'No description'}")
 
     async def make_via_multipart(self, url: str, data: aiohttp.FormData) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, data=data) as resp:
+        with self._observe_call(url) as call:
+            async with self._request_session() as session, session.post(url, data=data) as resp:
+                call["status"] = resp.status
                 json_response = await resp.json()
                 if json_response.get('ok'):
                     return json_response
                 else:
                     error_code = json_response.get('error_code', 0)
                     description = json_response.get('description', 'No description')
+                    call["status"] = error_code
 
                     if error_code == 404:
                         raise NotFoundException(f"Error not found 404 : {description}")
                     elif error_code == 403:
                         raise ForbiddenException(f"Error Forbidden 403 : {description}")
+                    elif error_code == 429:
+                        raise TooManyRequestsException(f"Too many requests 429 : {description}",
+                                                       (json_response.get('parameters') or {}).get('retry_after', 1))
                     else:
                         raise PyroBaleException(f"Unknown error {error_code}: {description}")
 
@@ -171,17 +384,16 @@ class Client:
         Returns:
             how many milliseconds it took to ping
         """
-        async with aiohttp.ClientSession() as session:
-            start_time = time.perf_counter()
-            try:
-                async with session.get(f"{self.requests_base}/getme") as response:
-                    response_time = time.perf_counter() - start_time
-                    if round_it:
-                        return response_time
-                    else:
-                        return round(response_time, 2)
-            except Exception as e:
-                raise e
+        start_time = time.perf_counter()
+        try:
+            async with self._request_session() as session, session.get(f"{self.requests_base}/getme") as response:
+                response_time = time.perf_counter() - start_time
+                if round_it:
+                    return response_time
+                else:
+                    return round(response_time, 2)
+        except Exception as e:
+            raise e
 
     @smart_method
     async def get_updates(
@@ -209,6 +421,8 @@ class Client:
         )
         if data.get('ok'):
             if 'result' in data:
+                if self.metrics is not None:
+                    self.metrics.updates_received.inc(len(data["result"]))
                 return data.get("result")
             else:
                 if data.get('error_code') == 403:
@@ -239,16 +453,107 @@ class Client:
         return data.get("result", {})
 
     @smart_method
-    async def get_me(self) -> User:
+    async def get_me(self, refresh: bool = False) -> User:
         """Get information about the bot.
 
+        The bot is fetched once and kept in `me`; later calls return it without a request.
+
+        Args:
+            refresh (bool, optional): Fetch the bot again. Defaults to False.
+
         Returns:
             User: The bot.
         """
+        if self.me is not None and not refresh:
+            return self.me
         data = await self.make_get(self.requests_base + "/getMe")
         if not data:
             raise InvalidTokenException("Token is invalid")
-        return User(**data["result"])
+        self.me = User(**data["result"])
+        self._save_identity(data["result"])
+        return self.me
+
+    @smart_method
+    async def refresh_me(self) -> User:
+        """Fetch the bot again, for example after its username was changed.
+
+        Returns:
+            User: The bot.
+        """
+        return await self.get_me(refresh=True)
+
+    @property
+    def username(self) -> Optional[str]:
+        """Username of the bot, None until the bot was fetched."""
+        return self.me.username if self.me is not None else None
+
+    def mentions_me(self, message: Message) -> bool:
+        """Checks if a message mentions the bot by username or replies to one of its messages.
+
+        Args:
+            message (Message): The message.
+
+        Returns:
+            bool: Whether the bot is mentioned.
+        """
+        if self.me is None:
+            return False
+        reply = getattr(message, "reply_to_message", None)
+        if reply is not None and getattr(getattr(reply, "user", None), "id", None) == self.me.id:
+            return True
+        text = getattr(message, "text", None) or getattr(message, "caption", None)
+        if not text or not self.me.username:
+            return False
+        pattern = self._mention_pattern
+        if pattern is None or pattern[0] != self.me.username:
+            # "@mybot" but not "@mybot_other" or "@mybotx"
+            pattern = self._mention_pattern = (
+                self.me.username, re.compile(rf"@{re.escape(self.me.username)}\b", re.IGNORECASE)
+            )
+        return pattern[1].search(text) is not None
+
+    def _save_identity(self, raw: Dict[str, Any]) -> None:
+        if not self.identity_file:
+            return
+        temp_name = f"{self.identity_file}.tmp"
+        try:
+            with open(temp_name, "w") as f:
+                f.write(dumps(raw))
+            os.replace(temp_name, self.identity_file)
+        except OSError as e:
+            log.warning("Could not save bot identity to %s: %s", self.identity_file, e)
+
+    def _load_identity(self) -> Optional[User]:
+        if not self.identity_file or not os.path.exists(self.identity_file):
+            return None
+        try:
+            with open(self.identity_file) as f:
+                raw = loads(f.read())
+            me = User(**raw)
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("Ignoring unreadable bot identity file %s: %s", self.identity_file, e)
+            return None
+        # tokens start with the bot id, an identity of another bot is not used
+        if ":" in self.token and self.token.split(":", 1)[0] != str(me.id):
+            return None
+        return me
+
+    async def _ensure_me(self) -> None:
+        """Makes `me` available at startup, from the identity file when there is one."""
+        if self.me is not None:
+            return
+        self.me = self._load_identity()
+        if self.me is None:
+            await self.get_me()
+        else:
+            # the saved identity is used right away and refreshed in the background
+            self._identity_task = asyncio.get_running_loop().create_task(self._refresh_identity())
+
+    async def _refresh_identity(self) -> None:
+        try:
+            await self.get_me(refresh=True)
+        except Exception as e:
+            log.warning("Refreshing bot identity failed, using the saved one: %s", e)
 
     @smart_method
     async def logout(self) -> bool:
@@ -277,7 +582,8 @@ class Client:
             text: str,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a message to a chat.
 
         Args:
@@ -285,9 +591,10 @@ class Client:
             text (str): The text to send.
             reply_to_message_id (int, optional): The message ID to reply to. Defaults to None.
             reply_markup (Union[InlineKeyboardMarkup, ReplyKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
 
         Returns:
-            Message: The message.
+            Message: The message, or its MessageId when `return_result` is False.
         """
         data = await self.make_post(
             self.requests_base + "/sendMessage",
@@ -298,8 +605,44 @@ class Client:
                 "reply_markup": reply_markup.to_dict() if reply_markup else None,
             },
         )
-        result = pythonize(data.get("result", {}))
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
+
+    def send_message_nowait(
+            self,
+            chat_id: int,
+            text: str,
+            reply_to_message_id: Optional[int] = None,
+            reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
+    ) -> "Union[asyncio.Future[MessageId], concurrent.futures.Future]":
+        """Queue a message to be sent in the background and return at once.
+
+        It can be called from sync handlers: the message is queued on the
+        event loop of the client, and a ``concurrent.futures.Future`` is
+        returned instead, whose ``result()`` must not be waited for on that loop.
+
+        Args:
+            chat_id (int): The chat to send the message to.
+            text (str): The text to send.
+            reply_to_message_id (int, optional): The message ID to reply to. Defaults to None.
+            reply_markup (Union[InlineKeyboardMarkup, ReplyKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+
+        Returns:
+            asyncio.Future: Resolves with the MessageId of the sent message, awaiting it is optional.
+
+        Raises:
+            PyroBaleException: If called from another thread before the client made a request on its loop.
+        """
+        return self.sender.submit("sendMessage", {
+            "chat_id": chat_id,
+            "text": text,
+            "reply_to_message_id": reply_to_message_id,
+            "reply_markup": reply_markup.to_dict() if reply_markup else None,
+        })
+
+    def _message_result(self, data: Dict[str, Any], return_result: bool) -> Union[Message, MessageId]:
+        if return_result:
+            return Message(**pythonize(data.get("result", {})), client=self)
+        return MessageId(data["result"]["message_id"])
 
     @smart_method
     async def delete_message(
@@ -327,17 +670,18 @@ class Client:
 
     @smart_method
     async def forward_message(
-            self, chat_id: int, from_chat_id: int, message_id: int
-    ) -> Message:
+            self, chat_id: int, from_chat_id: int, message_id: int, return_result: bool = True
+    ) -> Union[Message, MessageId]:
         """Forward a message to a chat.
 
         Args:
             chat_id (int): The chat to send the message to.
             from_chat_id (int): The chat to send the message to.
             message_id (int): The message ID to forward.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
 
         Returns:
-            Message: The message.
+            Message: The message, or its MessageId when `return_result` is False.
         """
         data = await self.make_post(
             self.requests_base + "/forwardMessage",
@@ -347,22 +691,22 @@ class Client:
                 "message_id": message_id,
             },
         )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def copy_message(
-            self, chat_id: int, from_chat_id: int, message_id: int
-    ) -> Message:
+            self, chat_id: int, from_chat_id: int, message_id: int, return_result: bool = True
+    ) -> Union[Message, MessageId]:
         """Copy a message to a chat without forwarding.
 
         Args:
             chat_id (int): The chat to send the message to.
             from_chat_id (int): The chat to send the message to.
             message_id (int): The message ID to forward.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
 
         Returns:
-            Message: The message.
+            Message: The message, or its MessageId when `return_result` is False.
         """
         data = await self.make_post(
             self.requests_base + "/copyMessage",
@@ -372,8 +716,7 @@ class Client:
                 "message_id": message_id,
             },
         )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_photo(
@@ -383,7 +726,8 @@ class Client:
             caption: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a photo to a chat.
 
         Args:
@@ -392,6 +736,7 @@ class Client:
             caption (Optional[str], optional): The caption of the photo. Defaults to None.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
         handler = "/sendPhoto"
         if isinstance(photo, InputFile):
@@ -423,8 +768,7 @@ class Client:
                     "reply_markup": reply_markup.to_dict() if reply_markup else None,
                 },
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_audio(
@@ -434,7 +778,8 @@ class Client:
             caption: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send an audio to a chat.
 
         Args:
@@ -443,6 +788,7 @@ class Client:
             caption (Optional[str], optional): The caption of the audio. Defaults to None.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
         handler = "/sendAudio"
         if isinstance(audio, InputFile) or isinstance(audio, bytes):
@@ -477,8 +823,7 @@ class Client:
                     "reply_markup": reply_markup.to_dict() if reply_markup else None,
                 },
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_document(
@@ -488,7 +833,8 @@ class Client:
             caption: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a document to a chat.
 
         Args:
@@ -497,6 +843,7 @@ class Client:
             caption (Optional[str], optional): The caption of the document. Defaults to None.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
         handler = "/sendDocument"
         if isinstance(document, InputFile):
@@ -528,8 +875,7 @@ class Client:
                     "reply_markup": reply_markup.to_dict() if reply_markup else None,
                 },
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_video(
@@ -539,7 +885,8 @@ class Client:
             caption: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a video to a chat.
 
         Args:
@@ -548,6 +895,7 @@ class Client:
             caption (Optional[str], optional): The caption of the video. Defaults to None.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
         handler = "/sendVideo"
         if isinstance(video, InputFile):
@@ -579,8 +927,7 @@ class Client:
                     "reply_markup": reply_markup.to_dict() if reply_markup else None,
                 },
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_animation(
@@ -590,7 +937,8 @@ class Client:
             caption: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send an animation (GIF) to a chat.
 
         Args:
@@ -599,6 +947,7 @@ class Client:
             caption (Optional[str], optional): The caption of the animation. Defaults to None.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
         handler = "/sendAnimation"
         if isinstance(animation, InputFile):
@@ -630,8 +979,7 @@ class Client:
                     "reply_markup": reply_markup.to_dict() if reply_markup else None,
                 },
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_voice(
@@ -641,7 +989,8 @@ class Client:
             caption: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a voice message to a chat.
 
         Args:
@@ -650,6 +999,7 @@ class Client:
             caption (Optional[str], optional): The caption of the voice. Defaults to None.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
         handler = "/sendVoice"
         if isinstance(voice, InputFile):
@@ -681,8 +1031,7 @@ class Client:
                     "reply_markup": reply_markup.to_dict() if reply_markup else None,
                 },
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_media_group(
@@ -723,7 +1072,8 @@ class Client:
             horizontal_accuracy: Optional[float] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a location to a chat.
 
         Args:
@@ -733,9 +1083,10 @@ class Client:
             horizontal_accuracy (Optional[float], optional): The horizontal accuracy of the location.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
 
         Returns:
-            Message: The message.
+            Message: The message, or its MessageId when `return_result` is False.
         """
         data = await self.make_post(
             self.requests_base + "/sendLocation",
@@ -748,8 +1099,7 @@ class Client:
                 "reply_markup": reply_markup.to_dict() if reply_markup else None,
             },
         )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_contact(
@@ -760,7 +1110,8 @@ class Client:
             last_name: Optional[str] = None,
             reply_to_message_id: Optional[int] = None,
             reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
-    ) -> Message:
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Send a contact to a chat.
 
         Args:
@@ -770,9 +1121,10 @@ class Client:
             last_name (Optional[str], optional): The last name of the contact.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
             reply_markup (Optional[InlineKeyboardMarkup], optional): The reply keyboard markup.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
 
         Returns:
-            Message: The message.
+            Message: The message, or its MessageId when `return_result` is False.
         """
         data = await self.make_post(
             self.requests_base + "/sendContact",
@@ -785,8 +1137,7 @@ class Client:
                 "reply_markup": reply_markup.to_dict() if reply_markup else None,
             },
         )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
     @smart_method
     async def send_invoice(
@@ -905,6 +1256,7 @@ class Client:
             self.requests_base + "/banChatMember",
             data={"chat_id": chat_id, "user_id": user_id},
         )
+        self._invalidate_member(chat_id, user_id)
         try:
             return data.get("ok", False)
         except AttributeError:
@@ -946,6 +1298,7 @@ class Client:
                   "until_date": until_date
                   },
         )
+        self._invalidate_member(chat_id, user_id)
         try:
             return data.get("ok", False)
         except AttributeError:
@@ -966,6 +1319,7 @@ class Client:
             self.requests_base + "/unbanChatMember",
             data={"chat_id": chat_id, "user_id": user_id},
         )
+        self._invalidate_member(chat_id, user_id)
         return data.get("ok", False)
 
     @smart_method
@@ -986,6 +1340,64 @@ class Client:
         except:
             return False
 
+    def _chat_user_pairs(self, chat_ids: Union[int, str, Iterable], user_ids: Iterable[int]) -> List[tuple]:
+        chats = [chat_ids] if isinstance(chat_ids, (int, str)) else list(chat_ids)
+        users = list(user_ids)
+        return [(chat_id, user_id) for chat_id in chats for user_id in users]
+
+    async def _run_batch(self, targets: Iterable, call: Callable[[Any], Awaitable[Any]],
+                         concurrency: Optional[int]) -> BatchResult:
+        return await run_batch(targets, call, concurrency or self.batch_concurrency, self.batch_limiter)
+
+    @smart_method
+    async def delete_messages(self, chat_id: Union[int, str], message_ids: Iterable[int],
+                              concurrency: Optional[int] = None) -> BatchResult:
+        """Deletes many messages of a chat concurrently.
+
+        Args:
+            chat_id (Union[int, str]): The chat of the messages.
+            message_ids (Iterable[int]): The messages to delete, duplicates are deleted once.
+            concurrency (int, optional): Calls in flight. Defaults to the client's batch_concurrency.
+
+        Returns:
+            BatchResult: The result or error of every message id.
+        """
+        return await self._run_batch(message_ids, lambda message_id: self.delete_message(chat_id, message_id),
+                                     concurrency)
+
+    @smart_method
+    async def ban_many(self, chat_ids: Union[int, str, Iterable], user_ids: Iterable[int],
+                       concurrency: Optional[int] = None) -> BatchResult:
+        """Bans many users from one or more chats concurrently.
+
+        Args:
+            chat_ids (Union[int, str, Iterable]): The chat, or chats, to ban the users from.
+            user_ids (Iterable[int]): The users to ban, duplicates are banned once.
+            concurrency (int, optional): Calls in flight. Defaults to the client's batch_concurrency.
+
+        Returns:
+            BatchResult: The result or error of every (chat_id, user_id) pair.
+        """
+        return await self._run_batch(self._chat_user_pairs(chat_ids, user_ids),
+                                     lambda pair: self.ban_chat_member(*pair), concurrency)
+
+    @smart_method
+    async def restrict_many(self, chat_ids: Union[int, str, Iterable], user_ids: Iterable[int],
+                            concurrency: Optional[int] = None, **permissions) -> BatchResult:
+        """Restricts many users in one or more chats concurrently.
+
+        Args:
+            chat_ids (Union[int, str, Iterable]): The chat, or chats, to restrict the users in.
+            user_ids (Iterable[int]): The users to restrict, duplicates are restricted once.
+            concurrency (int, optional): Calls in flight. Defaults to the client's batch_concurrency.
+            **permissions: Arguments of `restrict_chat_member`, like `can_send_messages=False`.
+
+        Returns:
+            BatchResult: The result or error of every (chat_id, user_id) pair.
+        """
+        return await self._run_batch(self._chat_user_pairs(chat_ids, user_ids),
+                                     lambda pair: self.restrict_chat_member(*pair, **permissions), concurrency)
+
     @smart_method
     async def get_chat_administrators(self, chat_id: Union[int,str]) -> List[ChatMember]:
         """Gets a list of administrators of a specified chat.
@@ -997,17 +1409,43 @@ class Client:
             A list of administrators.
         """
 
-        data = await self.make_post(
-            self.requests_base + "/getChatAdministrators",
-            data={"chat_id": chat_id},
-        )
+        async def load():
+            data = await self.make_post(
+                self.requests_base + "/getChatAdministrators",
+                data={"chat_id": chat_id},
+            )
 
-        if not data:
-            raise ForbiddenException("You cannot get administrators for this chat!")
+            if not data:
+                raise ForbiddenException("You cannot get administrators for this chat!")
+            return data["result"]
 
-        res = data["result"]
+        if self.membership_cache is None:
+            res = await load()
+        else:
+            res = await self.membership_cache.get_admins(chat_id, load)
         return [ChatMember(**member) for member in res]
 
+    async def _fetch_chat_member(self, chat_id: Union[int, str], user_id: int) -> Dict[str, Any]:
+        """Returns the raw chat member, from the membership cache when enabled."""
+
+        async def load():
+            data = await self.make_post(
+                self.requests_base + "/getChatMember",
+                data={"chat_id": chat_id, "user_id": user_id},
+            )
+
+            if not data:
+                raise ForbiddenException("You cannot get this chat member!")
+            return data.get("result", {})
+
+        if self.membership_cache is None:
+            return await load()
+        return await self.membership_cache.get_member(chat_id, user_id, load)
+
+    def _invalidate_member(self, chat_id: Union[int, str], user_id: int) -> None:
+        if self.membership_cache is not None:
+            self.membership_cache.invalidate_member(chat_id, user_id)
+
     @smart_method
     async def get_chat_member(self, chat_id: Union[int,str], user_id: int) -> ChatMember:
         """Get a chat member.
@@ -1019,14 +1457,8 @@ class Client:
         Returns:
             ChatMember: The chat member.
         """
-        data = await self.make_post(
-            self.requests_base + "/getChatMember",
-            data={"chat_id": chat_id, "user_id": user_id},
-        )
-
-        if not data:
-            raise ForbiddenException("You cannot get this chat member!")
-        temp = data.get("result", [])
+        # copied, the raw member may be shared with the membership cache
+        temp = dict(await self._fetch_chat_member(chat_id, user_id))
         temp["chat"] = await self.get_chat(chat_id)
         temp["client"] = self
         data = temp
@@ -1045,11 +1477,11 @@ class Client:
             bool: Whether the user is admin in a chat.
         """
         try:
-            chat_user = await self.get_chat_member(chat_id, user_id)
+            chat_user = await self._fetch_chat_member(chat_id, user_id)
         except ForbiddenException:
             return False
 
-        if chat_user.status in ['creator', 'administrator']:
+        if chat_user.get("status") in ['creator', 'administrator']:
             return True
         else:
             return False
@@ -1066,8 +1498,8 @@ class Client:
         Returns:
             bool: Whether the user has a specified permission.
         """
-        member = await self.get_chat_member(chat_id, user_id)
-        if member.inputs[permissions.value]:
+        member = await self._fetch_chat_member(chat_id, user_id)
+        if member.get(permissions.value):
             return True
         else:
             return False
@@ -1118,6 +1550,7 @@ class Client:
                 "can_promote_members": can_promote_members,
             },
         )
+        self._invalidate_member(chat_id, user_id)
         return data.get("ok", False)
 
     @smart_method
@@ -1150,6 +1583,8 @@ class Client:
         data = await self.make_post(
             self.requests_base + "/leaveChat", data={"chat_id": chat_id}
         )
+        if self.membership_cache is not None:
+            self.membership_cache.invalidate_chat(chat_id)
         return data.get("ok", False)
 
     @smart_method
@@ -1163,11 +1598,8 @@ class Client:
         Returns:
             bool: Whether the user is joined to a chat.
         """
-        data = await self.make_post(
-            self.requests_base + "/getChatMember",
-            data={"chat_id": chat_id, "user_id": user_id},
-        )
-        return data.get("result", {}).get("status") in ["member", "creator", "administrator"]
+        member = await self._fetch_chat_member(chat_id, user_id)
+        return member.get("status") in JOINED_STATUSES
 
     @smart_method
     async def get_chat(self, chat_id: Union[int,str]) -> ChatFullInfo:
@@ -1431,14 +1863,16 @@ class Client:
             self,
             chat_id: Union[int, str],
             sticker: Union[InputFile, Sticker, str],
-            reply_to_message_id: Optional[int] = None
-    ) -> Message:
+            reply_to_message_id: Optional[int] = None,
+            return_result: bool = True,
+    ) -> Union[Message, MessageId]:
         """Sends a sticer to a chat.
         
         Args:
             chat_id (Union[int, str]): The chat to send the message to.
             sticker (Union[InputFile, Sticker, str]): The sticker to send.
             reply_to_message_id (Optional[int], optional): The message ID to reply to. Defaults to None.
+            return_result (bool, optional): Whether to build the sent Message, only its MessageId is returned otherwise. Defaults to True.
         """
 
         handler = "/sendSticker"
@@ -1459,8 +1893,7 @@ class Client:
             data = await self.make_get(
                 query
             )
-        result = pythonize(data["result"])
-        return Message(**result, client=self)
+        return self._message_result(data, return_result)
 
 
     @smart_method
@@ -1483,7 +1916,8 @@ class Client:
         form.add_field("sticker", sticker.file_input, filename=sticker.file_name or "Sticker.webp")
         data = await self.make_via_multipart(self.requests_base + '/uploadStickerFile', form)
         result = pythonize(data['result'])
-        print(result)
+        log.debug("Uploaded sticker file: %s", result)
+        return result
 
     @smart_method
     async def revoke_chat_invite_link(self, chat_id: int, invite_link: str) -> str:
@@ -1535,13 +1969,88 @@ class Client:
         return data.get("ok", False)
 
 
+    @smart_method
+    async def broadcast(
+            self,
+            chat_ids: Union[Iterable, AsyncIterable],
+            text: Optional[str] = None,
+            from_chat_id: Optional[Union[int, str]] = None,
+            message_id: Optional[int] = None,
+            forward: bool = False,
+            reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
+            job_id: Optional[str] = None,
+            storage: Optional[BaseStorage] = None,
+            concurrency: int = 20,
+            rate: float = 20,
+            **kwargs
+    ) -> BroadcastReport:
+        """Send a text, or copy or forward a message, to many chats.
+
+        Args:
+            chat_ids (Union[Iterable, AsyncIterable]): The chats to send to.
+            text (str, optional): The text to send. Defaults to None.
+            from_chat_id (Union[int, str], optional): The chat of the message to copy or forward. Defaults to None.
+            message_id (int, optional): The message to copy or forward. Defaults to None.
+            forward (bool, optional): Forward the message instead of copying it. Defaults to False.
+            reply_markup (Union[InlineKeyboardMarkup, ReplyKeyboardMarkup], optional): The reply markup of texts. Defaults to None.
+            job_id (str, optional): Id of the broadcast, a broadcast with the id of an unfinished one resumes it. Defaults to a random id.
+            storage (BaseStorage, optional): Storage of the outcomes, persistent storages make broadcasts resumable after a restart. Defaults to a MemoryStorage.
+            concurrency (int, optional): Maximum sends in flight. Defaults to 20.
+            rate (float, optional): Maximum sends per second. Defaults to 20.
+            **kwargs: Other options of :class:`~pyrobale.broadcast.Broadcast`, like `retries` and `on_progress`.
+
+        Returns:
+            BroadcastReport: The outcome counts and throughput.
+        """
+        if text is not None:
+            async def send(client, chat_id):
+                await client.send_message(chat_id, text, reply_markup=reply_markup, return_result=False)
+        elif from_chat_id is not None and message_id is not None:
+            method = self.forward_message if forward else self.copy_message
+
+            async def send(client, chat_id):
+                await method(chat_id, from_chat_id, message_id, return_result=False)
+        else:
+            raise ValueError("broadcast needs a text, or from_chat_id and message_id")
+
+        kwargs.setdefault("rate_limiter", RateLimiter(rate, name="broadcast"))
+        job = Broadcast(self, chat_ids, send, job_id=job_id, storage=storage, concurrency=concurrency, **kwargs)
+        return await job.run()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns runtime statistics of the client.
+
+        Returns:
+            Dict: Handler executor saturation, running, dropped and timed out handler
+            calls, pending waiters, the last update id and, when a loop monitor is
+            attached, event loop lag and blocking counts.
+        """
+        stats: Dict[str, Any] = {
+            "running": self.running,
+            "last_update_id": self.last_update_id,
+            "pending_waiters": len(self._waiters),
+            "registered_handlers": len(self.handlers),
+        }
+        stats.update({f"executor_{key}": value for key, value in executor_stats(self.handler_executor).items()})
+        stats.update({f"handlers_{key}": value for key, value in self.handler_runner.stats().items()})
+        if self.loop_monitor is not None:
+            stats.update(self.loop_monitor.stats())
+        stats.update({f"sender_{key}": value for key, value in self.sender.stats().items()})
+        stats["duplicate_updates"] = self.offsets.duplicates
+        stats.update({f"payments_{key}": value for key, value in self.transactions.stats().items()})
+        stats.update({f"coalesced_{method}": count for method, count in self.single_flight.coalesced.items()})
+        if self.membership_cache is not None:
+            for name, cache_stats in self.membership_cache.stats().items():
+                stats.update({f"cache_{name}_{key}": value for key, value in cache_stats.items()})
+        return stats
+
     async def wait_for(self, update_type: UpdatesTypes, check=None, timeout: Optional[float] = None):
         """Wait until a specified update
 
         Args:
             update_type (UpdatesTypes): The update to wait for.
             check (Callable, optional): The check method to check.
-            timeout (float, optional): Maximum time to wait in seconds. Defaults to None (wait forever).
+            timeout (float, optional): Maximum time to wait in seconds. Defaults to the client's `waiter_timeout`.
 
         Returns:
             The update object that matches the criteria.
@@ -1551,9 +2060,16 @@ class Client:
         """
         loop = asyncio.get_running_loop()
         future = loop.create_future()
+        if timeout is None:
+            timeout = self.waiter_timeout
 
         waiter_entry = (update_type, check, future)
         self._waiters.append(waiter_entry)
+        if self.max_waiters is not None:
+            while len(self._waiters) > self.max_waiters:
+                _, _, oldest = self._waiters.pop(0)
+                if not oldest.done():
+                    oldest.set_exception(asyncio.TimeoutError("Evicted because too many wait_for calls are pending"))
 
         try:
             if timeout is None:
@@ -1579,33 +2095,45 @@ class Client:
                 self._waiters.remove(waiter_entry)
             raise
 
+    @staticmethod
+    def _update_chat_id(update: Dict[str, Any]) -> Optional[int]:
+        for key in ("message", "edited_message"):
+            if key in update:
+                return (update[key].get("chat") or {}).get("id")
+        if "callback_query" in update:
+            return ((update["callback_query"].get("message") or {}).get("chat") or {}).get("id")
+        return None
+
     @smart_method
     async def process_update(self, update: Dict[str, Any]) -> None:
         """Process a single update and call registered handlers."""
         if not update or not isinstance(update, dict):
             return
         update_id = update.get("update_id")
-        if update_id:
-            self.last_update_id = update_id + 1
+        if update_id is not None and not self.offsets.begin(update_id):
+            dispatcher_log.debug("Dropped duplicate update %s", update_id)
+            return
+        if self.membership_cache is not None:
+            self.membership_cache.observe_update(update)
+        try:
+            with self.tracer.start_span("process_update", update_id=update_id,
+                                        chat_id=self._update_chat_id(update)), update_scope():
+                await self._process_update(update)
+        except BaseException:
+            if update_id is not None:
+                self.offsets.abort(update_id)
+            raise
+        if update_id is not None:
+            self.offsets.commit(update_id)
+        if self.metrics is not None:
+            self.metrics.observe_update(update)
 
-        if self.check_defined_message:
+    async def _process_update(self, update: Dict[str, Any]) -> None:
+        if self.check_defined_message and self.auto_replies:
             try:
-                update_raw = update.get('message', {})
-                update_raw_text = update_raw.get("text")
-                if update_raw_text in self.defined_messages:
-                    cb = self.defined_messages.get(update_raw_text)
-                    if callable(cb) and cb:
-                        loop = asyncio.get_event_loop()
-                        await loop.run_in_executor(self.handler_executor, lambda: cb(self._convert_event(UpdatesTypes.MESSAGE, update_raw)))
-                    else:
-                        await self.send_message(
-                            update_raw.get('chat', {}).get('id'),
-                            self.defined_messages.get(update_raw.get("text", {}), {}),
-                            update_raw.get('message_id')
-                        )
+                await self.auto_replies.dispatch(update)
             except Exception as e:
-                print(f"Error processing defined message: {e}")
-                traceback.print_exc()
+                dispatcher_log.exception("Error processing defined message: %s", e)
 
         waiters_to_remove = []
         for waiter in self._waiters[:]:
@@ -1660,7 +2188,7 @@ class Client:
                             future.set_result(event)
                             waiters_to_remove.append(waiter)
                 except Exception as e:
-                    print(f"Error in waiter check: {e}")
+                    dispatcher_log.warning("Error in waiter check: %s", e)
                     if not future.done():
                         future.set_exception(e)
                     waiters_to_remove.append(waiter)
@@ -1669,122 +2197,167 @@ class Client:
             if waiter in self._waiters:
                 self._waiters.remove(waiter)
         
-        success_payment = None
         if not waiters_to_remove:
-            if self.handle_pre_checkout_query:
-                if "pre_checkout_query" in update:
-                    preCheckout = PreCheckoutQuery(**pythonize(update["pre_checkout_query"]), client=self)
-                    await self.answer_pre_checkout_query(preCheckout, ok=True)
-                    await asyncio.sleep(2)
-                    trans = await self.inquire_transaction(preCheckout.id)
-                    while trans.status not in [TransactionStatus.PAID, TransactionStatus.FAILED]:
-                        await asyncio.sleep(2)
-                        trans = await self.inquire_transaction(preCheckout.id)
-                    if trans.status == TransactionStatus.PAID: 
-                        success_payment = SuccessfulPayment(preCheckout.currency, preCheckout.total_amount, preCheckout.invoice_payload, telegram_payment_charge_id=preCheckout.id, provider_payment_charge_id=preCheckout.id)
-                        
-            for handler in self.handlers:
-                handler_type = handler.get("type")
-                event = None
-
-                if handler_type == UpdatesTypes.UPDATE:
-                    event = self._convert_event(UpdatesTypes.UPDATE, update)
-
-                if handler_type == UpdatesTypes.SUCCESSFUL_PAYMENT:
-                    if success_payment:
-                        event = success_payment
-
-                elif handler_type == UpdatesTypes.COMMAND:
-                    message_data = update.get("message", {})
-                    message_text = message_data.get("text", "")
-                    if message_text and message_text.startswith("/"):
-                        command_parts = message_text[1:].split()
-                        if command_parts:
-                            actual_command = command_parts[0].split('@')[0]
-                            expected_command = handler.get("command", "")
-                            if actual_command == expected_command:
-                                event = self._convert_event(UpdatesTypes.MESSAGE, message_data)
-                
-                elif handler_type == UpdatesTypes.MESSAGE_EDITED:
-                    message_data = update
-                    if "edited_message" in message_data:
-                        event = self._convert_event(handler_type, message_data.get('edited_message'))
-
-                elif handler_type == UpdatesTypes.MEMBER_JOINED:
-                    message_data = update.get("message", {})
-                    if "new_chat_members" in message_data:
-                        event = self._convert_event(handler_type, message_data)
-
-                elif handler_type == UpdatesTypes.MEMBER_LEFT:
-                    message_data = update.get("message", {})
-                    if "left_chat_member" in message_data:
-                        event = self._convert_event(handler_type, message_data)
-
-                elif handler_type == UpdatesTypes.PRE_CHECKOUT_QUERY:
-                    if "pre_checkout_query" in update:
-                        event = self._convert_event(handler_type, update["pre_checkout_query"])
-
-                
+            if self.handle_pre_checkout_query and "pre_checkout_query" in update:
+                preCheckout = PreCheckoutQuery(**pythonize(update["pre_checkout_query"]), client=self)
+                await self.answer_pre_checkout_query(preCheckout, ok=True)
+                # inquired in the background, SUCCESSFUL_PAYMENT handlers run once it is paid
+                self.transactions.watch(preCheckout)
 
-                else:
-                    update_type_key = handler_type.value
-                    if update_type_key in update:
-                        raw_event = update[update_type_key]
-                        event = self._convert_event(handler_type, raw_event)
+            if self.scenes.scenes and await self.scenes.dispatch(update):
+                return
 
+            for handler in self.handlers:
+                event = self._handler_event(handler, update)
                 if event is None:
                     continue
 
-                event_filters = handler.get("filters")
-                skip = False
-                if isinstance(event_filters, list) and len(event_filters)>0 and not isinstance(event_filters[0], tuple):
-                    for event_filter in event_filters:
-                        if callable(event_filter):
-                            try:
-                                if not await event_filter(event, self):
-                                    skip = True
-                            except Exception as e:
-                                print(f"[Filter Error] {e}")
-                                traceback.print_exc()
-                                skip = True
-                        elif isinstance(event_filter, str):
-                            if hasattr(event, event_filter) and getattr(event, event_filter) != None:
-                                skip = False
-                            else:
-                                skip = True
-                else:
-                    try:
-                        event_filters = event_filters[0].lst
-                        for event_filter in event_filters:
-                            try:
-                                do_event_filter = await event_filter[0](event, self)
-                                if not do_event_filter:
-                                    skip = True
-                            except Exception as e:
-                                print(f"[Filter Error] {e}")
-                                traceback.print_exc()
-                                skip = True
-                            
-                            if event_filter[1]:
-                                skip = not skip
-
-                            if skip:
-                                break
-                    except Exception as e:
-                        pass
-                
-                if skip:
+                callback = handler["callback"]
+                handler_name = getattr(callback, "__qualname__", repr(callback))
+                if not await self._passes_filters(handler, event, handler_name):
                     continue
 
-                callback = handler["callback"]
+                if handler.get("process"):
+                    await self._submit_process_handler(handler, callback, handler_name, update)
+                else:
+                    await self._submit_handler(handler, callback, handler_name, event)
+
+    def _handler_event(self, handler: Dict[str, Any], update: Dict[str, Any]) -> Any:
+        """Returns the event a handler gets for an update, None when the update is not for it."""
+        handler_type = handler.get("type")
+        event = None
+
+        if handler_type == UpdatesTypes.UPDATE:
+            event = self._convert_event(UpdatesTypes.UPDATE, update)
+
+        if handler_type == UpdatesTypes.SUCCESSFUL_PAYMENT:
+            return None
+
+        elif handler_type == UpdatesTypes.COMMAND:
+            message_data = update.get("message", {})
+            message_text = message_data.get("text", "")
+            if message_text and message_text.startswith("/"):
+                command_parts = message_text[1:].split()
+                if command_parts:
+                    actual_command, _, mentioned = command_parts[0].partition('@')
+                    expected_command = handler.get("command", "")
+                    # commands addressed to another bot are not ours
+                    if mentioned and self.username and mentioned.casefold() != self.username.casefold():
+                        return None
+                    if actual_command == expected_command:
+                        event = self._convert_event(UpdatesTypes.MESSAGE, message_data)
+        
+        elif handler_type == UpdatesTypes.MESSAGE_EDITED:
+            message_data = update
+            if "edited_message" in message_data:
+                event = self._convert_event(handler_type, message_data.get('edited_message'))
+
+        elif handler_type == UpdatesTypes.MEMBER_JOINED:
+            message_data = update.get("message", {})
+            if "new_chat_members" in message_data:
+                event = self._convert_event(handler_type, message_data)
+
+        elif handler_type == UpdatesTypes.MEMBER_LEFT:
+            message_data = update.get("message", {})
+            if "left_chat_member" in message_data:
+                event = self._convert_event(handler_type, message_data)
+
+        elif handler_type == UpdatesTypes.PRE_CHECKOUT_QUERY:
+            if "pre_checkout_query" in update:
+                event = self._convert_event(handler_type, update["pre_checkout_query"])
+
+        else:
+            update_type_key = handler_type.value
+            if update_type_key in update:
+                raw_event = update[update_type_key]
+                event = self._convert_event(handler_type, raw_event)
+        return event
+
+    async def _passes_filters(self, handler: Dict[str, Any], event: Any, handler_name: str) -> bool:
+        expression = handler.get("filters")
+        with self.tracer.start_span("filters", handler=handler_name):
+            if expression is None:
+                return True
+            if expression.is_async:
+                return await expression.evaluate(event, self)
+            return expression.check_nowait(event, self)
+
+    async def _dispatch_payment(self, payment: SuccessfulPayment) -> None:
+        """Launches the SUCCESSFUL_PAYMENT handlers of a paid transaction."""
+        for handler in self.handlers:
+            if handler.get("type") != UpdatesTypes.SUCCESSFUL_PAYMENT:
+                continue
+            callback = handler["callback"]
+            handler_name = getattr(callback, "__qualname__", repr(callback))
+            try:
+                if await self._passes_filters(handler, payment, handler_name):
+                    await self._submit_handler(handler, callback, handler_name, payment)
+            except Exception as e:
+                dispatcher_log.exception("Error dispatching payment to %s: %s", handler_name, e)
+
+    async def _submit_handler(self, handler: Dict[str, Any], callback: Callable, handler_name: str,
+                              event: Any, *args: Any) -> None:
+        """Launches a handler callback through the handler runner."""
+        try:
+            if inspect.iscoroutinefunction(callback):
+                factory = functools.partial(self._run_handler, callback, event, handler_name, *args)
+            else:
+                factory = functools.partial(
+                    asyncio.get_running_loop().run_in_executor, self.handler_executor,
+                    contextvars.copy_context().run, self._call_handler, callback, event, handler_name, *args
+                )
+            await self.handler_runner.submit(handler, factory, handler_name)
+        except Exception as e:
+            dispatcher_log.exception("Error executing handler %s: %s", handler_name, e)
+
+    def _get_process_executor(self) -> ProcessPoolExecutor:
+        """Returns the process pool of the handlers marked with `process`, started on first use."""
+        if self._process_executor is None:
+            from .process import init_worker
+            self._process_executor = ProcessPoolExecutor(self.process_workers, initializer=init_worker,
+                                                         initargs=(self.token, self.base_url))
+        return self._process_executor
+
+    async def _submit_process_handler(self, handler: Dict[str, Any], callback: Callable, handler_name: str,
+                                      update: Dict[str, Any]) -> None:
+        """Launches a handler callback on the process pool, then makes the API calls it recorded."""
+        from .process import run_in_process
+        # the raw update and the handler type are all the worker needs to rebuild the event
+        spec = {"type": handler["type"], "command": handler.get("command")}
+
+        async def run():
+            with self.tracer.start_span("handler", handler=handler_name):
                 try:
-                    if inspect.iscoroutinefunction(callback):
-                        asyncio.create_task(callback(event))
-                    else:
-                        self.handler_executor.submit(callback, event)
+                    actions = await asyncio.get_running_loop().run_in_executor(
+                        self._get_process_executor(), run_in_process, callback, spec, update
+                    )
                 except Exception as e:
-                    print(f"Error executing handler: {e}")
-                    traceback.print_exc()
+                    dispatcher_log.exception("Error in handler %s: %s", handler_name, e)
+                    return
+                for method, data in actions:
+                    try:
+                        await self.make_post(self.requests_base + "/" + method, data)
+                    except Exception as e:
+                        dispatcher_log.exception("Error in %s of handler %s: %s", method, handler_name, e)
+
+        try:
+            await self.handler_runner.submit(handler, run, handler_name)
+        except Exception as e:
+            dispatcher_log.exception("Error executing handler %s: %s", handler_name, e)
+
+    async def _run_handler(self, callback: Callable, event: Any, handler_name: str, *args: Any) -> None:
+        with self.tracer.start_span("handler", handler=handler_name):
+            try:
+                await callback(event, *args)
+            except Exception as e:
+                dispatcher_log.exception("Error in handler %s: %s", handler_name, e)
+
+    def _call_handler(self, callback: Callable, event: Any, handler_name: str, *args: Any) -> None:
+        with self.tracer.start_span("handler", handler=handler_name):
+            try:
+                callback(event, *args)
+            except Exception as e:
+                dispatcher_log.exception("Error in handler %s: %s", handler_name, e)
 
     def _convert_event(self, handler_type: UpdatesTypes, event_data: Dict[str, Any]) -> Any:
         """Convert raw event data to appropriate object type."""
@@ -1833,8 +2406,7 @@ class Client:
                 return event_data
 
         except Exception as e:
-            print(f"Error converting event {handler_type}: {e}")
-            traceback.print_exc()
+            dispatcher_log.exception("Error converting event %s: %s", handler_type, e)
             return event_data
 
     def base_handler_decorator(self, update_type: UpdatesTypes):
@@ -1847,9 +2419,9 @@ class Client:
             Callable: The decorated handler.
         """
 
-        def wrapper(*filters: Any):
+        def wrapper(*filters: Any, **kwargs):
             def decorator(callback: Callable[[Any], Union[None, Awaitable[None]]]):
-                self.add_handler(update_type, callback, *filters)
+                self.add_handler(update_type, callback, *filters, **kwargs)
                 return callback
 
             return decorator
@@ -1860,42 +2432,42 @@ class Client:
         """Decorator for handling command updates."""
 
         def decorator(callback: Callable[[Any], Union[None, Awaitable[None]]]):
-            self.add_handler(UpdatesTypes.COMMAND, callback, *filters, command=command)
+            self.add_handler(UpdatesTypes.COMMAND, callback, *filters, command=command, **kwargs)
             return callback
 
         return decorator
 
     def on_message(self, *filters: Any, **kwargs):
         """Decorator for handling new message updates."""
-        return self.base_handler_decorator(UpdatesTypes.MESSAGE)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.MESSAGE)(*filters, **kwargs)
 
     def on_edited_message(self, *filters: Any, **kwargs):
         """Decorator for handling edited message updates."""
-        return self.base_handler_decorator(UpdatesTypes.MESSAGE_EDITED)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.MESSAGE_EDITED)(*filters, **kwargs)
 
     def on_callback_query(self, *filters: Any, **kwargs):
         """Decorator for handling callback query updates."""
-        return self.base_handler_decorator(UpdatesTypes.CALLBACK_QUERY)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.CALLBACK_QUERY)(*filters, **kwargs)
 
     def on_new_members(self, *filters: Any, **kwargs):
         """Decorator for handling new chat members updates."""
-        return self.base_handler_decorator(UpdatesTypes.MEMBER_JOINED)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.MEMBER_JOINED)(*filters, **kwargs)
 
     def on_members_left(self, *filters: Any, **kwargs):
         """Decorator for handling members left updates."""
-        return self.base_handler_decorator(UpdatesTypes.MEMBER_LEFT)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.MEMBER_LEFT)(*filters, **kwargs)
 
     def on_pre_checkout_query(self, *filters: Any, **kwargs):
         """Decorator for handling pre-checkout query updates."""
-        return self.base_handler_decorator(UpdatesTypes.PRE_CHECKOUT_QUERY)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.PRE_CHECKOUT_QUERY)(*filters, **kwargs)
 
     def on_photo(self, *filters: Any, **kwargs):
         """Decorator for handling photo updates."""
-        return self.base_handler_decorator(UpdatesTypes.PHOTO)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.PHOTO)(*filters, **kwargs)
 
     def on_successful_payment(self, *filters: Any, **kwargs):
         """Decorator for handling successful payment updates."""
-        return self.base_handler_decorator(UpdatesTypes.SUCCESSFUL_PAYMENT)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.SUCCESSFUL_PAYMENT)(*filters, **kwargs)
 
     def on_ready(self):
         def decorator(callback):
@@ -1909,7 +2481,7 @@ class Client:
     
     def on_update(self, *filters: Any, **kwargs):
         """Decorator for handling photo updates."""
-        return self.base_handler_decorator(UpdatesTypes.UPDATE)(*filters)
+        return self.base_handler_decorator(UpdatesTypes.UPDATE)(*filters, **kwargs)
 
     def on_tick(self, interval: float):
         def decorator(callback: Callable):
@@ -1926,8 +2498,7 @@ class Client:
                     except asyncio.CancelledError:
                         break
                     except Exception as e:
-                        print(f"Error in tick handler: {e}")
-                        traceback.print_exc()
+                        log.exception("Error in tick handler: %s", e)
                     await asyncio.sleep(interval)
             
             ticker_task = None
@@ -1959,8 +2530,16 @@ class Client:
         Args:
             update_type (UpdatesTypes): The update to process.
             callback (Callable): The callback to handle.
-            filters (Any): The filter to handle.
-            **kwargs: The kwargs to pass to the callback.
+            filters (Any): Filters the event must all pass, combined with `filters.combine`.
+            **kwargs: Extra options of the handler, like `concurrency` (maximum concurrent calls of this handler), `timeout` (seconds before a call is cancelled) and `process` (run the callback on a process pool, see below).
+
+        Handlers registered with ``process=True`` run on a pool of
+        ``process_workers`` processes, for CPU-bound work the GIL would
+        serialize. They get the event rebuilt from the raw update, and the
+        API calls they make are recorded and made in order by this process
+        once they return, so their results are placeholders and file
+        uploads and calls reading data are not supported. The callback must
+        be a module level function so it can be pickled.
 
         Returns:
             Callable: The decorated handler.
@@ -1968,7 +2547,7 @@ class Client:
         handler_data = {
             "type": update_type,
             "callback": callback,
-            "filters": filters,
+            "filters": combine(*filters),
         }
         handler_data.update(kwargs)
         self.handlers.append(handler_data)
@@ -1999,9 +2578,14 @@ class Client:
         if self.running:
             raise RuntimeError("Client is already running")
 
-        self.me = await self.get_me()
+        await self._ensure_me()
+        await self.state_machine.open()
+        self.scenes.restore()
+        await self.offsets.open()
 
         self.running = True
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
         for tick_handler in self.tick_handlers:
             if "start" in tick_handler:
                 tick_handler["start"]()
@@ -2020,12 +2604,16 @@ class Client:
                 )
 
                 for update in updates:
-                    self.last_update_id = update.get("update_id", self.last_update_id)
-                    await self.process_update(update)
+                    try:
+                        await self.process_update(update)
+                    except Exception as e:
+                        polling_log.exception("Error processing update %s: %s", update.get("update_id"), e)
+                        # skipped so one failing update cannot stall polling
+                        if update.get("update_id") is not None:
+                            self.offsets.commit(update["update_id"])
 
             except Exception as e:
-                print(f"Error in polling: {e}")
-                traceback.print_exc()
+                polling_log.exception("Error in polling: %s", e)
                 await asyncio.sleep(1)
 
     @smart_method
@@ -2039,7 +2627,9 @@ class Client:
                 await loop.run_in_executor(self.handler_executor, dc_handler)
 
         self.running = False
-        
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
+
         for handler in self.tick_handlers:
             task = handler.get("task")
             if task and not task.done():
@@ -2054,9 +2644,9 @@ class Client:
         try:
             asyncio.run(self.start_polling(timeout, limit))
         except KeyboardInterrupt:
-            print("Bot stopped by user")
+            log.info("Bot stopped by user")
         except ValueError:
-            print("Bot stopped by the code")
+            log.info("Bot stopped by the code")
         finally:
             if not self._stopped:
                 try:
@@ -2069,25 +2659,41 @@ class Client:
                     asyncio.run(self.stop())
 
     def set_state(self, user: Union[User, int, str], state: str):
-        if isinstance(user, User):
-            uid = user.id
-        if isinstance(user, str) and user.isdigit():
-            uid = int(user)
+        uid = user.id if isinstance(user, User) else user
         self.state_machine.set_state(uid, state)
     
     def del_state(self, user: Union[User, int, str]):
-        if isinstance(user, User):
-            uid = user.id
-        if isinstance(user, str) and user.isdigit():
-            uid = int(user)
+        uid = user.id if isinstance(user, User) else user
         self.state_machine.del_state(uid)
     
     def get_state(self, user: Union[User, int, str]):
-        if isinstance(user, User):
-            uid = user.id
-        if isinstance(user, str) and user.isdigit():
-            uid = int(user)
-        self.state_machine.get_state(uid)
+        uid = user.id if isinstance(user, User) else user
+        return self.state_machine.get_state(uid)
+
+    def scene(self, name: str, ttl: Optional[float] = None, on_timeout: Optional[Callable] = None,
+              pass_commands: bool = True) -> Scene:
+        """Creates and registers a scene, a conversation whose steps are routed by user state
+
+        Args:
+            name (str): unique name of the scene
+            ttl (float, optional): seconds a user can stay at a step. Defaults to None (the state machine's ttl)
+            on_timeout (Callable, optional): called with a SceneContext when a step times out
+            pass_commands (bool, optional): let commands reach the regular handlers. Defaults to True
+
+        Returns:
+            Scene: the scene, register its steps with `@scene.step(name)`
+        """
+        return self.scenes.add(Scene(name, ttl, on_timeout, pass_commands))
+
+    def enter_scene(self, user: Union[User, int, str], scene: Union[Scene, str], step: Optional[str] = None, **data):
+        """Puts a user at a step of a scene, the first one by default"""
+        uid = user.id if isinstance(user, User) else user
+        self.scenes.enter(uid, scene, step, **data)
+
+    def leave_scene(self, user: Union[User, int, str], clear_data: bool = True):
+        """Ends the scene of a user"""
+        uid = user.id if isinstance(user, User) else user
+        self.scenes.leave(uid, clear_data)
 
     @smart_method
     async def stop(self) -> None:
@@ -2099,12 +2705,24 @@ class Client:
         if self.running:
             await self.stop_polling()
 
+        await self.transactions.stop()
+        await self.handler_runner.drain(self.drain_timeout)
+        await self.sender.close(self.drain_timeout)
+        await self.state_machine.close()
+        await self.offsets.close()
+        await self.close_session()
+
         if not self.handler_executor._shutdown:
             self.handler_executor.shutdown(wait=True)
+        if self._process_executor is not None:
+            self._process_executor.shutdown(wait=True)
+            self._process_executor = None
 
     @smart_method
     async def handle_webhook_update(self, update_data: Dict[str, Any]) -> None:
         """Process an update received via webhook."""
+        if self.metrics is not None:
+            self.metrics.updates_received.inc()
         await self.process_update(update_data)
     
     async def __aenter__(self):
@@ -2147,17 +2765,32 @@ class Client:
                 loop.run_until_complete(self._cleanup())
         
         if exc_type is not None:
-            print(f"Exception in context manager: {exc_type.__name__}: {exc_val}")
+            log.error("Exception in context manager: %s: %s", exc_type.__name__, exc_val)
             return False
         return True
     
     async def _start(self):
-        self.me = await self.get_me()
-        print(f"Bot started: @{self.me.username if self.me.username else self.me.first_name}")
+        await self._ensure_me()
+        log.info("Bot started: @%s", self.me.username if self.me.username else self.me.first_name)
+        await self.state_machine.open()
+        self.scenes.restore()
+        await self.offsets.open()
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
         
     
     async def _cleanup(self):
+        if self.loop_monitor is not None:
+            await self.loop_monitor.stop()
         if self.running:
             await self.stop()
         elif not self._stopped and not self.handler_executor._shutdown:
-            self.handler_executor.shutdown(wait=False)
\ No newline at end of file
+            await self.transactions.stop()
+            await self.sender.close(self.drain_timeout)
+            await self.state_machine.close()
+            await self.offsets.close()
+            await self.close_session()
+            self.handler_executor.shutdown(wait=False)
+            if self._process_executor is not None:
+                self._process_executor.shutdown(wait=False)
+                self._process_executor = None
\ No newline at end of file
@@ -0,0 +1,184 @@
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple, Union, TYPE_CHECKING
+import asyncio
+import inspect
+import json
+import re
+
+from ..objects.enums import MatchType, UpdatesTypes
+from ..log import get_logger
+
+if TYPE_CHECKING:
+    from . import Client
+
+
+log = get_logger("dispatcher")
+
+Reply = Union[str, Callable[[Any], Any]]
+
+_END = object()
+
+
+class AutoReplyRouter:
+    """Answers messages whose text matches a key with a fixed reply or a callback.
+
+    Keys are looked up in order of specificity: exact keys, case-folded keys,
+    the longest matching prefix, then patterns in the order they were added.
+    Exact and case-folded keys are dictionary lookups and prefixes live in a
+    trie, so the cost of a lookup does not grow with the number of keys.
+
+    Static replies are sent with a request body whose text part is
+    serialized once, and the sent message is not parsed into a ``Message``.
+    Texts returned by callbacks are serialized for every reply, as they
+    may differ every time.
+
+    Args:
+        client (Client): The client sending the replies.
+    """
+
+    def __init__(self, client: "Client"):
+        self.client = client
+        self.exact: Dict[str, Reply] = {}
+        self.casefold: Dict[str, Reply] = {}
+        self._prefixes: dict = {}
+        self._patterns: List[Tuple[Pattern, Reply]] = []
+        self._bodies: Dict[str, bytes] = {}
+
+    def add(self, key: Union[str, Pattern], reply: Reply, match: MatchType = MatchType.EXACT) -> None:
+        """Adds an auto reply.
+
+        Args:
+            key (str OR Pattern): The text, prefix or pattern to match.
+            reply (str OR Callable): The reply text, or a function or coroutine function called with the
+                ``Message``. Text returned by the function is sent as reply.
+            match (MatchType, optional): How the key is matched. Defaults to MatchType.EXACT.
+        """
+        match = MatchType(match)
+        if match == MatchType.EXACT:
+            self.exact[key] = reply
+        elif match == MatchType.CASEFOLD:
+            self.casefold[key.casefold()] = reply
+        elif match == MatchType.PREFIX:
+            node = self._prefixes
+            for char in key:
+                node = node.setdefault(char, {})
+            node[_END] = reply
+        else:
+            self._patterns.append((key if isinstance(key, re.Pattern) else re.compile(key), reply))
+
+    def remove(self, key: Union[str, Pattern], match: MatchType = MatchType.EXACT) -> bool:
+        """Removes an auto reply.
+
+        Args:
+            key (str OR Pattern): The key it was added with.
+            match (MatchType, optional): How the key is matched. Defaults to MatchType.EXACT.
+
+        Returns:
+            bool: Whether an auto reply was removed.
+        """
+        match = MatchType(match)
+        if match == MatchType.EXACT:
+            return self._forget(self.exact.pop(key, None))
+        if match == MatchType.CASEFOLD:
+            return self._forget(self.casefold.pop(key.casefold(), None))
+        if match == MatchType.PREFIX:
+            node = self._prefixes
+            for char in key:
+                node = node.get(char)
+                if node is None:
+                    return False
+            return self._forget(node.pop(_END, None))
+        pattern = key.pattern if isinstance(key, re.Pattern) else key
+        removed = [reply for entry_pattern, reply in self._patterns if entry_pattern.pattern == pattern]
+        self._patterns = [entry for entry in self._patterns if entry[0].pattern != pattern]
+        for reply in removed:
+            self._forget(reply)
+        return bool(removed)
+
+    def _forget(self, reply: Optional[Reply]) -> bool:
+        if isinstance(reply, str):
+            self._bodies.pop(reply, None)
+        return reply is not None
+
+    def clear(self) -> None:
+        """Removes every auto reply."""
+        self.exact.clear()
+        self.casefold.clear()
+        self._prefixes = {}
+        self._patterns = []
+        self._bodies.clear()
+
+    def __bool__(self) -> bool:
+        return bool(self.exact or self.casefold or self._prefixes or self._patterns)
+
+    def match(self, text: str) -> Optional[Reply]:
+        """Finds the reply of a text.
+
+        Args:
+            text (str): The message text.
+
+        Returns:
+            str OR Callable: The reply, None when no key matches.
+        """
+        reply = self.exact.get(text)
+        if reply is not None:
+            return reply
+        if self.casefold:
+            reply = self.casefold.get(text.casefold())
+            if reply is not None:
+                return reply
+        node = self._prefixes
+        reply = node.get(_END)
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                break
+            reply = node.get(_END, reply)
+        if reply is not None:
+            return reply
+        for pattern, pattern_reply in self._patterns:
+            if pattern.search(text):
+                return pattern_reply
+        return None
+
+    def _body(self, chat_id: Any, reply_to_message_id: Any, text: str, static: bool = True) -> bytes:
+        tail = self._bodies.get(text) if static else None
+        if tail is None:
+            tail = (',"text":' + json.dumps(text) + "}").encode()
+            if static:
+                self._bodies[text] = tail
+        head = json.dumps({"chat_id": chat_id, "reply_to_message_id": reply_to_message_id})[:-1]
+        return head.encode() + tail
+
+    async def dispatch(self, update: Dict[str, Any]) -> bool:
+        """Sends the auto reply of a message update.
+
+        Args:
+            update (dict): The raw update.
+
+        Returns:
+            bool: Whether the message matched an auto reply.
+        """
+        raw = update.get("message")
+        text = raw.get("text") if raw else None
+        if not text:
+            return False
+        reply = self.match(text)
+        if reply is None:
+            return False
+
+        static = not callable(reply)
+        if not static:
+            event = self.client._convert_event(UpdatesTypes.MESSAGE, raw)
+            if inspect.iscoroutinefunction(reply):
+                reply = await reply(event)
+            else:
+                reply = await asyncio.get_running_loop().run_in_executor(self.client.handler_executor, reply, event)
+            if not isinstance(reply, str) or not reply:
+                return True
+
+        chat_id = (raw.get("chat") or {}).get("id")
+        await self.client.make_post_raw(
+            self.client.requests_base + "/sendMessage",
+            self._body(chat_id, raw.get("message_id"), reply, static),
+        )
+        return True
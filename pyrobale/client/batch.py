@@ -0,0 +1,91 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+import asyncio
+
+from ..exceptions import TooManyRequestsException
+from ..ratelimit import RateLimiter
+from ..log import get_logger
+
+
+log = get_logger("client")
+
+
+class BatchResult:
+    """Results of an action applied to many targets.
+
+    Attributes:
+        results (dict): The result of every target that succeeded.
+        errors (dict): The exception of every target that failed.
+    """
+
+    def __init__(self):
+        self.results: Dict[Hashable, Any] = {}
+        self.errors: Dict[Hashable, BaseException] = {}
+
+    @property
+    def succeeded(self) -> List[Hashable]:
+        return list(self.results)
+
+    @property
+    def failed(self) -> List[Hashable]:
+        return list(self.errors)
+
+    @property
+    def ok(self) -> bool:
+        """Whether every target succeeded"""
+        return not self.errors
+
+    def __len__(self) -> int:
+        return len(self.results) + len(self.errors)
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+    def __repr__(self) -> str:
+        return f"BatchResult(succeeded={len(self.results)}, failed={len(self.errors)})"
+
+
+async def run_batch(targets: Iterable[Hashable], call: Callable[[Hashable], Awaitable[Any]], concurrency: int = 10,
+                    rate_limiter: Optional[RateLimiter] = None, retries: int = 2) -> BatchResult:
+    """Calls a function for every distinct target concurrently.
+
+    Args:
+        targets (Iterable): The targets, duplicates are called once.
+        call (Callable): Called with a target, returns the awaitable acting on it.
+        concurrency (int, optional): Calls in flight. Defaults to 10.
+        rate_limiter (RateLimiter, optional): Limiter every call waits for. Defaults to None.
+        retries (int, optional): Retries of calls refused with "too many requests". Defaults to 2.
+
+    Returns:
+        BatchResult: The result or exception of every target.
+    """
+    batch = BatchResult()
+    pending = list(dict.fromkeys(targets))
+    if not pending:
+        return batch
+    iterator = iter(pending)
+
+    async def worker():
+        for target in iterator:
+            attempt = 0
+            while True:
+                if rate_limiter is not None:
+                    await rate_limiter.acquire()
+                try:
+                    batch.results[target] = await call(target)
+                except TooManyRequestsException as e:
+                    if attempt < retries:
+                        attempt += 1
+                        if rate_limiter is not None:
+                            rate_limiter.pause(e.retry_after)
+                        else:
+                            await asyncio.sleep(e.retry_after)
+                        continue
+                    batch.errors[target] = e
+                except Exception as e:
+                    batch.errors[target] = e
+                break
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(pending)))))
+    if batch.errors:
+        log.warning("%d of %d batch calls failed", len(batch.errors), len(batch))
+    return batch
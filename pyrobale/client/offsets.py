@@ -0,0 +1,113 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from ..StateMachine.storage import BaseStorage, MemoryStorage
+from ..log import get_logger
+
+
+log = get_logger("polling")
+
+OFFSET_KEY = "offset"
+RECENT_KEY = "recent"
+
+
+class UpdateOffsets:
+    """Tracks dispatched updates so polling resumes where it stopped.
+
+    An update is committed once it was dispatched: the highest committed
+    update id is the polling offset, and the ids of the last ``window``
+    committed updates are kept to drop updates delivered twice, like
+    webhook retries or updates fetched again after a restart. Both are
+    written to a namespace of the storage, batched by the storage like
+    state changes, so a crash between dispatch and the next flush
+    delivers those updates again (at least once). The recent ids are
+    serialized once per storage flush, not on every commit.
+
+    Args:
+        storage (BaseStorage, optional): Storage of the offset, like SQLiteStorage. Defaults to a MemoryStorage.
+        window (int, optional): Number of recent update ids remembered. Defaults to 1000.
+    """
+
+    def __init__(self, storage: Optional[BaseStorage] = None, window: int = 1000):
+        self.storage = (storage if storage is not None else MemoryStorage()).namespace("offsets")
+        self.window = window
+        self.offset = 0
+        self._recent: Deque[int] = deque()
+        self._seen: Set[int] = set()
+        self._inflight: Set[int] = set()
+        self._opened = False
+        self._recent_changed = False
+        self.duplicates = 0
+        callbacks = getattr(self.storage, "flush_callbacks", None)
+        if callbacks is not None:
+            callbacks.append(self._save_recent)
+
+    async def open(self) -> None:
+        """Loads the committed offset and recent update ids."""
+        if self._opened:
+            return
+        self._opened = True
+        await self.storage.open()
+        stored = await self.storage.get(OFFSET_KEY)
+        if stored is not None:
+            self.offset = max(self.offset, int(stored))
+        recent = await self.storage.get(RECENT_KEY)
+        if isinstance(recent, bytes):
+            recent = recent.decode()
+        for update_id in (int(value) for value in str(recent or "").split(",") if value):
+            if update_id not in self._seen:
+                self._remember(update_id)
+
+    def begin(self, update_id: int) -> bool:
+        """Marks an update as being dispatched.
+
+        Args:
+            update_id (int): The id of the update.
+
+        Returns:
+            bool: False if the update was already dispatched or is being dispatched.
+        """
+        if update_id in self._seen or update_id in self._inflight:
+            self.duplicates += 1
+            return False
+        self._inflight.add(update_id)
+        return True
+
+    def abort(self, update_id: int) -> None:
+        """Forgets an update whose dispatch failed, so a new delivery of it is dispatched."""
+        self._inflight.discard(update_id)
+
+    def commit(self, update_id: int) -> None:
+        """Records an update as dispatched."""
+        self._inflight.discard(update_id)
+        if update_id not in self._seen:
+            self._remember(update_id)
+        self.offset = max(self.offset, update_id)
+        self._recent_changed = True
+        self.storage.set_nowait(OFFSET_KEY, self.offset)
+
+    def _save_recent(self) -> None:
+        if self._recent_changed:
+            self._recent_changed = False
+            self.storage.set_nowait(RECENT_KEY, ",".join(map(str, self._recent)))
+
+    def _remember(self, update_id: int) -> None:
+        self._recent.append(update_id)
+        self._seen.add(update_id)
+        while len(self._recent) > self.window:
+            self._seen.discard(self._recent.popleft())
+
+    async def flush(self) -> None:
+        self._save_recent()
+        await self.storage.flush()
+
+    async def close(self) -> None:
+        self._save_recent()
+        try:
+            await self.storage.close()
+        except Exception as e:
+            log.exception("Saving the polling offset failed: %s", e)
+        self._opened = False
+
+    def stats(self) -> Dict[str, int]:
+        return {"offset": self.offset, "inflight": len(self._inflight), "duplicates": self.duplicates}
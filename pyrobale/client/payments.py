@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import heapq
+import time
+
+from ..objects.enums import TransactionStatus
+from ..objects.precheckoutquery import PreCheckoutQuery
+from ..objects.successfulpayment import SuccessfulPayment
+from ..objects.transaction import Transaction
+from ..log import get_logger
+
+if TYPE_CHECKING:
+    from . import Client
+
+
+log = get_logger("payments")
+
+FINAL_STATUSES = frozenset((TransactionStatus.PAID, TransactionStatus.FAILED, TransactionStatus.REJECTED))
+
+
+class _Pending:
+    __slots__ = ("query", "future", "deadline", "delay", "last")
+
+    def __init__(self, query: PreCheckoutQuery, future: asyncio.Future, deadline: float, delay: float):
+        self.query = query
+        self.future = future
+        self.deadline = deadline
+        self.delay = delay
+        self.last: Optional[Transaction] = None
+
+
+class TransactionWatcher:
+    """Polls pending transactions in the background until they are paid or failed.
+
+    Every watched transaction is inquired on its own schedule, starting
+    ``interval`` seconds after it was answered and backing off by ``backoff``
+    up to ``max_interval``. Transactions due at the same time are inquired
+    together, at most ``max_concurrent`` at once. When a transaction is paid,
+    the ``SUCCESSFUL_PAYMENT`` handlers are launched like any other handler.
+
+    Args:
+        client (Client): The client inquiring the transactions.
+        interval (float, optional): Seconds before the first inquiry. Defaults to 2.
+        max_interval (float, optional): Maximum seconds between inquiries. Defaults to 30.
+        backoff (float, optional): Factor the delay grows by after each pending answer. Defaults to 1.5.
+        deadline (float, optional): Seconds a transaction is watched before giving up. Defaults to 900.
+        max_concurrent (int, optional): Inquiries in flight. Defaults to 10.
+    """
+
+    def __init__(self, client: "Client", interval: float = 2, max_interval: float = 30, backoff: float = 1.5,
+                 deadline: float = 900, max_concurrent: int = 10):
+        self.client = client
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.deadline = deadline
+        self.max_concurrent = max_concurrent
+        self._pending: Dict[str, _Pending] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.paid = 0
+        self.failed = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def watch(self, query: PreCheckoutQuery, deadline: Optional[float] = None) -> "asyncio.Future[Optional[Transaction]]":
+        """Starts watching the transaction of an answered pre-checkout query.
+
+        Args:
+            query (PreCheckoutQuery): The query, its id is the transaction id.
+            deadline (float, optional): Seconds to watch it. Defaults to the watcher's deadline.
+
+        Returns:
+            asyncio.Future: Resolves with the final Transaction, or the last one seen when the deadline passes.
+        """
+        loop = asyncio.get_running_loop()
+        existing = self._pending.get(query.id)
+        if existing is not None:
+            return existing.future
+        now = time.monotonic()
+        pending = _Pending(query, loop.create_future(), now + (self.deadline if deadline is None else deadline),
+                           self.interval)
+        self._pending[query.id] = pending
+        heapq.heappush(self._schedule, (now + self.interval, query.id))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        else:
+            self._wakeup.set()
+        return pending.future
+
+    async def _run(self) -> None:
+        semaphore = asyncio.Semaphore(self.max_concurrent)
+        while self._pending:
+            now = time.monotonic()
+            due = []
+            while self._schedule and self._schedule[0][0] <= now:
+                _, transaction_id = heapq.heappop(self._schedule)
+                if transaction_id in self._pending:
+                    due.append(self._pending[transaction_id])
+            if due:
+                await asyncio.gather(*(self._check(pending, semaphore) for pending in due))
+                continue
+            if not self._schedule:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._schedule[0][0] - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _check(self, pending: _Pending, semaphore: asyncio.Semaphore) -> None:
+        transaction_id = pending.query.id
+        async with semaphore:
+            try:
+                pending.last = await self.client.inquire_transaction(transaction_id)
+            except Exception as e:
+                log.warning("Inquiring transaction %s failed: %s", transaction_id, e)
+
+        status = pending.last.status if pending.last is not None else None
+        if status in FINAL_STATUSES:
+            self._finish(pending)
+            if status == TransactionStatus.PAID:
+                self.paid += 1
+                await self.client._dispatch_payment(self._payment(pending))
+            else:
+                self.failed += 1
+                log.info("Transaction %s %s", transaction_id, status.value)
+            return
+
+        now = time.monotonic()
+        if now >= pending.deadline:
+            self._finish(pending)
+            self.expired += 1
+            log.warning("Gave up on transaction %s, still %s at its deadline", transaction_id,
+                        status.value if status is not None else "unknown")
+            return
+        pending.delay = min(pending.delay * self.backoff, self.max_interval)
+        heapq.heappush(self._schedule, (min(now + pending.delay, pending.deadline), transaction_id))
+
+    def _finish(self, pending: _Pending) -> None:
+        self._pending.pop(pending.query.id, None)
+        if not pending.future.done():
+            pending.future.set_result(pending.last)
+
+    @staticmethod
+    def _payment(pending: _Pending) -> SuccessfulPayment:
+        query, transaction = pending.query, pending.last
+        return SuccessfulPayment(
+            query.currency, query.total_amount, query.invoice_payload,
+            telegram_payment_charge_id=query.id,
+            provider_payment_charge_id=transaction.provider_payment_charge_id or query.id,
+        )
+
+    async def stop(self) -> None:
+        """Stops watching, pending futures are cancelled."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for pending in self._pending.values():
+            pending.future.cancel()
+        self._pending.clear()
+        self._schedule.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._pending), "paid": self.paid, "failed": self.failed, "expired": self.expired}
@@ -0,0 +1,89 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+import asyncio
+import inspect
+
+import aiohttp
+
+from ..exceptions import PyroBaleException
+from ..log import get_logger
+from ..objects.utils import _forget_parent_loop
+from ..metrics import api_method
+from . import Client
+
+
+log = get_logger("dispatcher")
+
+Action = Tuple[str, Optional[Dict[str, Any]]]
+
+# methods reading data the worker would need an answer for
+READ_PREFIXES = ("get", "inquire")
+
+
+class RecordingClient(Client):
+    """Client of a handler process, records API calls instead of making them.
+
+    The parent process makes the recorded calls in order once the handler
+    returned. Calls return placeholder results, like a sent Message with an
+    id of 0, so handlers should not rely on them. Calls reading data and
+    file uploads raise, they need a real client.
+    """
+
+    def __init__(self, token: str, base_url: str):
+        super().__init__(token, base_url, async_mode=False, max_workers=1, batch_rate=None)
+        self.actions: List[Action] = []
+
+    def _record(self, url: str, data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        method = api_method(url)
+        if method.casefold().startswith(READ_PREFIXES):
+            raise PyroBaleException(f"{method} can't be called from a process handler")
+        self.actions.append((method, data))
+        return {"ok": True, "result": {"message_id": 0}}
+
+    async def make_post(self, url: str, data: dict = None, headers: dict = None) -> dict:
+        return self._record(url, data)
+
+    async def make_post_raw(self, url: str, body: bytes) -> dict:
+        raise PyroBaleException("Serialized requests can't be made from a process handler")
+
+    async def make_get(self, url: str, headers: dict = None) -> dict:
+        # the parent posts the call, with its query as the data
+        query = urlsplit(url).query
+        return self._record(url, dict(parse_qsl(query)) if query else None)
+
+    async def make_via_multipart(self, url: str, data: aiohttp.FormData) -> dict:
+        raise PyroBaleException("Files can't be uploaded from a process handler")
+
+
+_client: Optional[RecordingClient] = None
+
+
+def init_worker(token: str, base_url: str) -> None:
+    """Builds the recording client of a handler process."""
+    global _client
+    # forked from inside the running loop of the parent
+    _forget_parent_loop()
+    _client = RecordingClient(token, base_url)
+
+
+def run_in_process(callback: Callable, handler: Dict[str, Any], update: Dict[str, Any]) -> List[Action]:
+    """Calls a handler with the event of a raw update and returns the API calls it made.
+
+    Args:
+        callback (Callable): The handler, a module level function.
+        handler (dict): The type (and command) of the handler.
+        update (dict): The raw update.
+
+    Returns:
+        list: The (method, data) of every API call, in order.
+    """
+    client = _client
+    client.actions = []
+    event = client._handler_event(handler, update)
+    if event is None:
+        return []
+    if inspect.iscoroutinefunction(callback):
+        asyncio.run(callback(event))
+    else:
+        callback(event)
+    return client.actions
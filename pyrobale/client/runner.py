@@ -0,0 +1,188 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+import asyncio
+import functools
+
+from ..objects.enums import OverflowPolicy
+from ..log import get_logger
+
+
+log = get_logger("dispatcher")
+
+
+class _Slots:
+    """A counter of running handler tasks with an optional limit."""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.active = 0
+        self.tasks: Dict[asyncio.Task, None] = {}
+        # tasks shed but still unwinding, kept in tasks so they are drained
+        self.cancelling: Set[asyncio.Task] = set()
+        self._waiters: "list[asyncio.Future]" = []
+
+    @property
+    def full(self) -> bool:
+        return self.limit is not None and self.active >= self.limit
+
+    async def wait(self) -> None:
+        while self.full:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                # woken but cancelled before using the slot, hand the wakeup on
+                if future.done() and not future.cancelled():
+                    self.wake_next()
+                raise
+            finally:
+                if future in self._waiters:
+                    self._waiters.remove(future)
+
+    def release(self) -> None:
+        self.active -= 1
+        self.wake_next()
+
+    def wake_next(self) -> None:
+        """Wakes the oldest waiter, which checks again for a free slot."""
+        while self._waiters:
+            future = self._waiters.pop(0)
+            if not future.done():
+                future.set_result(None)
+                break
+
+
+class HandlerRunner:
+    """Runs handler callbacks as tracked tasks with concurrency limits.
+
+    Every launched handler is kept in a task set until it finishes, so tasks
+    cannot be garbage collected mid-flight and can be drained on shutdown.
+    When a limit is reached the overflow policy decides whether the
+    dispatcher waits for a free slot, drops the new call or cancels the
+    oldest running call of the same scope.
+
+    Args:
+        max_concurrent (int, optional): Maximum handler calls running at once. Defaults to None (unlimited).
+        overflow_policy (OverflowPolicy, optional): What to do when a limit is reached. Defaults to OverflowPolicy.WAIT.
+        default_timeout (float, optional): Timeout applied to handlers without their own. Defaults to None.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.WAIT,
+                 default_timeout: Optional[float] = None):
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.default_timeout = default_timeout
+        self._global = _Slots(max_concurrent)
+        self._handler_slots: Dict[int, _Slots] = {}
+        self.dropped = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    @property
+    def tasks(self) -> Dict[asyncio.Task, None]:
+        """The running handler tasks, oldest first."""
+        return self._global.tasks
+
+    def _slots_for(self, handler: Dict[str, Any]) -> Optional[_Slots]:
+        limit = handler.get("concurrency")
+        if limit is None:
+            return None
+        slots = self._handler_slots.get(id(handler))
+        if slots is None or slots.limit != limit:
+            slots = self._handler_slots[id(handler)] = _Slots(limit)
+        return slots
+
+    async def _make_room(self, slots: _Slots) -> bool:
+        if not slots.full:
+            return True
+        if self.overflow_policy == OverflowPolicy.DROP:
+            self.dropped += 1
+            return False
+        if self.overflow_policy == OverflowPolicy.SHED_OLDEST:
+            oldest = next((task for task in slots.tasks if task not in slots.cancelling), None)
+            if oldest is not None:
+                slots.cancelling.add(oldest)
+                oldest.cancel()
+                self.shed += 1
+                # the cancelled task releases its slot when it unwinds
+                await asyncio.sleep(0)
+        await slots.wait()
+        return True
+
+    async def submit(self, handler: Dict[str, Any], factory: Callable[[], Awaitable[Any]],
+                     name: str = "handler") -> Optional[asyncio.Task]:
+        """Launches a handler call once its limits allow it.
+
+        Args:
+            handler (dict): The handler entry, whose ``concurrency`` and ``timeout`` keys are honoured.
+            factory (Callable): Returns the awaitable running the handler.
+            name (str, optional): Name used in log messages.
+
+        Returns:
+            asyncio.Task: The handler task, or None if the call was dropped.
+        """
+        handler_slots = self._slots_for(handler)
+        while True:
+            if handler_slots is not None and not await self._make_room(handler_slots):
+                log.warning("Handler %s is at its concurrency limit, dropping call", name)
+                return None
+            if not await self._make_room(self._global):
+                log.warning("Handler concurrency limit reached, dropping call to %s", name)
+                return None
+            # another call may have taken the handler slot while waiting for a global one
+            if handler_slots is None or not handler_slots.full:
+                break
+            # the global slot this call was woken for stays free, let the next call take it
+            self._global.wake_next()
+
+        timeout = handler.get("timeout", self.default_timeout)
+        scopes = [self._global] if handler_slots is None else [self._global, handler_slots]
+        for slots in scopes:
+            slots.active += 1
+        task = asyncio.create_task(self._run(factory, timeout, name))
+        for slots in scopes:
+            slots.tasks[task] = None
+        # done callbacks also run for tasks cancelled before they started
+        task.add_done_callback(functools.partial(self._release, scopes))
+        return task
+
+    @staticmethod
+    def _release(scopes: "list[_Slots]", task: asyncio.Task) -> None:
+        for slots in scopes:
+            slots.tasks.pop(task, None)
+            slots.cancelling.discard(task)
+            slots.release()
+
+    async def _run(self, factory: Callable[[], Awaitable[Any]], timeout: Optional[float], name: str) -> None:
+        try:
+            if timeout is None:
+                await factory()
+            else:
+                await asyncio.wait_for(factory(), timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            log.warning("Handler %s timed out after %ss", name, timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "running": len(self.tasks),
+            "dropped": self.dropped,
+            "shed": self.shed,
+            "timed_out": self.timed_out,
+        }
+
+    async def drain(self, timeout: Optional[float] = None) -> None:
+        """Waits for running handlers to finish, cancelling those still running after ``timeout``.
+
+        Args:
+            timeout (float, optional): Seconds to wait before cancelling. Defaults to None (wait forever).
+        """
+        pending = list(self.tasks)
+        if not pending:
+            return
+        done, still_running = await asyncio.wait(pending, timeout=timeout)
+        for task in still_running:
+            task.cancel()
+        if still_running:
+            log.warning("Cancelled %d handlers still running at shutdown", len(still_running))
+            await asyncio.wait(still_running)
@@ -0,0 +1,173 @@
+from typing import Any, Dict, Optional, Union, TYPE_CHECKING
+import asyncio
+import concurrent.futures
+
+from ..objects.messageid import MessageId
+from ..exceptions import PyroBaleException
+from ..log import get_logger
+
+if TYPE_CHECKING:
+    from . import Client
+
+
+log = get_logger("sender")
+
+
+class BackgroundSender:
+    """Sends requests from a queue so callers do not wait for the API.
+
+    Each request resolves a future with the ``MessageId`` of the sent
+    message; the response is not parsed into a ``Message``. Failures are
+    logged, and raised again only to callers that await the future.
+
+    Requests are sent from the event loop of the client. Submitting from
+    another thread, like a sync handler, hands the request to that loop and
+    returns a ``concurrent.futures.Future`` instead.
+
+    Args:
+        client (Client): The client making the requests.
+        workers (int, optional): Requests sent at the same time. Defaults to 4.
+        max_pending (int, optional): Maximum queued requests, submitting more raises. Defaults to None (unbounded).
+    """
+
+    def __init__(self, client: "Client", workers: int = 4, max_pending: Optional[int] = None):
+        self.client = client
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: "list[asyncio.Task]" = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self, loop: asyncio.AbstractEventLoop) -> asyncio.Queue:
+        if self._loop is not loop or not self._tasks:
+            self._loop = loop
+            self._queue = asyncio.Queue(self.max_pending or 0)
+            self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+        return self._queue
+
+    def _home_loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        """Returns the loop requests are sent from, the one of the client's session until the sender started"""
+        loop = self._loop if self._tasks else self.client._session_loop
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return None
+        return loop
+
+    def submit(self, method: str, data: Dict[str, Any]) -> "Union[asyncio.Future[MessageId], concurrent.futures.Future]":
+        """Queues a request.
+
+        Args:
+            method (str): The API method, like "sendMessage".
+            data (dict): The request body.
+
+        Returns:
+            asyncio.Future: Resolves with the MessageId of the sent message, a concurrent.futures.Future
+                when called from a thread other than the one of the client's loop.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        home = self._home_loop()
+        if home is not None and home is not loop:
+            # a sync handler thread, or a short-lived loop of one
+            future = concurrent.futures.Future()
+            home.call_soon_threadsafe(self._submit_from_thread, method, data, future)
+            return future
+        if loop is None:
+            raise PyroBaleException("Background sends need the client's event loop, start the client first")
+        return self._submit(loop, method, data)
+
+    def _submit_from_thread(self, method: str, data: Dict[str, Any], future: concurrent.futures.Future) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            queued = self._submit(asyncio.get_running_loop(), method, data)
+        except Exception as e:
+            future.set_exception(e)
+            return
+
+        def copy(done: asyncio.Future) -> None:
+            if done.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+
+        queued.add_done_callback(copy)
+
+    def _submit(self, loop: asyncio.AbstractEventLoop, method: str, data: Dict[str, Any]) -> "asyncio.Future[MessageId]":
+        queue = self._ensure_started(loop)
+        future = loop.create_future()
+        future.add_done_callback(self._retrieve)
+        try:
+            queue.put_nowait((method, data, future))
+        except asyncio.QueueFull:
+            future.cancel()
+            raise PyroBaleException(f"Send queue is full ({self.max_pending} pending requests)")
+        return future
+
+    @staticmethod
+    def _retrieve(future: asyncio.Future) -> None:
+        # the failure was logged, unawaited futures must not warn about it again
+        if not future.cancelled():
+            future.exception()
+
+    async def _work(self) -> None:
+        queue = self._queue
+        while True:
+            method, data, future = await queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                try:
+                    response = await self.client.make_post(self.client.requests_base + "/" + method, data=data)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    log.warning("Background %s to %s failed: %s", method, data.get("chat_id"), e)
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                self.sent += 1
+                if not future.done():
+                    result = response.get("result")
+                    future.set_result(MessageId(result["message_id"]) if isinstance(result, dict) else None)
+            finally:
+                queue.task_done()
+
+    async def flush(self) -> None:
+        """Waits until every queued request was sent."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    async def close(self, timeout: Optional[float] = None) -> None:
+        """Sends the queued requests and stops the workers.
+
+        Args:
+            timeout (float, optional): Seconds to wait for queued requests, the rest is cancelled. Defaults to None.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self.flush(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("Cancelling %d unsent background requests", self.pending)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        while self._queue is not None and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            future.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self.pending, "sent": self.sent, "failed": self.failed}
@@ -11,4 +11,16 @@ class ForbiddenException(PyroBaleException):
     pass
 
 class InternalServerException(PyroBaleException):
-    pass
\ No newline at end of file
+    pass
+
+
+class TooManyRequestsException(PyroBaleException):
+    """Raised when the API rate limits the bot.
+
+    Attributes:
+        retry_after (float): Seconds to wait before the next request.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -1,47 +1,382 @@
 import re
 from typing import Callable, List, Optional, Union, TYPE_CHECKING
 import asyncio
+import contextlib
+import contextvars
+import inspect
+import os
+
+from ..cache import JOINED_STATUSES
+from ..log import get_logger
+from ..objects.utils import smart_method
 
 if TYPE_CHECKING:
     from ..objects.user import User
+    from ..objects.chat import Chat
     from ..client import Client
 
+
+log = get_logger("filters")
+
+_update_memo: contextvars.ContextVar = contextvars.ContextVar("pyrobale_update_memo", default=None)
+
+
+@contextlib.contextmanager
+def update_scope():
+    """Gives filters evaluated inside it a memo shared for one update. Entered by the client per update."""
+    token = _update_memo.set({})
+    try:
+        yield
+    finally:
+        _update_memo.reset(token)
+
+
+def update_memo() -> dict:
+    """
+    Returns the memo of the update being processed, where filters share results.
+
+    Returns:
+        dict: the memo, a new empty dict outside of an update
+    """
+    memo = _update_memo.get()
+    return {} if memo is None else memo
+
+
 class Filter:
-    def __init__(self, check_func: Callable, inv: bool = False) -> None:
-        self.state = (check_func, inv)
-        self.lst = [self.state]
+    """
+    A filter expression.
 
-    def __invert__(self):
-        self.state = (self.state[0], not self.state[1])
-        self.lst = [self.state]
-        return self
+    A filter wraps a predicate called with ``(event, client)``. Filters are
+    immutable and combine with ``&``, ``|`` and ``~`` into a tree of
+    :class:`And`, :class:`Or` and :class:`Not` nodes. Before it is evaluated
+    the tree is compiled into a single function that short-circuits, runs
+    synchronous predicates before asynchronous ones (cheapest first) and
+    remembers the result of asynchronous nodes for the rest of the update,
+    so a filter shared by several handlers runs once per update.
+
+    Filters written as plain functions are synchronous: they only look at
+    the event, and an expression made of them is evaluated without creating
+    a coroutine. Coroutine functions are for filters doing I/O.
+
+    Args:
+        check_func (Callable): the predicate, a function or coroutine function
+        inv (bool): invert the result of the predicate
+        cost (int, optional): relative cost used to order predicates. Defaults to 1 for
+            functions and 100 for coroutine functions
+        memoize (bool): remember the result for the rest of the update, when asynchronous. Defaults to True
+    """
+
+    __slots__ = ("func", "inv", "_cost", "memoize", "is_async", "_compiled")
+
+    def __init__(self, check_func: Callable, inv: bool = False, cost: Optional[int] = None,
+                 memoize: bool = True) -> None:
+        object.__setattr__(self, "func", check_func)
+        object.__setattr__(self, "inv", inv)
+        object.__setattr__(self, "_cost", cost)
+        object.__setattr__(self, "memoize", memoize)
+        object.__setattr__(self, "is_async", inspect.iscoroutinefunction(check_func))
+        object.__setattr__(self, "_compiled", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Filters are immutable, combine them with &, | and ~ instead")
+
+    @property
+    def cost(self) -> int:
+        if self._cost is not None:
+            return self._cost
+        return 100 if self.is_async else 1
 
     def __and__(self, other):
-        if not isinstance(other, Filter):
-            raise TypeError(f"Cannot combine Filter with {type(other)}")
+        return And(self, as_filter(other))
 
-        def combined_check(event, client=None, *args):
-            if self.state[1]:
-                res1 = not self.state[0](event, client, *args)
-            else:
-                res1 = self.state[0](event, client, *args)
+    def __rand__(self, other):
+        return And(as_filter(other), self)
 
-            if other.state[1]:
-                res2 = not other.state[0](event, client, *args)
-            else:
-                res2 = other.state[0](event, client, *args)
+    def __or__(self, other):
+        return Or(self, as_filter(other))
 
-            return res1 and res2
+    def __ror__(self, other):
+        return Or(as_filter(other), self)
 
-        new_filter = Filter(self.state[0], self.state[1])
-        new_filter.lst = self.lst + other.lst
-        new_filter.state = (combined_check, False)
-        return new_filter
+    def __invert__(self):
+        return Not(self)
+
+    def _build(self) -> Callable:
+        func, inv = self.func, self.inv
+        if self.is_async:
+            async def run(event, client, memo):
+                try:
+                    result = bool(await func(event, client))
+                except Exception as e:
+                    log.exception("Filter error: %s", e)
+                    result = False
+                return result != inv
+        else:
+            def run(event, client, memo):
+                try:
+                    result = bool(func(event, client))
+                except Exception as e:
+                    log.exception("Filter error: %s", e)
+                    result = False
+                return result != inv
+        return run
+
+    def compile(self) -> Callable:
+        """
+        Compiles the expression.
+
+        Returns:
+            Callable: called with ``(event, client, memo)``, returns the result, or an
+            awaitable of it when :attr:`is_async` is True
+        """
+        if self._compiled is None:
+            run = self._build()
+            if self.is_async and self.memoize:
+                run = _memoized(self, run)
+            object.__setattr__(self, "_compiled", run)
+        return self._compiled
+
+    async def evaluate(self, event, client=None, memo: Optional[dict] = None) -> bool:
+        """
+        Evaluates the expression against an event.
+
+        Args:
+            event: the event
+            client (Client, optional): the client
+            memo (dict, optional): results shared within an update. Defaults to the memo of the current update
+
+        Returns:
+            bool: whether the event passes
+        """
+        if not self.is_async:
+            return self.compile()(event, client, memo)
+        if memo is None:
+            memo = update_memo()
+        return await self.compile()(event, client, memo)
+
+    def check_nowait(self, event, client=None) -> bool:
+        """
+        Evaluates a synchronous expression without creating a coroutine.
+
+        Args:
+            event: the event
+            client (Client, optional): the client
+
+        Returns:
+            bool: whether the event passes
+        """
+        if self.is_async:
+            raise TypeError("The filter is asynchronous, use evaluate()")
+        return self.compile()(event, client, None)
 
     def __call__(self, event, client=None, *args):
-        if self.state[1]:
-            return not self.state[0](event, client, *args)
-        return self.state[0](event, client, *args)
+        return self.evaluate(event, client)
+
+
+class _Node(Filter):
+    __slots__ = ("children",)
+
+    def __init__(self, *children: Filter) -> None:
+        super().__init__(None)
+        object.__setattr__(self, "children", tuple(children))
+        object.__setattr__(self, "is_async", any(child.is_async for child in self.children))
+
+    @property
+    def cost(self) -> int:
+        return sum(child.cost for child in self.children)
+
+    def _parts(self):
+        # nested nodes of the same kind are flattened, then sync parts go first, cheapest first
+        flat = []
+        for child in self.children:
+            if type(child) is type(self):
+                flat.extend(child._parts())
+            else:
+                flat.append(child)
+        return sorted(flat, key=lambda child: (child.is_async, child.cost))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(map(repr, self.children))})"
+
+
+class And(_Node):
+    """Passes when every child passes."""
+
+    __slots__ = ()
+
+    def _build(self) -> Callable:
+        parts = self._parts()
+        sync_parts = [part.compile() for part in parts if not part.is_async]
+        async_parts = [part.compile() for part in parts if part.is_async]
+        if not async_parts:
+            def run(event, client, memo):
+                for part in sync_parts:
+                    if not part(event, client, memo):
+                        return False
+                return True
+        else:
+            async def run(event, client, memo):
+                for part in sync_parts:
+                    if not part(event, client, memo):
+                        return False
+                for part in async_parts:
+                    if not await part(event, client, memo):
+                        return False
+                return True
+        return run
+
+
+class Or(_Node):
+    """Passes when any child passes."""
+
+    __slots__ = ()
+
+    def _build(self) -> Callable:
+        parts = self._parts()
+        sync_parts = [part.compile() for part in parts if not part.is_async]
+        async_parts = [part.compile() for part in parts if part.is_async]
+        if not async_parts:
+            def run(event, client, memo):
+                for part in sync_parts:
+                    if part(event, client, memo):
+                        return True
+                return False
+        else:
+            async def run(event, client, memo):
+                for part in sync_parts:
+                    if part(event, client, memo):
+                        return True
+                for part in async_parts:
+                    if await part(event, client, memo):
+                        return True
+                return False
+        return run
+
+
+class Not(_Node):
+    """Passes when its child does not."""
+
+    __slots__ = ()
+
+    def __init__(self, child: Filter) -> None:
+        super().__init__(as_filter(child))
+
+    def __invert__(self):
+        return self.children[0]
+
+    def _build(self) -> Callable:
+        child = self.children[0].compile()
+        if self.children[0].is_async:
+            async def run(event, client, memo):
+                return not await child(event, client, memo)
+        else:
+            def run(event, client, memo):
+                return not child(event, client, memo)
+        return run
+
+
+def _memoized(node: Filter, run: Callable) -> Callable:
+    async def memoized_run(event, client, memo):
+        key = ("filter", id(node), type(event))
+        result = memo.get(key)
+        if result is None:
+            result = memo[key] = await run(event, client, memo)
+        return result
+    return memoized_run
+
+
+def _has_attribute(name: str) -> Filter:
+    def check(event, *args):
+        return getattr(event, name, None) is not None
+    return Filter(check)
+
+
+def as_filter(value: Union[Filter, Callable, str]) -> Filter:
+    """
+    Converts a value to a filter.
+
+    Args:
+        value (Filter OR Callable OR str): a filter, a predicate called with ``(event, client)``,
+            or the name of an attribute the event must have
+
+    Returns:
+        Filter: the filter
+    """
+    if isinstance(value, Filter):
+        return value
+    if isinstance(value, str):
+        return _has_attribute(value)
+    if callable(value):
+        return Filter(value)
+    raise TypeError(f"Cannot use {type(value).__name__} as a filter")
+
+
+def combine(*filters: Union[Filter, Callable, str]) -> Optional[Filter]:
+    """
+    Combines the filters of a handler, which must all pass.
+
+    Args:
+        *filters: filters, predicates or attribute names
+
+    Returns:
+        Filter: the combined filter, None when there are no filters
+    """
+    filters = [as_filter(value) for value in filters if value is not None]
+    if not filters:
+        return None
+    return filters[0] if len(filters) == 1 else And(*filters)
+
+
+class _PrefixIndex:
+    """
+    Matches a text once against the prefixes of every startswith filter.
+
+    The prefixes are kept in a trie, so a text is matched against all of
+    them in one walk over its characters, and the matches are remembered for
+    the rest of the update. Each filter then only checks its own token.
+    """
+
+    _END = object()
+
+    def __init__(self):
+        self._root: dict = {}
+        self._tokens = 0
+
+    def add(self, prefixes) -> int:
+        self._tokens += 1
+        token = self._tokens
+        for prefix in prefixes:
+            node = self._root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node.setdefault(self._END, set()).add(token)
+        return token
+
+    def match(self, text: str) -> set:
+        memo = update_memo()
+        key = ("prefixes", text)
+        found = memo.get(key)
+        if found is None:
+            node = self._root
+            found = set(node.get(self._END, ()))
+            for char in text:
+                node = node.get(char)
+                if node is None:
+                    break
+                found.update(node.get(self._END, ()))
+            memo[key] = found
+        return found
+
+
+prefix_index = _PrefixIndex()
+
+
+def _event_texts(event):
+    for name in ("text", "caption", "data"):
+        value = getattr(event, name, None)
+        if isinstance(value, str):
+            yield value
+
 
 def equals(expected_text: Union[str, List[str]]):
     """
@@ -53,14 +388,13 @@ def equals(expected_text: Union[str, List[str]]):
     Returns:
         Callable: A function that checks if the event text or caption or callbackQuery data is equal to the expected text.
     """
-    async def check(event, *args):
-        try:
-            if isinstance(expected_text, str):
-                return getattr(event, "text", None) == expected_text or getattr(event, "caption", None) == expected_text or getattr(event, "data", None) == expected_text
-            else:
-                return getattr(event, "text", None) in expected_text or getattr(event, "caption", None) in expected_text or getattr(event, "data", None) in expected_text
-        except:
-            return False
+    expected = frozenset([expected_text] if isinstance(expected_text, str) else expected_text)
+
+    def check(event, *args):
+        for value in _event_texts(event):
+            if value in expected:
+                return True
+        return False
     return Filter(check)
 
 def startswith(expected_text: Union[str, List[str]]):
@@ -73,70 +407,243 @@ def startswith(expected_text: Union[str, List[str]]):
     Returns:
         Callable: A function that checks if the event text or caption or callbackQuery data is started with to the expected text.
     """
-    async def check(event, *args):
-        try:
-            if isinstance(expected_text, str):
-                return getattr(event, "text", "").startswith(expected_text) or getattr(event, "caption", "").startswith(expected_text) or getattr(event, "data", "").startswith(expected_text)
-            else:
-                e_texts = [getattr(event, "text", "").startswith(expected_textt) or getattr(event, "caption", "").startswith(expected_textt) or getattr(event, "data", "").startswith(expected_textt) for expected_textt in expected_text]
-                for e in e_texts:
-                    if e:
-                        return True
+    token = prefix_index.add([expected_text] if isinstance(expected_text, str) else expected_text)
 
-            return False
-        except:
-            return False
+    def check(event, *args):
+        for value in _event_texts(event):
+            if token in prefix_index.match(value):
+                return True
+        return False
     return Filter(check)
 
 
-def regex(pattern: str):
+def regex(pattern: Union[str, "re.Pattern"], flags: int = 0):
     """
     checks the event text or caption with given pattern using regex
     
     Args:
-        pattern (str): The pattern to check with text
+        pattern (str): The pattern to check with text, compiled once when the filter is created
+        flags (int): flags of the pattern, like re.IGNORECASE
     
     Returns:
         Callable: A function that checks if the event text or caption is match with given pattern
     """
-    async def check(event, *args):
-        try:
-            return re.search(pattern, getattr(event, "text", "")) or re.search(pattern, getattr(event, "caption", ""))
-        except:
-            return False
+    search = (pattern if isinstance(pattern, re.Pattern) else re.compile(pattern, flags)).search
+
+    def check(event, *args):
+        text = getattr(event, "text", None)
+        if isinstance(text, str) and search(text):
+            return True
+        caption = getattr(event, "caption", None)
+        return isinstance(caption, str) and search(caption) is not None
     return Filter(check)
 
-def from_users(allowed_users: Union[List[Union["User", int, str]], int, str]):
+def _normalize_id(value) -> Union[int, str]:
+    value = getattr(value, "id", value)
+    if isinstance(value, str) and value.lstrip("-").isdigit():
+        return int(value)
+    if isinstance(value, (int, str)):
+        return value
+    raise ValueError(f"Cannot use {type(value).__name__} as a user or chat ID")
+
+
+class AccessList:
+    """
+    A set of user or chat IDs that can be replaced at runtime.
+
+    The IDs are kept in a frozenset that is swapped as a whole, so filters
+    reading it concurrently always see either the old or the new list.
+    Filters built on an AccessList follow its reloads without registering
+    handlers again.
+
+    Args:
+        ids (Iterable, optional): initial IDs, ``User`` and ``Chat`` objects are accepted
+        source (str OR Callable, optional): what :meth:`reload` reads, a file with one ID per
+            line (``#`` starts a comment) or a function or coroutine function returning the IDs
+
+    Example:
+        >>> admins = AccessList(source="admins.txt")
+        >>> admins.reload()
+        >>> @bot.on_message(from_users(admins))
+        ... async def admin_panel(message): ...
+    """
+
+    def __init__(self, ids=(), source: Optional[Union[str, Callable]] = None):
+        self.ids = frozenset(_normalize_id(value) for value in ids)
+        self.source = source
+        self._mtime: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, value) -> bool:
+        return value in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def replace(self, ids) -> None:
+        """
+        Replaces every ID at once.
+
+        Args:
+            ids (Iterable): the new IDs
+        """
+        self.ids = frozenset(_normalize_id(value) for value in ids)
+
+    @staticmethod
+    def _read_file(path: str) -> List[str]:
+        ids = []
+        with open(path) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    ids.append(line)
+        return ids
+
+    @smart_method
+    async def reload(self) -> int:
+        """
+        Reads the IDs from the source again.
+
+        Returns:
+            int: number of IDs after reloading
+        """
+        if self.source is None:
+            raise ValueError("The access list has no source to reload from")
+        if callable(self.source):
+            ids = self.source()
+            if inspect.isawaitable(ids):
+                ids = await ids
+        else:
+            self._mtime = os.path.getmtime(self.source)
+            ids = self._read_file(self.source)
+        self.replace(ids)
+        return len(self.ids)
+
+    def auto_reload(self, interval: float = 60) -> asyncio.Task:
+        """
+        Reloads the IDs periodically in the running event loop. Files are only read again after they change.
+
+        Args:
+            interval (float): seconds between reloads
+
+        Returns:
+            asyncio.Task: the reloading task, cancel it or call :meth:`stop` to stop reloading
+        """
+        self.stop()
+        self._task = asyncio.get_running_loop().create_task(self._reload_every(interval))
+        return self._task
+
+    def stop(self) -> None:
+        """Stops reloading periodically."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _reload_every(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not callable(self.source) and os.path.getmtime(self.source) == self._mtime:
+                    continue
+                await self.reload()
+            except Exception as e:
+                log.exception("Reloading access list failed, keeping %d IDs: %s", len(self.ids), e)
+
+
+def _id_set(ids) -> Union[AccessList, frozenset]:
+    if isinstance(ids, AccessList):
+        return ids
+    if isinstance(ids, (str, int)) or hasattr(ids, "id"):
+        ids = [ids]
+    try:
+        return frozenset(_normalize_id(value) for value in ids)
+    except ValueError:
+        raise ValueError("IDs can only be digits, usernames, or User and Chat objects")
+
+
+def _event_id(event, attribute: str):
+    return getattr(getattr(event, attribute, None), "id", None)
+
+
+def from_users(allowed_users: Union[List[Union["User", int, str]], int, str, AccessList]):
     """
     Check if the event text or caption or callbackQuery sender is in allowed user.
     
     Args:
-        allowed_users (List[Union["User", int]]): Allowed users to use this handler.
+        allowed_users (List[Union["User", int]] OR AccessList): Allowed users to use this handler.
 
     Returns:
         Callable: A function that checks if the event text or caption or callbackQuery sender is in allowed user.
     """
-    if type(allowed_users) in [str, int]:
-        try:
-            allowed_users = [int(allowed_users)]
-        except:
-            raise ValueError("Chat IDs can only be digits")
-    async def check(event, *args):
-        try:
-            event_user = getattr(event, "user", None)
-            event_user_id = getattr(event_user, "id")
-            if event_user_id in allowed_users:
-                return True
-        except:
-            return False
+    allowed = _id_set(allowed_users)
+
+    def check(event, *args):
+        return _event_id(event, "user") in allowed
+    return Filter(check)
+
+def deny_users(denied_users: Union[List[Union["User", int, str]], int, str, AccessList]):
+    """
+    Check if the event sender is not in denied users.
+
+    Args:
+        denied_users (List[Union["User", int]] OR AccessList): Users that cannot use this handler.
+
+    Returns:
+        Callable: A function that checks if the event sender is not in denied users.
+    """
+    denied = _id_set(denied_users)
+
+    def check(event, *args):
+        return _event_id(event, "user") not in denied
+    return Filter(check)
+
+def from_chats(allowed_chats: Union[List[Union["Chat", int, str]], int, str, AccessList]):
+    """
+    Check if the event is happening in allowed chats.
+
+    Args:
+        allowed_chats (List[Union["Chat", int]] OR AccessList): Chats this handler works in.
+
+    Returns:
+        Callable: A function that checks if the event is happening in allowed chats.
+    """
+    allowed = _id_set(allowed_chats)
+
+    def check(event, *args):
+        return _event_id(event, "chat") in allowed
     return Filter(check)
 
-def is_joined(chat_ids: Union[List[Union["User", int, str]], int, str]):
+def deny_chats(denied_chats: Union[List[Union["Chat", int, str]], int, str, AccessList]):
+    """
+    Check if the event is not happening in denied chats.
+
+    Args:
+        denied_chats (List[Union["Chat", int]] OR AccessList): Chats this handler does not work in.
+
+    Returns:
+        Callable: A function that checks if the event is not happening in denied chats.
+    """
+    denied = _id_set(denied_chats)
+
+    def check(event, *args):
+        return _event_id(event, "chat") not in denied
+    return Filter(check)
+
+def is_joined(chat_ids: Union[List[Union["User", int, str]], int, str], report_missing: bool = False):
     """
     Checks if the event User is joined in specified chats.
+
+    The chats are checked concurrently and the chats the User is not joined
+    in are set as ``event.missing_chats``. Other filters of the same update
+    reuse the results instead of asking the API again.
     
     Args:
-        allowed_users (List[Union["User", int]]): Allowed users to use this handler.
+        chat_ids (Iterable[Union[int, str]]): Chats the User has to be joined in.
+        report_missing (bool): Check every chat, so ``missing_chats`` is complete. By default the
+            remaining checks are cancelled once the User is found missing from a chat.
 
     Returns:
         Callable: A function that checks if the event User is joined in specified chats
@@ -146,31 +653,59 @@ def is_joined(chat_ids: Union[List[Union["User", int, str]], int, str]):
             chat_ids = [int(chat_ids)]
         except:
             raise ValueError("Chat IDs can only be digits")
+    # sets and generators work too, missing chats are reported in this order
+    chat_ids = tuple(dict.fromkeys(chat_ids))
 
     async def check(event, client: 'Client', *args):
         try:
             event_user = getattr(event, "user", None)
             event_user_id = getattr(event_user, "id")
-            for chat in chat_ids:
-                data = await client.make_post(
-                    client.requests_base + "/getChatMember",
-                    data={"chat_id": chat, "user_id": event_user_id},
-                )
-                joined = data.get("result", {}).get("status") in ["member", "creator", "administrator"]
-                if not joined:
-                    return False
-            return True
-            
         except:
             return False
-    return Filter(check)
 
-def at_state(state: Optional[str] = None):
+        memo = update_memo()
+        checks = {}
+        for chat in chat_ids:
+            key = ("chat_member", chat, event_user_id)
+            task = memo.get(key)
+            if task is None:
+                task = memo[key] = asyncio.ensure_future(client._fetch_chat_member(chat, event_user_id))
+            checks[task] = chat
+
+        missing = []
+        pending = set(checks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        joined = task.result().get("status") in JOINED_STATUSES
+                    except Exception:
+                        joined = False
+                    if not joined:
+                        missing.append(checks[task])
+                if missing and not report_missing:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                memo.pop(("chat_member", checks[task], event_user_id), None)
+
+        missing.sort(key=chat_ids.index)
+        try:
+            event.missing_chats = missing
+        except AttributeError:
+            pass
+        return not missing
+    return Filter(check, cost=1000, memoize=False)
+
+def at_state(state: Optional[str] = None, **data):
     """
     Checks if the event User is at specified state.
     
     Args:
         state (Optional[str]): state condition
+        **data: fields the data of the User must have, e.g. ``at_state("form", step=2)``
 
     Returns:
         Callable: A function that checks if the event User is at specified state.
@@ -181,17 +716,23 @@ def at_state(state: Optional[str] = None):
         try:
             event_user = getattr(event, "user", None)
             event_user_id = getattr(event_user, "id")
-            return client.state_machine.get_state(event_user_id) == state
+            current = await client.state_machine.fetch_state(event_user_id)
+            if current is None or current != state:
+                return False
+            if data:
+                user_data = await client.state_machine.fetch_data(event_user_id)
+                return all(key in user_data and user_data[key] == value for key, value in data.items())
+            return True
         except:
             return False
-    return Filter(check)
+    return Filter(check, cost=10)
 
 def _private():
     """
     checks if the event is happening in a private chat
     """
 
-    async def check(event, *args):
+    def check(event, *args):
         try:
             chat = getattr(event, "chat")
             return getattr(chat, "private")
@@ -204,7 +745,7 @@ def _group():
     checks if the event is happening in a group chat
     """
 
-    async def check(event, *args):
+    def check(event, *args):
         try:
             chat = getattr(event, "chat")
             return chat.type == chat.type.GROUP
@@ -217,7 +758,7 @@ def _reply():
     Checks if the event is a reply to a message.
     """
 
-    async def check(event, *args):
+    def check(event, *args):
         try:
             return getattr(event, "reply_to_message") is not None
         except:
@@ -229,7 +770,7 @@ def _forward():
     Checks if the event is a forwarded message.
     """
 
-    async def check(event, *args):
+    def check(event, *args):
         try:
             return getattr(event, "forward_from") is not None
         except:
@@ -241,7 +782,7 @@ def _gif():
     Checks if the event has a gif media.
     """
 
-    async def check(event, *args):
+    def check(event, *args):
         try:
             return getattr(event, "animation") is not None
         except:
@@ -255,7 +796,7 @@ def _digit():
     Returns:
         Callable: A function that checks if the event text or caption or callbackQuery data is digit.
     """
-    async def check(event, *args):
+    def check(event, *args):
         try:
             return getattr(event, "text", "").isdigit() or getattr(event, "caption", "").isdigit() or getattr(event, "data", "").isdigit()
         except:
@@ -267,7 +808,7 @@ def _channel():
     checks if the event is happening in a channel
     """
 
-    async def check(event, args):
+    def check(event, *args):
         try:
             chat = getattr(event, "chat")
             return getattr(chat, "channel")
@@ -275,8 +816,37 @@ def _channel():
             return False
     return Filter(check)
 
+def _mentioned():
+    """
+    checks if the event mentions the bot by its username or replies to one of its messages
+    """
+
+    def check(event, client: 'Client', *args):
+        try:
+            return client.mentions_me(event)
+        except:
+            return False
+    return Filter(check)
+
 def func(function: Callable):
-    async def check(event, *args):
+    """
+    Uses a function called with the event as a filter.
+
+    Args:
+        function (Callable): a function or coroutine function returning whether the event passes
+
+    Returns:
+        Callable: A function that checks the event with the given function.
+    """
+    if inspect.iscoroutinefunction(function):
+        async def async_check(event, *args):
+            try:
+                return await function(event)
+            except:
+                return False
+        return Filter(async_check)
+
+    def check(event, *args):
         try:
             return function(event)
         except:
@@ -285,37 +855,37 @@ def func(function: Callable):
 
 
 def _text():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "text") and bool(getattr(event, "text"))
     return Filter(check)
 
 def _photo():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "photo") and bool(getattr(event, "photo"))
     return Filter(check)
 
 def _video():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "video") and bool(getattr(event, "video"))
     return Filter(check)
 
 def _audio():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "audio") and bool(getattr(event, "audio"))
     return Filter(check)
 
 def _voice():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "voice") and bool(getattr(event, "voice"))
     return Filter(check)
 
 def _contact():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "contact") and bool(getattr(event, "contact"))
     return Filter(check)
 
 def _location():
-    async def check(event, *args):
+    def check(event, *args):
         return hasattr(event, "location") and bool(getattr(event, "location"))
     return Filter(check)
 
@@ -332,4 +902,5 @@ video = _video()
 audio = _audio()
 voice = _voice()
 contact = _contact()
-location = _location()
\ No newline at end of file
+location = _location()
+mentioned = _mentioned()
\ No newline at end of file
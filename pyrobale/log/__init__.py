@@ -0,0 +1,173 @@
+"""Logging for pyrobale.
+
+Every component logs to a child of the ``pyrobale`` logger
+(``pyrobale.client``, ``pyrobale.dispatcher``, ``pyrobale.filters``,
+``pyrobale.polling``, ...). Nothing is printed unless the application
+configures logging, either with the standard :mod:`logging` module or with
+:func:`setup_logging`, which moves formatting and I/O off the event loop to
+a background thread.
+
+Warnings and errors of the component loggers pass through a shared
+:class:`RateLimitFilter`, so a failing handler or filter cannot flood the
+logs under load.
+"""
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+import logging
+import queue
+import threading
+import time
+
+
+ROOT_LOGGER_NAME = "pyrobale"
+
+logging.getLogger(ROOT_LOGGER_NAME).addHandler(logging.NullHandler())
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Limits repetitive log records.
+
+    Records are grouped by logger, message template, first argument (like
+    the name of a failing handler) and exception type. Each group may emit
+    ``burst`` records per ``interval`` seconds; after that only one out of
+    every ``sample_rate`` records is let through, carrying the number of
+    records suppressed since the last one in ``record.suppressed``, which
+    :class:`SuppressedFormatter` appends to the message.
+
+    Args:
+        burst (int, optional): Records allowed per interval for each group. Defaults to 5.
+        interval (float, optional): Length of the interval in seconds. Defaults to 60.
+        sample_rate (int, optional): Emit one out of this many records after the burst. Defaults to 100.
+        min_level (int, optional): Records below this level are never limited. Defaults to logging.WARNING.
+    """
+
+    def __init__(self, burst: int = 5, interval: float = 60.0, sample_rate: int = 100,
+                 min_level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_rate = max(int(sample_rate), 1)
+        self.min_level = min_level
+        # group -> [window start, records in window, suppressed since last emit]
+        self._groups: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.min_level:
+            return True
+        exc_type = record.exc_info[0] if record.exc_info else None
+        key = (record.name, record.msg, _first_arg(record), exc_type)
+        now = time.monotonic()
+        with self._lock:
+            state = self._groups.get(key)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[2] if state else 0
+                state = self._groups[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            state[1] += 1
+            count = state[1]
+            if count > self.burst and (count - self.burst) % self.sample_rate:
+                state[2] += 1
+                return False
+            suppressed += state[2]
+            state[2] = 0
+            if len(self._groups) > 10000:
+                self._groups = {k: v for k, v in self._groups.items() if now - v[0] < self.interval}
+        record.suppressed = suppressed
+        return True
+
+
+def _first_arg(record: logging.LogRecord) -> object:
+    if isinstance(record.args, tuple) and record.args:
+        first = record.args[0]
+        return first if isinstance(first, (str, int)) else type(first)
+    return None
+
+
+class SuppressedFormatter(logging.Formatter):
+    """Formatter appending the number of records :class:`RateLimitFilter` suppressed before this one."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text = f"{text} ({suppressed} similar messages suppressed)"
+        return text
+
+
+default_rate_limit = RateLimitFilter()
+
+
+def get_logger(component: str) -> logging.Logger:
+    """Returns the logger of a pyrobale component.
+
+    Args:
+        component (str): Name of the component, for example "dispatcher".
+
+    Returns:
+        logging.Logger: The ``pyrobale.<component>`` logger.
+    """
+    logger = logging.getLogger(f"{ROOT_LOGGER_NAME}.{component}")
+    if default_rate_limit not in logger.filters:
+        logger.addFilter(default_rate_limit)
+    return logger
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues records as they are, leaving formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(level: int = logging.INFO, handler: Optional[logging.Handler] = None,
+                  fmt: str = "%(asctime)s %(levelname)s %(name)s: %(message)s") -> QueueListener:
+    """Configures non-blocking logging for pyrobale.
+
+    Records of the ``pyrobale`` logger are put on a queue by a
+    :class:`~logging.handlers.QueueHandler` and written by a
+    :class:`~logging.handlers.QueueListener` thread, so the event loop never
+    blocks on formatting or log I/O.
+
+    Args:
+        level (int, optional): Level of the pyrobale logger. Defaults to logging.INFO.
+        handler (logging.Handler, optional): Handler that writes the records. Defaults to a stderr StreamHandler.
+        fmt (str, optional): Format of a :class:`SuppressedFormatter` used when ``handler`` has no formatter.
+
+    Returns:
+        QueueListener: The running listener.
+    """
+    global _listener, _queue_handler
+    shutdown_logging()
+
+    if handler is None:
+        handler = logging.StreamHandler()
+    if handler.formatter is None:
+        handler.setFormatter(SuppressedFormatter(fmt))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _queue_handler = _DeferredQueueHandler(log_queue)
+
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """Stops the listener started by :func:`setup_logging` and flushes pending records."""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger(ROOT_LOGGER_NAME).removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
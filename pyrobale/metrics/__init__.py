@@ -0,0 +1,405 @@
+"""Prometheus/OpenMetrics style metrics for pyrobale clients.
+
+Metrics are disabled unless a :class:`MetricsRegistry` is passed to the
+client, in which case the client only pays for a ``None`` check per hook.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import threading
+import time
+import aiohttp
+from aiohttp import web
+
+from ..monitor import executor_stats
+
+if TYPE_CHECKING:
+    from ..client import Client
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def api_method(url: str) -> str:
+    """Returns the API method of a request url, without its query string"""
+    return url.rsplit("/", 1)[-1].split("?", 1)[0]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        parts.append(extra)
+    if not parts:
+        return ""
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """Base class of all metric types.
+
+    Args:
+        name (str): Name of the metric.
+        documentation (str): Help text of the metric.
+        labelnames (Iterable[str], optional): Names of the labels of the metric.
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing value."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Increments the counter.
+
+        Args:
+            amount (float, optional): Amount to add. Defaults to 1.
+            **labels: Values of the labels of the metric.
+        """
+        if amount < 0:
+            raise ValueError("Counters can only be increased")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [("_total", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """A value that can go up and down, or be computed at collection time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Computes the value of an unlabelled gauge when it is collected.
+
+        Args:
+            function (Callable): A function returning the current value.
+        """
+        self._function = function
+
+    def get(self, **labels) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        if self._function is not None:
+            try:
+                return [("", "", float(self._function()))]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """Records an observation.
+
+        Args:
+            value (float): The observed value.
+            **labels: Values of the labels of the metric.
+        """
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # bucket counts, then sum and count
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def get_count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return int(state[-1]) if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(state)) for key, state in self._values.items()]
+        result = []
+        for key, state in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                result.append(("_bucket", labels, cumulative))
+            result.append(("_sum", _format_labels(self.labelnames, key), state[-2]))
+            result.append(("_count", _format_labels(self.labelnames, key), state[-1]))
+        return result
+
+
+class MetricsRegistry:
+    """A collection of metrics that can be served over HTTP or pushed.
+
+    Args:
+        prefix (str, optional): Prefix added to the names of created metrics. Defaults to "pyrobale".
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = "pyrobale"):
+        self.prefix = prefix
+        self._metrics: Dict[str, Metric] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self._push_task: Optional[asyncio.Task] = None
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        full_name = f"{self.prefix}_{name}" if self.prefix else name
+        metric = self._metrics.get(full_name)
+        if metric is None:
+            metric = self._metrics[full_name] = cls(full_name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {full_name} is already registered as {metric.type_name}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(f"{self.prefix}_{name}" if self.prefix else name)
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The rendered metrics.
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+    async def _handle_scrape(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.render().encode(), headers={"Content-Type": self.content_type})
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9464, path: str = "/metrics") -> None:
+        """Serves the metrics on a local HTTP endpoint.
+
+        Args:
+            host (str, optional): Host to bind. Defaults to "127.0.0.1".
+            port (int, optional): Port to bind. Defaults to 9464.
+            path (str, optional): Path of the endpoint. Defaults to "/metrics".
+        """
+        if self._runner is not None:
+            raise RuntimeError("Metrics endpoint is already running")
+        app = web.Application()
+        app.router.add_get(path, self._handle_scrape)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def push(self, url: str, job: str = "pyrobale", instance: Optional[str] = None) -> None:
+        """Pushes the metrics to a Prometheus Pushgateway.
+
+        Args:
+            url (str): Base URL of the pushgateway.
+            job (str, optional): Job name. Defaults to "pyrobale".
+            instance (str, optional): Instance name. Defaults to None.
+        """
+        target = f"{url.rstrip('/')}/metrics/job/{job}"
+        if instance:
+            target += f"/instance/{instance}"
+        async with aiohttp.ClientSession() as session:
+            async with session.put(target, data=self.render().encode(),
+                                   headers={"Content-Type": self.content_type}) as response:
+                if response.status >= 400:
+                    raise RuntimeError(f"Pushing metrics failed with status {response.status}")
+
+    def start_push(self, url: str, interval: float = 15, job: str = "pyrobale",
+                   instance: Optional[str] = None) -> asyncio.Task:
+        """Pushes the metrics periodically in a background task.
+
+        Args:
+            url (str): Base URL of the pushgateway.
+            interval (float, optional): Seconds between pushes. Defaults to 15.
+            job (str, optional): Job name. Defaults to "pyrobale".
+            instance (str, optional): Instance name. Defaults to None.
+
+        Returns:
+            asyncio.Task: The push task.
+        """
+        async def push_loop():
+            while True:
+                try:
+                    await self.push(url, job, instance)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    pass
+                await asyncio.sleep(interval)
+
+        self._push_task = asyncio.create_task(push_loop())
+        return self._push_task
+
+    async def stop(self) -> None:
+        """Stops the HTTP endpoint and the push task."""
+        if self._push_task is not None:
+            self._push_task.cancel()
+            self._push_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class ClientMetrics:
+    """The metrics recorded by a :class:`~pyrobale.client.Client`.
+
+    Args:
+        registry (MetricsRegistry): Registry to create the metrics in.
+        client (Client): The client whose executor and waiters are reported.
+    """
+
+    def __init__(self, registry: MetricsRegistry, client: "Client"):
+        self.registry = registry
+        self.updates_received = registry.counter(
+            "updates_received", "Updates received from getUpdates or webhooks")
+        self.updates_processed = registry.counter(
+            "updates_processed", "Updates dispatched to handlers", ["type"])
+        self.last_update_id = registry.gauge(
+            "last_update_id", "Highest update id processed by the client")
+        self.update_age = registry.histogram(
+            "update_age_seconds", "Delay between a message date and its processing",
+            buckets=(0.5, 1, 2, 5, 10, 30, 60, 300))
+        self.api_requests = registry.counter(
+            "api_requests", "Outbound Bot API calls", ["method", "status"])
+        self.api_latency = registry.histogram(
+            "api_request_duration_seconds", "Latency of outbound Bot API calls", ["method"])
+
+        executor = client.handler_executor
+        registry.gauge("executor_queue_size", "Handler calls waiting for a worker thread") \
+            .set_function(lambda: executor._work_queue.qsize())
+        registry.gauge("executor_threads", "Worker threads started by the handler executor") \
+            .set_function(lambda: len(executor._threads))
+        registry.gauge("executor_active_threads", "Worker threads currently running a handler") \
+            .set_function(lambda: executor_stats(executor)["active_threads"])
+        registry.gauge("executor_max_workers", "Maximum worker threads of the handler executor") \
+            .set_function(lambda: executor._max_workers)
+        registry.gauge("pending_waiters", "Pending wait_for calls") \
+            .set_function(lambda: len(client._waiters))
+        runner = client.handler_runner
+        registry.gauge("handler_tasks", "Handler calls currently running") \
+            .set_function(lambda: len(runner.tasks))
+        registry.gauge("handler_calls_dropped", "Handler calls dropped or shed by the overflow policy") \
+            .set_function(lambda: runner.dropped + runner.shed)
+        registry.gauge("handler_calls_timed_out", "Handler calls cancelled by their timeout") \
+            .set_function(lambda: runner.timed_out)
+
+        self.api_requests_coalesced = registry.counter(
+            "api_requests_coalesced", "Read calls that shared an identical call in flight", ["method"])
+        client.single_flight.on_coalesced = lambda method: self.api_requests_coalesced.inc(method=method)
+        self.rate_limit_wait = registry.histogram(
+            "rate_limit_wait_seconds", "Time calls waited for a client side rate limiter", ["limiter"])
+        self.broadcast_recipients = registry.counter(
+            "broadcast_recipients", "Recipients handled by broadcasts", ["outcome"])
+        if client.batch_limiter is not None:
+            client.batch_limiter.on_wait = self.observe_rate_limit_wait
+
+        monitor = client.loop_monitor
+        if monitor is not None:
+            registry.gauge("event_loop_lag_seconds", "Last measured event loop lag") \
+                .set_function(lambda: monitor.lag)
+            registry.gauge("event_loop_blocked", "Times the event loop was seen blocked") \
+                .set_function(lambda: monitor.blocked_count)
+
+    def observe_update(self, update: dict) -> None:
+        update_id = update.get("update_id")
+        if update_id:
+            self.last_update_id.set(update_id)
+        update_type = next((key for key in update if key != "update_id"), "unknown")
+        self.updates_processed.inc(type=update_type)
+        date = (update.get("message") or update.get("edited_message") or {}).get("date")
+        if date:
+            self.update_age.observe(max(time.time() - date, 0))
+
+    def observe_api_call(self, url: str, status, elapsed: float) -> None:
+        method = api_method(url)
+        self.api_requests.inc(method=method, status=status)
+        self.api_latency.observe(elapsed, method=method)
+
+    def observe_rate_limit_wait(self, limiter: str, waited: float) -> None:
+        self.rate_limit_wait.observe(waited, limiter=limiter)
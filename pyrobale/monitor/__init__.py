@@ -0,0 +1,160 @@
+"""Event loop lag and handler executor monitoring.
+
+:class:`LoopMonitor` runs a heartbeat task on the event loop and a watchdog
+thread next to it. The heartbeat measures how late the loop wakes it up
+(loop lag); the watchdog notices when the heartbeat stops entirely because a
+callback is blocking the loop, and captures the stack of the loop thread
+while it is blocked.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from ..log import get_logger
+
+
+log = get_logger("monitor")
+
+
+def executor_stats(executor: ThreadPoolExecutor) -> Dict[str, int]:
+    """Returns the saturation of a thread pool executor.
+
+    Args:
+        executor (ThreadPoolExecutor): The executor to inspect.
+
+    Returns:
+        dict: ``queue_size``, ``threads``, ``active_threads`` and ``max_workers``.
+    """
+    threads = len(executor._threads)
+    idle = getattr(getattr(executor, "_idle_semaphore", None), "_value", 0)
+    return {
+        "queue_size": executor._work_queue.qsize(),
+        "threads": threads,
+        "active_threads": max(threads - idle, 0),
+        "max_workers": executor._max_workers,
+    }
+
+
+class BlockedSample:
+    """A stack captured while the event loop was blocked.
+
+    Attributes:
+        timestamp (float): Unix time when the stack was captured.
+        blocked_for (float): Seconds the loop had been blocked at that time.
+        stack (List[str]): Formatted stack of the loop thread.
+    """
+
+    def __init__(self, timestamp: float, blocked_for: float, stack: List[str]):
+        self.timestamp = timestamp
+        self.blocked_for = blocked_for
+        self.stack = stack
+
+    def __repr__(self) -> str:
+        return f"<BlockedSample blocked_for={self.blocked_for:.3f}s>"
+
+
+class LoopMonitor:
+    """Watches an event loop for lag and blocking callbacks.
+
+    Args:
+        interval (float, optional): Seconds between heartbeats. Defaults to 0.5.
+        block_threshold (float, optional): Lag in seconds considered as blocking. Defaults to 0.25.
+        max_samples (int, optional): Number of blocked stack samples kept. Defaults to 20.
+        executor (ThreadPoolExecutor, optional): Executor to report on. Set by the client it is passed to.
+    """
+
+    def __init__(self, interval: float = 0.5, block_threshold: float = 0.25, max_samples: int = 20,
+                 executor: Optional[ThreadPoolExecutor] = None):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.executor = executor
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_count = 0
+        self.samples: Deque[BlockedSample] = deque(maxlen=max_samples)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop."""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="pyrobale_loop_watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """Stops monitoring."""
+        self._stop_event.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._thread = None
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(loop.time() - expected, 0.0)
+            self.max_lag = max(self.max_lag, self.lag)
+            self._last_beat = time.monotonic()
+            if self.lag >= self.block_threshold:
+                log.warning("Event loop lag of %.3fs (threshold %.3fs)", self.lag, self.block_threshold)
+                if self.executor is not None:
+                    stats = executor_stats(self.executor)
+                    if stats["queue_size"]:
+                        log.warning("Handler executor saturated: %d queued, %d/%d threads active",
+                                    stats["queue_size"], stats["active_threads"], stats["max_workers"])
+
+    def _watchdog(self) -> None:
+        sampled_beat = None
+        while not self._stop_event.wait(self.interval / 2):
+            last_beat = self._last_beat
+            blocked_for = time.monotonic() - last_beat - self.interval
+            if blocked_for < self.block_threshold or sampled_beat == last_beat:
+                continue
+            # capture one sample per blocking episode
+            sampled_beat = last_beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = traceback.format_stack(frame) if frame is not None else []
+            self.blocked_count += 1
+            self.samples.append(BlockedSample(time.time(), blocked_for, stack))
+            log.warning("Event loop blocked for at least %.3fs:\n%s", blocked_for, "".join(stack[-10:]))
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the current loop and executor statistics.
+
+        Returns:
+            dict: Loop lag, maximum lag, blocked count and executor saturation.
+        """
+        stats: Dict[str, Any] = {
+            "loop_lag": self.lag,
+            "max_loop_lag": self.max_lag,
+            "loop_blocked_count": self.blocked_count,
+        }
+        if self.executor is not None:
+            stats.update({f"executor_{key}": value for key, value in executor_stats(self.executor).items()})
+        return stats
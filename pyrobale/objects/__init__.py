@@ -44,7 +44,7 @@ from .successfulpayment import SuccessfulPayment
 from .messageid import MessageId
 from .labeledprice import LabeledPrice
 from .update import Update
-from .enums import UpdatesTypes, ChatAction, ChatType
+from .enums import UpdatesTypes, ChatAction, ChatType, OverflowPolicy, MatchType, BroadcastOutcome
 from .newchatmembers import NewChatMembers
 from .forwardorigin import ForwardOrigin
 from .poll import Poll
@@ -54,6 +54,9 @@ __all__ = [
     "UpdatesTypes",
     "ChatAction",
     "ChatType",
+    "OverflowPolicy",
+    "MatchType",
+    "BroadcastOutcome",
     "Voice",
     "ReplyKeyboardMarkup",
     "InputMediaPhoto",
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 
 
-from typing import Optional, Union
+from typing import Iterable, Optional, Union
 from .utils import smart_method
 
 if TYPE_CHECKING:
@@ -11,6 +11,7 @@ if TYPE_CHECKING:
     from ..client import Client
     from ..objects.inlinekeyboardmarkup import InlineKeyboardMarkup
     from ..objects.replykeyboardmarkup import ReplyKeyboardMarkup
+    from ..client.batch import BatchResult
 from .enums import ChatAction, ChatType
 
 
@@ -623,4 +624,56 @@ class Chat:
         Returns:
             bool: True on success
         """
-        return await self.restrict(user_id=user_id, can_send_messages=True)
\ No newline at end of file
+        return await self.restrict(user_id=user_id, can_send_messages=True)
+
+    @smart_method
+    async def mute_many(self, user_ids: Iterable[int]) -> "BatchResult":
+        """
+        Mutes many users in the chat concurrently.
+
+        Parameters:
+            user_ids (Iterable[int]): user ids to mute
+
+        Returns:
+            BatchResult: the result or error of every user
+        """
+        return await self.client.restrict_many(self.id, user_ids, can_send_messages=False)
+
+    @smart_method
+    async def unmute_many(self, user_ids: Iterable[int]) -> "BatchResult":
+        """
+        Unmutes many users in the chat concurrently.
+
+        Parameters:
+            user_ids (Iterable[int]): user ids to unmute
+
+        Returns:
+            BatchResult: the result or error of every user
+        """
+        return await self.client.restrict_many(self.id, user_ids, can_send_messages=True)
+
+    @smart_method
+    async def ban_many(self, user_ids: Iterable[int]) -> "BatchResult":
+        """
+        Bans many users from the chat concurrently.
+
+        Parameters:
+            user_ids (Iterable[int]): user ids to ban
+
+        Returns:
+            BatchResult: the result or error of every user
+        """
+        return await self.client.ban_many(self.id, user_ids)
+
+    @smart_method
+    async def delete_messages(self, message_ids: Iterable[int]) -> "BatchResult":
+        """
+        Deletes many messages of the chat concurrently.
+
+        Parameters:
+            message_ids (Iterable[int]): message ids to delete
+
+        Returns:
+            BatchResult: the result or error of every message
+        """
+        return await self.client.delete_messages(self.id, message_ids)
@@ -72,8 +72,28 @@ class TransactionStatus(Enum):
     FAILED = "failed"
     REJECTED = "rejected"
 
+class OverflowPolicy(Enum):
+    """What to do with a handler call when its concurrency limit is reached"""
+    WAIT = "wait"
+    DROP = "drop"
+    SHED_OLDEST = "shed_oldest"
+
+class MatchType(Enum):
+    """How the key of an auto reply is matched against message text"""
+    EXACT = "exact"
+    CASEFOLD = "casefold"
+    PREFIX = "prefix"
+    REGEX = "regex"
+
 class MessageEntityType(Enum):
     """Types of a "MessageEntity" """
     MENTION = "mention"
     COMMAND = "bot_command"
-    
\ No newline at end of file
+    
+class BroadcastOutcome(Enum):
+    """What happened to a recipient of a broadcast"""
+    SENT = "sent"
+    BLOCKED = "blocked"
+    FORBIDDEN = "forbidden"
+    NOT_FOUND = "not_found"
+    FAILED = "failed"
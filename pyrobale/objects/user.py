@@ -24,11 +24,22 @@ class User:
         self.client: Client = kwargs.get("client")
         self.language_code = language_code
     
-    def set_state(self, state: str):
+    def set_state(self, state: str, **data):
         self.client.state_machine.set_state(self.id, state)
+        if data:
+            self.client.state_machine.update_data(self.id, **data)
     
     def del_state(self):
         self.client.state_machine.del_state(self.id)
     
     def get_state(self):
-        self.client.state_machine.get_state(self.id)
\ No newline at end of file
+        return self.client.state_machine.get_state(self.id)
+
+    def get_data(self) -> dict:
+        return self.client.state_machine.get_data(self.id)
+
+    def update_data(self, **fields) -> dict:
+        return self.client.state_machine.update_data(self.id, **fields)
+
+    def del_data(self) -> bool:
+        return self.client.state_machine.del_data(self.id)
\ No newline at end of file
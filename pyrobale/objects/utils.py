@@ -68,4 +68,17 @@ def smart_method(func: Callable[..., Any]) -> Callable[..., Any]:
                 return async_to_sync(func)(*args, **kwargs)
         else:
             return func(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def _forget_parent_loop() -> None:
+    """Clears the event loop a forked process inherited from its parent.
+
+    A process forked while the loop of its parent was running starts with
+    that loop set as running, and ``asyncio.run`` refuses to run in it.
+    asyncio has no public way to clear it, so this is the one place using
+    the private setter. Processes started with ``spawn`` or ``forkserver``
+    have nothing to clear.
+    """
+    asyncio._set_running_loop(None)
+    asyncio.set_event_loop(None)
@@ -0,0 +1,88 @@
+"""Client side rate limiting of outbound API calls.
+
+:class:`RateLimiter` is a token bucket: it allows ``rate`` calls per ``per``
+seconds on average and bursts of up to ``burst`` calls. Callers wait in
+the order they arrived, and the bucket can be paused when the API answers
+with a "too many requests" error.
+"""
+
+from typing import Callable, Dict, Optional
+import asyncio
+import time
+
+
+class RateLimiter:
+    """A token bucket shared by concurrent callers.
+
+    Args:
+        rate (float): Calls allowed every ``per`` seconds.
+        per (float, optional): Length of the window in seconds. Defaults to 1.
+        burst (int, optional): Calls allowed at once after an idle period. Defaults to ``rate``.
+        name (str, optional): Name of the limiter in metrics. Defaults to "default".
+    """
+
+    def __init__(self, rate: float, per: float = 1.0, burst: Optional[int] = None, name: str = "default"):
+        if rate <= 0 or per <= 0:
+            raise ValueError("rate and per must be positive")
+        self.rate = rate / per
+        self.capacity = float(burst if burst is not None else max(rate, 1))
+        self.name = name
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.on_wait: Optional[Callable[[str, float], None]] = None
+        self.acquired = 0
+        self.waits = 0
+        self.waited = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """Waits until a call is allowed.
+
+        Args:
+            tokens (float, optional): Cost of the call. Defaults to 1.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._paused_until > now:
+                    delay = self._paused_until - now
+                elif self._tokens >= tokens:
+                    self._tokens -= tokens
+                    break
+                else:
+                    delay = (tokens - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+        self.acquired += 1
+        if waited:
+            self.waits += 1
+            self.waited += waited
+            if self.on_wait is not None:
+                self.on_wait(self.name, waited)
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """Blocks every caller for some time, like after a "too many requests" error.
+
+        Args:
+            seconds (float): Seconds to wait before the next call.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, now + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {"acquired": self.acquired, "waits": self.waits, "waited": self.waited}
@@ -0,0 +1,332 @@
+"""Dispatching updates on several processes.
+
+:class:`ShardedRunner` polls updates in one process and hands each one to
+one of ``workers`` worker processes, chosen by hashing the chat id, so
+every chat is always handled by the same worker and its updates keep their
+order. Each worker builds its own :class:`~pyrobale.client.Client` with the
+factory and dispatches updates with it, with its own event loop, HTTP
+session and handler threads, so handlers bound by the GIL use one core per
+worker.
+
+Workers share nothing by default. Handlers needing shared state can build
+their clients on a storage several processes can use, like
+:class:`~pyrobale.StateMachine.SQLiteStorage` (WAL mode) or
+:class:`~pyrobale.StateMachine.RedisStorage`.
+"""
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, TYPE_CHECKING
+from multiprocessing.connection import Connection
+import asyncio
+import multiprocessing
+import signal
+import time
+import zlib
+
+from ..log import get_logger
+from ..objects.utils import _forget_parent_loop
+
+if TYPE_CHECKING:
+    from ..client import Client
+
+
+log = get_logger("sharding")
+
+# sent by a worker ready for its next update
+READY = 1
+
+
+def shard_key(update: Dict[str, Any]) -> Any:
+    """Returns what an update is sharded by: its chat, else its user, else its id"""
+    for key in ("message", "edited_message"):
+        if key in update:
+            return (update[key].get("chat") or {}).get("id")
+    for key in ("callback_query", "pre_checkout_query"):
+        if key in update:
+            raw = update[key]
+            chat_id = ((raw.get("message") or {}).get("chat") or {}).get("id")
+            return chat_id if chat_id is not None else (raw.get("from") or {}).get("id")
+    return update.get("update_id")
+
+
+def shard_of(update: Dict[str, Any], shards: int) -> int:
+    """Returns the shard of an update, the same in every process"""
+    key = shard_key(update)
+    if isinstance(key, int):
+        return abs(key) % shards
+    return zlib.crc32(str(key).encode()) % shards
+
+
+def _worker_main(factory: Callable[[], "Client"], conn: Connection, index: int) -> None:
+    # the runner stops workers with a sentinel, Ctrl+C reaches the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # workers restarted while polling are forked from inside the running loop
+    _forget_parent_loop()
+    asyncio.run(_work(factory(), conn, index))
+
+
+async def _receive(conn: Connection) -> Any:
+    # read on the loop thread, so a handler can't end the process halfway through an update
+    loop = asyncio.get_running_loop()
+    while not conn.poll():
+        readable = loop.create_future()
+        loop.add_reader(conn.fileno(), lambda: readable.done() or readable.set_result(None))
+        try:
+            await readable
+        finally:
+            loop.remove_reader(conn.fileno())
+    return conn.recv()
+
+
+async def _work(client: "Client", conn: Connection, index: int) -> None:
+    await client._start()
+    log.info("Worker %d started", index)
+    try:
+        conn.send(READY)
+        while True:
+            try:
+                update = await _receive(conn)
+            except EOFError:
+                break
+            if update is None:
+                break
+            # ask for the next update while this one is dispatched
+            conn.send(READY)
+            try:
+                await client.process_update(update)
+            except Exception as e:
+                log.exception("Worker %d failed processing update %s: %s", index, update.get("update_id"), e)
+    finally:
+        await client.stop()
+        log.info("Worker %d stopped", index)
+
+
+class ShardedRunner:
+    """Polls updates and dispatches them on worker processes sharded by chat.
+
+    The factory is called once in the polling process, whose client is only
+    used to poll and keeps the polling offset, and once in every worker. It
+    must build the client with its handlers, and must be picklable (a module
+    level function) when the ``spawn`` start method is used.
+
+    Every worker has a queue in the polling process and asks for its next
+    update through its own pipe once it read the previous one, so at most
+    one update is in a pipe at a time. A worker that dies is started again
+    with a new pipe; its chats stay on the same shard and its queue is kept,
+    while the updates it had read and was still handling are lost. Polling
+    waits when the queue of a worker holds ``max_queued`` updates.
+
+    The polling offset is committed when an update is queued, not when a
+    worker handled it, so if the polling process dies the updates still
+    queued (up to ``workers * max_queued``) and those being handled are
+    not delivered again.
+
+    Args:
+        factory (Callable): Returns a configured Client.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        drain_timeout (float, optional): Seconds workers get to finish on stop before being terminated. Defaults to 10.
+        mp_context (str, optional): multiprocessing start method, like "spawn". Defaults to the platform default.
+        max_queued (int, optional): Updates queued per worker before polling waits. Defaults to 1000.
+    """
+
+    def __init__(self, factory: Callable[[], "Client"], workers: Optional[int] = None, drain_timeout: float = 10,
+                 mp_context: Optional[str] = None, max_queued: int = 1000):
+        self.factory = factory
+        self.workers = workers or multiprocessing.cpu_count()
+        self.drain_timeout = drain_timeout
+        self.max_queued = max_queued
+        self._context = multiprocessing.get_context(mp_context)
+        self._conns: List[Optional[Connection]] = [None] * self.workers
+        self._processes: List[Any] = [None] * self.workers
+        self._queues: List[Deque[Dict[str, Any]]] = [deque() for _ in range(self.workers)]
+        self._credits = [0] * self.workers
+        self._room: List[Optional[asyncio.Event]] = [None] * self.workers
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client: Optional["Client"] = None
+        self.running = False
+        self.dispatched = [0] * self.workers
+        self.restarts = [0] * self.workers
+
+    def _spawn(self, index: int) -> None:
+        conn, child = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(self.factory, child, index),
+                                        name=f"pyrobale-worker-{index}", daemon=True)
+        process.start()
+        # the pipe reports the end of the worker once no other process holds its end
+        child.close()
+        self._conns[index] = conn
+        self._processes[index] = process
+        self._credits[index] = 0
+        if self._loop is not None:
+            self._loop.add_reader(conn.fileno(), self._on_readable, index)
+
+    def start_workers(self) -> None:
+        """Starts the worker processes."""
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def _restart(self, index: int) -> None:
+        conn, process = self._conns[index], self._processes[index]
+        if self._loop is not None:
+            self._loop.remove_reader(conn.fileno())
+        conn.close()
+        process.join(1)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+        log.warning("Worker %d exited with code %s, restarting it with %d queued updates", index,
+                    process.exitcode, len(self._queues[index]))
+        self.restarts[index] += 1
+        self._spawn(index)
+
+    def _revive(self) -> None:
+        for index, process in enumerate(self._processes):
+            if not process.is_alive():
+                self._restart(index)
+
+    def _on_readable(self, index: int) -> None:
+        conn = self._conns[index]
+        try:
+            while conn.poll():
+                conn.recv()
+                self._credits[index] += 1
+        except (EOFError, OSError):
+            self._restart(index)
+            return
+        self._pump(index)
+
+    def _pump(self, index: int) -> None:
+        queue = self._queues[index]
+        while self._credits[index] and queue:
+            try:
+                self._conns[index].send(queue[0])
+            except OSError:
+                # the worker died, it is restarted when its pipe reports it
+                break
+            queue.popleft()
+            self._credits[index] -= 1
+            self.dispatched[index] += 1
+        room = self._room[index]
+        if room is not None and len(queue) < self.max_queued:
+            room.set()
+
+    async def _dispatch(self, update: Dict[str, Any]) -> None:
+        index = shard_of(update, self.workers)
+        queue = self._queues[index]
+        while len(queue) >= self.max_queued:
+            room = self._room[index] = self._room[index] or asyncio.Event()
+            room.clear()
+            await room.wait()
+        queue.append(update)
+        self._pump(index)
+
+    async def poll(self, timeout: int = 30, limit: int = 100) -> None:
+        """Polls updates and queues them to the workers until :meth:`stop` is called.
+
+        Args:
+            timeout (int, optional): Time to wait for updates. Defaults to 30.
+            limit (int, optional): Number of updates to poll. Defaults to 100.
+        """
+        client = self.client = self.factory()
+        await client._ensure_me()
+        await client.offsets.open()
+        self._loop = asyncio.get_running_loop()
+        for index, conn in enumerate(self._conns):
+            self._loop.add_reader(conn.fileno(), self._on_readable, index)
+        self.running = True
+        try:
+            while self.running:
+                self._revive()
+                try:
+                    updates = await client.get_updates(offset=client.last_update_id + 1, limit=limit, timeout=timeout)
+                except Exception as e:
+                    log.exception("Error in polling: %s", e)
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    update_id = update.get("update_id")
+                    if update_id is not None and not client.offsets.begin(update_id):
+                        continue
+                    await self._dispatch(update)
+                    if update_id is not None:
+                        client.offsets.commit(update_id)
+        finally:
+            for conn in self._conns:
+                self._loop.remove_reader(conn.fileno())
+            self._loop = None
+            self._room = [None] * self.workers
+            await client.offsets.close()
+            await client.close_session()
+
+    def stop(self) -> None:
+        """Stops polling after the current request."""
+        self.running = False
+
+    def _drain(self, index: int, deadline: float) -> None:
+        conn, queue = self._conns[index], self._queues[index]
+        try:
+            while True:
+                while not self._credits[index]:
+                    if not conn.poll(max(deadline - time.monotonic(), 0)):
+                        raise TimeoutError
+                    conn.recv()
+                    self._credits[index] += 1
+                if not queue:
+                    conn.send(None)
+                    return
+                conn.send(queue.popleft())
+                self._credits[index] -= 1
+                self.dispatched[index] += 1
+        except (EOFError, OSError):
+            log.warning("Worker %d stopped before taking its %d queued updates", index, len(queue))
+
+    def stop_workers(self) -> None:
+        """Lets the workers dispatch their queued updates, then stops them."""
+        deadline = time.monotonic() + self.drain_timeout
+        for index in range(self.workers):
+            self._drain(index, deadline)
+        for index, process in enumerate(self._processes):
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                log.warning("Worker %d did not stop in time, terminating it", index)
+                process.terminate()
+                process.join()
+            self._conns[index].close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "alive": sum(process is not None and process.is_alive() for process in self._processes),
+            "queued": [len(queue) for queue in self._queues],
+            "dispatched": list(self.dispatched),
+            "restarts": list(self.restarts),
+        }
+
+    def run(self, timeout: int = 30, limit: int = 100) -> None:
+        """Starts the workers and polls until interrupted.
+
+        Args:
+            timeout (int, optional): Time to wait for updates. Defaults to 30.
+            limit (int, optional): Number of updates to poll. Defaults to 100.
+        """
+        self.start_workers()
+        try:
+            asyncio.run(self.poll(timeout, limit))
+        except KeyboardInterrupt:
+            log.info("Bot stopped by user")
+        finally:
+            self.stop_workers()
+
+
+def run_sharded(factory: Callable[[], "Client"], workers: Optional[int] = None, timeout: int = 30,
+                limit: int = 100, **kwargs) -> None:
+    """Runs a bot on worker processes sharded by chat, see :class:`ShardedRunner`.
+
+    Args:
+        factory (Callable): Returns a configured Client.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        timeout (int, optional): Time to wait for updates. Defaults to 30.
+        limit (int, optional): Number of updates to poll. Defaults to 100.
+        **kwargs: Other options of :class:`ShardedRunner`.
+    """
+    ShardedRunner(factory, workers, **kwargs).run(timeout, limit)
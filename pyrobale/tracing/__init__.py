@@ -0,0 +1,202 @@
+"""Tracing hooks for following an update through the client.
+
+A :class:`Tracer` creates :class:`Span` objects around receiving updates,
+dispatching them, evaluating filters, running handlers and calling the Bot
+API. The current span is kept in a context variable, so API calls made by a
+handler (for example ``message.reply``) become children of the span of the
+update that triggered it. The default :class:`NoOpTracer` records nothing.
+"""
+
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import itertools
+import os
+import threading
+import time
+
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("pyrobale_current_span", default=None)
+_ids = itertools.count(1)
+_ids_lock = threading.Lock()
+
+
+def _next_id() -> int:
+    with _ids_lock:
+        return next(_ids)
+
+
+def current_span() -> Optional["Span"]:
+    """Returns the span active in the current context, if any."""
+    return _current_span.get()
+
+
+class Span:
+    """A timed operation.
+
+    Attributes:
+        name (str): Name of the operation.
+        trace_id (str): Id shared by all spans of one update.
+        span_id (int): Unique id of the span.
+        parent_id (int): Id of the parent span, None for root spans.
+        attributes (dict): Attributes of the span (update_id, chat_id, handler, method, status, ...).
+        start_time (float): Start time, from ``time.perf_counter``.
+        end_time (float): End time, None while the span is running.
+        error (BaseException): The exception that ended the span, if any.
+    """
+
+    inherited_attributes = ("update_id", "chat_id", "handler")
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else f"{os.getpid():x}-{_next_id():x}"
+        self.span_id = _next_id()
+        self.attributes: Dict[str, Any] = {}
+        if parent:
+            for key in self.inherited_attributes:
+                if key in parent.attributes:
+                    self.attributes[key] = parent.attributes[key]
+        if attributes:
+            self.attributes.update(attributes)
+        self.start_time = time.perf_counter()
+        self.end_time: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self._token = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Duration of the span in seconds, None while running."""
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        self.error = error
+
+    def end(self) -> None:
+        if self.end_time is not None:
+            return
+        self.end_time = time.perf_counter()
+        self.tracer.exporter.export(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if exc_val is not None:
+            self.record_exception(exc_val)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.end()
+        return False
+
+    def __repr__(self) -> str:
+        return f"<Span {self.name} trace={self.trace_id} id={self.span_id} parent={self.parent_id} {self.attributes}>"
+
+
+class _NoOpSpan:
+    """A span that records nothing, shared by all no-op calls."""
+
+    name = ""
+    attributes: Dict[str, Any] = {}
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> "_NoOpSpan":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoOpSpan()
+
+
+class SpanExporter:
+    """Receives finished spans. Subclasses send them to a tracing backend."""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps finished spans in a list, mainly for tests.
+
+    Args:
+        max_spans (int, optional): Maximum number of spans to keep. Defaults to None (unbounded).
+    """
+
+    def __init__(self, max_spans: Optional[int] = None):
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+            if self.max_spans is not None and len(self.spans) > self.max_spans:
+                del self.spans[0]
+
+    def get_spans(self, name: Optional[str] = None, trace_id: Optional[str] = None) -> List[Span]:
+        """Returns the finished spans, optionally filtered by name or trace id."""
+        with self._lock:
+            spans = list(self.spans)
+        if name is not None:
+            spans = [span for span in spans if span.name == name]
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return spans
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+
+class Tracer:
+    """Creates spans and hands finished ones to an exporter.
+
+    Args:
+        exporter (SpanExporter): Exporter receiving finished spans.
+    """
+
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        """Starts a span as a child of the current span.
+
+        Use the returned span as a context manager to make it current and
+        end it automatically.
+
+        Args:
+            name (str): Name of the operation.
+            **attributes: Attributes of the span.
+
+        Returns:
+            Span: The started span.
+        """
+        return Span(self, name, _current_span.get(), attributes)
+
+
+class NoOpTracer(Tracer):
+    """The default tracer, records nothing."""
+
+    def __init__(self):
+        self.exporter = None
+
+    def start_span(self, name: str, **attributes: Any) -> _NoOpSpan:
+        return _NOOP_SPAN
@@ -0,0 +1,81 @@
+"""A local stand-in for the Bale bot API used by the tests."""
+
+from typing import Any, Callable, Dict, List, Tuple
+import asyncio
+import socket
+
+from aiohttp import web
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def message_update(update_id: int = 1, chat_id: int = 2, user_id: int = 2, text: str = "hi",
+                   chat_type: str = "private") -> Dict[str, Any]:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": 10,
+            "date": 1,
+            "chat": {"id": chat_id, "type": chat_type},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+            "text": text,
+        },
+    }
+
+
+class FakeBale:
+    """Answers every method like Bale, override a method with ``handlers[method] = fn(data) -> dict``."""
+
+    def __init__(self, delay: float = 0):
+        self.port = free_port()
+        self.delay = delay
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+        self.updates: List[Dict[str, Any]] = []
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def sent(self, method: str = "sendMessage") -> List[Dict[str, Any]]:
+        return [data for name, data in self.calls if name == method]
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].split("?", 1)[0]
+        try:
+            data = await request.json()
+        except Exception:
+            data = dict(request.query)
+        self.calls.append((method, data))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if method in self.handlers:
+            return web.json_response(self.handlers[method](data))
+        if method.lower() == "getme":
+            return web.json_response({"ok": True, "result": {"id": 99, "is_bot": True, "first_name": "Bot",
+                                                             "username": "testbot"}})
+        if method == "getUpdates":
+            offset = int(data.get("offset") or 0)
+            return web.json_response({"ok": True, "result": [u for u in self.updates if u["update_id"] >= offset]})
+        if method in ("deleteMessage", "banChatMember", "restrictChatMember"):
+            return web.json_response({"ok": True, "result": True})
+        return web.json_response({"ok": True, "result": {
+            "message_id": len(self.calls), "date": 1,
+            "chat": {"id": data.get("chat_id") or 1, "type": "private"}, "text": data.get("text"),
+        }})
+
+    async def __aenter__(self) -> "FakeBale":
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._runner.cleanup()
@@ -0,0 +1,40 @@
+import asyncio
+import itertools
+
+from pyrobale.client import Client
+from pyrobale.objects.enums import MatchType
+
+from fakebale import FakeBale, message_update
+
+
+def test_replies_and_body_cache():
+    counter = itertools.count()
+
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url)
+            client.add_auto_reply("hi", "hello")
+            client.add_auto_reply("count", lambda message: f"count {next(counter)}", MatchType.PREFIX)
+            for text in ("hi", "hi", "count", "count me", "HI"):
+                await client.auto_replies.dispatch(message_update(text=text))
+            await client.close_session()
+            return [data["text"] for data in bale.sent()], dict(client.auto_replies._bodies)
+
+    sent, bodies = asyncio.run(scenario())
+    assert sent == ["hello", "hello", "count 0", "count 1"]
+    # texts made by callbacks are not kept
+    assert list(bodies) == ["hello"]
+
+
+def test_removing_a_reply_drops_its_body():
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url)
+            client.add_auto_reply("hi", "hello")
+            await client.auto_replies.dispatch(message_update(text="hi"))
+            assert client.auto_replies.remove("hi")
+            assert not await client.auto_replies.dispatch(message_update(text="hi"))
+            await client.close_session()
+            return client.auto_replies._bodies
+
+    assert asyncio.run(scenario()) == {}
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from pyrobale.broadcast import Broadcast, storage_name
+from pyrobale.client import Client
+from pyrobale.exceptions import ForbiddenException
+from pyrobale.objects.enums import BroadcastOutcome
+from pyrobale.ratelimit import RateLimiter
+from pyrobale.StateMachine import MemoryStorage, SQLiteStorage
+
+
+def run_broadcast(chat_ids, send, **kwargs):
+    kwargs.setdefault("rate_limiter", RateLimiter(10000))
+    job = Broadcast(Client("T"), chat_ids, send, progress_interval=0, **kwargs)
+    return job, asyncio.wait_for(job.run(), 5)
+
+
+def test_storage_name_is_a_valid_table_name():
+    assert storage_name("news") == "broadcast_news"
+    assert storage_name("news-1").isidentifier()
+    assert storage_name("news-1") != storage_name("news_1")
+
+
+def test_job_id_with_dashes_on_sqlite(tmp_path):
+    sent = []
+
+    async def send(client, chat_id):
+        sent.append(chat_id)
+
+    job, run = run_broadcast(range(5), send, job_id="news-1", storage=SQLiteStorage(str(tmp_path / "b.db")))
+    report = asyncio.run(run)
+    assert report.finished and report.sent == 5
+    assert sorted(sent) == list(range(5))
+
+
+def test_resume_skips_handled_chats(tmp_path):
+    path = str(tmp_path / "b.db")
+    sent = []
+
+    async def send(client, chat_id):
+        if chat_id == 3:
+            raise ForbiddenException("Forbidden: bot was blocked by the user")
+        sent.append(chat_id)
+
+    job, run = run_broadcast(range(10), send, job_id="resume", storage=SQLiteStorage(path))
+    job.stop()
+    first = asyncio.run(run)
+    assert not first.finished and first.processed == 0
+
+    _, run = run_broadcast(range(6), send, job_id="resume", storage=SQLiteStorage(path))
+    assert asyncio.run(run).processed == 6
+
+    job, run = run_broadcast(range(10), send, job_id="resume", storage=SQLiteStorage(path))
+    report = asyncio.run(run)
+    assert report.skipped == 6 and report.processed == 4
+    assert sorted(sent) == [0, 1, 2, 4, 5, 6, 7, 8, 9]
+    assert job.outcomes()[3] == BroadcastOutcome.BLOCKED
+
+
+def test_unexpected_send_errors_fail_the_chat_not_the_job():
+    async def send(client, chat_id):
+        if chat_id % 2:
+            raise TypeError("bad payload")
+
+    _, run = run_broadcast(range(50), send, concurrency=2)
+    report = asyncio.run(run)
+    assert report.finished
+    assert report.outcomes[BroadcastOutcome.SENT] == 25
+    assert report.outcomes[BroadcastOutcome.FAILED] == 25
+
+
+class BrokenStorage(MemoryStorage):
+    def namespace(self, name):
+        return BrokenStorage()
+
+    def set_nowait(self, key, value):
+        raise OSError("disk full")
+
+
+def test_storage_errors_are_raised_by_run():
+    async def send(client, chat_id):
+        pass
+
+    _, run = run_broadcast(range(100), send, concurrency=2, storage=BrokenStorage())
+    with pytest.raises(OSError):
+        asyncio.run(run)
@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+import pytest
+
+from pyrobale.cache import MembershipCache, SingleFlight, TTLCache
+from pyrobale.client import Client
+from pyrobale.exceptions import NotFoundException
+
+from fakebale import FakeBale
+
+
+def counting_loader(calls, value):
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return value
+    return load
+
+
+def test_negative_members_expire_sooner():
+    async def scenario():
+        cache = MembershipCache(ttl=60, negative_ttl=0.05)
+        calls = []
+        for _ in range(3):
+            await cache.get_member(1, 5, counting_loader(calls, {"status": "left"}))
+            await cache.get_member(1, 6, counting_loader(calls, {"status": "member"}))
+        assert len(calls) == 2
+        await asyncio.sleep(0.06)
+        await cache.get_member(1, 5, counting_loader(calls, {"status": "member"}))
+        await cache.get_member(1, 6, counting_loader(calls, {"status": "left"}))
+        return len(calls)
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_refused_lookups_are_cached_and_raised_again():
+    async def scenario():
+        cache = MembershipCache(negative_ttl=60)
+        calls = []
+
+        async def refuse():
+            calls.append(1)
+            raise NotFoundException("chat not found")
+
+        for _ in range(3):
+            with pytest.raises(NotFoundException):
+                await cache.get_admins("@missing", refuse)
+        return len(calls)
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_concurrent_loads_are_coalesced():
+    async def scenario():
+        cache = TTLCache()
+        calls = []
+        results = await asyncio.gather(*(cache.get_or_load("k", counting_loader(calls, 1)) for _ in range(5)))
+        return results, len(calls), cache.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == [1] * 5
+    assert calls == 1
+    assert stats["coalesced"] == 4
+
+
+def test_a_load_invalidated_in_flight_is_not_cached():
+    async def scenario():
+        cache = TTLCache()
+        calls = []
+        load = asyncio.ensure_future(cache.get_or_load("k", counting_loader(calls, "stale")))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        assert await load == "stale"
+        return await cache.get_or_load("k", counting_loader(calls, "fresh"))
+
+    assert asyncio.run(scenario()) == "fresh"
+
+
+def test_join_and_leave_updates_invalidate_members():
+    async def scenario():
+        cache = MembershipCache()
+        calls = []
+        await cache.get_member(-100, 5, counting_loader(calls, {"status": "left"}))
+        await cache.get_admins(-100, counting_loader(calls, []))
+        cache.observe_update({"update_id": 1, "message": {
+            "message_id": 1, "chat": {"id": -100, "type": "group"}, "new_chat_members": [{"id": 5}]}})
+        member = await cache.get_member("-100", 5, counting_loader(calls, {"status": "member"}))
+        await cache.get_admins(-100, counting_loader(calls, []))
+        return member, len(calls)
+
+    assert asyncio.run(scenario()) == ({"status": "member"}, 4)
+
+
+def test_lru_bound():
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_identical_calls_in_flight_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def get_chat():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"id": 1, "tags": ["a"]}
+
+        results = await asyncio.gather(*(flight.do("getChat", ("getChat", 1), get_chat) for _ in range(4)))
+        # every caller can change its result without the others seeing it
+        results[0]["tags"].append("b")
+        later = await flight.do("getChat", ("getChat", 1), get_chat)
+        return results, len(calls), flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert calls == 2
+    assert [result["tags"] for result in results] == [["a", "b"], ["a"], ["a"], ["a"]]
+    assert len({id(result) for result in results}) == 4
+    assert stats == {"calls": {"getChat": 2}, "coalesced": {"getChat": 3}}
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("getMe", "me", slow))
+        second = asyncio.ensure_future(flight.do("getMe", "me", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_client_coalesces_get_chat():
+    async def scenario():
+        async with FakeBale(delay=0.05) as bale:
+            bale.handlers["getChat"] = lambda data: {"ok": True, "result": {"id": 1, "type": "private"}}
+            client = Client("T", base_url=bale.base_url)
+            await asyncio.gather(*(client.get_chat(1) for _ in range(5)))
+            await client.close_session()
+            return len([name for name, _ in bale.calls if name == "getChat"])
+
+    assert asyncio.run(scenario()) == 1
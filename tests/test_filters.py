@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+from pyrobale.client import Client
+from pyrobale.filters import (AccessList, deny_users, equals, from_users, is_joined, startswith, update_memo,
+                              update_scope)
+from pyrobale.objects.enums import UpdatesTypes
+
+from fakebale import FakeBale, message_update
+
+
+def member_of(*chats):
+    def answer(data):
+        status = "member" if int(data["chat_id"]) in chats else "left"
+        return {"ok": True, "result": {"status": status, "user": {"id": data["user_id"], "is_bot": False,
+                                                                  "first_name": "u"}}}
+    return answer
+
+
+def check_joined(chat_ids, joined_chats):
+    async def scenario():
+        async with FakeBale() as bale:
+            bale.handlers["getChatMember"] = member_of(*joined_chats)
+            client = Client("T", base_url=bale.base_url)
+            event = client._convert_event(UpdatesTypes.MESSAGE, message_update()["message"])
+            result = await is_joined(chat_ids, report_missing=True).evaluate(event, client)
+            await client.close_session()
+            return result, getattr(event, "missing_chats", None)
+
+    return asyncio.run(scenario())
+
+
+def test_is_joined_accepts_sets_and_generators():
+    assert check_joined({10, 20}, (10, 20))[0]
+    assert check_joined((chat for chat in (10, 20)), (10, 20))[0]
+
+
+def test_is_joined_reports_missing_chats_in_order():
+    joined, missing = check_joined([30, 10, 20], (10,))
+    assert not joined
+    assert missing == [30, 20]
+
+
+def test_equals_matches_any_candidate_of_any_text():
+    only_menu = equals(["/menu", "Menu"])
+    assert only_menu.check_nowait(SimpleNamespace(text="Menu"))
+    assert only_menu.check_nowait(SimpleNamespace(text=None, caption="/menu"))
+    assert only_menu.check_nowait(SimpleNamespace(data="/menu"))
+    assert not only_menu.check_nowait(SimpleNamespace(text="/menu please"))
+    assert equals("hi").check_nowait(SimpleNamespace(text="hi"))
+
+
+def test_startswith_filters_share_one_walk_per_update():
+    buy = startswith(["/buy", "buy "])
+    bu = startswith("bu")
+    help_ = startswith("/help")
+    event = SimpleNamespace(text="buy milk")
+    with update_scope():
+        results = [f.check_nowait(event) for f in (buy, bu, help_)]
+        memo = update_memo()
+        assert [key for key in memo if key[0] == "prefixes"] == [("prefixes", "buy milk")]
+    assert results == [True, True, False]
+    assert buy.check_nowait(SimpleNamespace(text="/buy"))
+    assert not buy.check_nowait(SimpleNamespace(text="/bu"))
+    assert startswith("").check_nowait(SimpleNamespace(text="anything"))
+
+
+def user_event(user_id):
+    return SimpleNamespace(user=SimpleNamespace(id=user_id), chat=SimpleNamespace(id=-1))
+
+
+def test_filters_follow_access_list_reloads(tmp_path):
+    path = tmp_path / "admins.txt"
+    path.write_text("1  # owner\n2\n")
+    admins = AccessList(source=str(path))
+    allowed, denied = from_users(admins), deny_users(admins)
+    assert admins.reload() == 2
+    assert allowed.check_nowait(user_event(1)) and not denied.check_nowait(user_event(1))
+
+    path.write_text("3\n")
+    admins.reload()
+    assert not allowed.check_nowait(user_event(1))
+    assert allowed.check_nowait(user_event(3))
+    assert denied.check_nowait(user_event(1))
+
+
+def test_auto_reload_keeps_the_list_when_the_source_fails():
+    async def scenario():
+        answers = [[1, "2"], RuntimeError("down"), [5]]
+
+        async def source():
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        admins = AccessList([9], source=source)
+        seen = [set(admins)]
+        admins.auto_reload(0.01)
+        for _ in range(200):
+            if seen[-1] == {5}:
+                break
+            await asyncio.sleep(0.005)
+            if set(admins) != seen[-1]:
+                seen.append(set(admins))
+        admins.stop()
+        return seen
+
+    # the failed reload in between changed nothing
+    assert asyncio.run(scenario()) == [{9}, {1, 2}, {5}]
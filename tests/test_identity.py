@@ -0,0 +1,27 @@
+import pytest
+
+from pyrobale.client import Client
+from pyrobale.objects.enums import UpdatesTypes
+from pyrobale.objects.user import User
+
+from fakebale import message_update
+
+
+@pytest.fixture
+def client():
+    client = Client("T")
+    client.me = User(id=99, is_bot=True, first_name="Bot", username="mybot", client=client)
+    return client
+
+
+@pytest.mark.parametrize("text, mentioned", [
+    ("hi @mybot", True),
+    ("@MyBot, help", True),
+    ("@mybot", True),
+    ("ask @mybot_other", False),
+    ("ask @mybotx", False),
+    ("no mention", False),
+])
+def test_mentions_me(client, text, mentioned):
+    message = client._convert_event(UpdatesTypes.MESSAGE, message_update(text=text)["message"])
+    assert client.mentions_me(message) is mentioned
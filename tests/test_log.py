@@ -0,0 +1,38 @@
+import logging
+
+from pyrobale.log import RateLimitFilter, SuppressedFormatter
+
+
+def record(handler, msg="Error in handler %s: %s", level=logging.ERROR):
+    return logging.LogRecord("pyrobale.dispatcher", level, __file__, 1, msg, (handler, "boom"), None)
+
+
+def test_records_past_the_burst_are_sampled():
+    limit = RateLimitFilter(burst=2, interval=60, sample_rate=3)
+    passed = [limit.filter(record("a")) for _ in range(8)]
+    assert passed == [True, True, False, False, True, False, False, True]
+
+
+def test_handlers_are_limited_separately():
+    limit = RateLimitFilter(burst=2, interval=60, sample_rate=100)
+    for _ in range(10):
+        limit.filter(record("noisy"))
+    assert limit.filter(record("quiet"))
+    assert not limit.filter(record("noisy"))
+
+
+def test_infos_are_never_limited():
+    limit = RateLimitFilter(burst=1)
+    assert all(limit.filter(record("a", level=logging.INFO)) for _ in range(5))
+
+
+def test_the_suppressed_count_is_formatted_not_written_in_the_message():
+    limit = RateLimitFilter(burst=1, interval=60, sample_rate=3)
+    records = [record("a") for _ in range(5)]
+    emitted = [r for r in records if limit.filter(r)]
+    last = emitted[-1]
+    assert last.msg == "Error in handler %s: %s"
+    assert last.suppressed == 2
+    formatter = SuppressedFormatter("%(message)s")
+    assert formatter.format(last) == "Error in handler a: boom (2 similar messages suppressed)"
+    assert formatter.format(emitted[0]) == "Error in handler a: boom"
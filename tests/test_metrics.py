@@ -0,0 +1,39 @@
+import asyncio
+
+from pyrobale.client import Client
+from pyrobale.metrics import MetricsRegistry, api_method
+
+from fakebale import FakeBale, message_update
+
+
+def test_api_method_drops_the_query_string():
+    assert api_method("https://tapi.bale.ai/botT/sendSticker?chat_id=1&sticker=abc") == "sendSticker"
+    assert api_method("https://tapi.bale.ai/botT/getMe") == "getMe"
+
+
+def test_get_calls_are_labelled_by_method():
+    async def scenario():
+        async with FakeBale() as bale:
+            registry = MetricsRegistry()
+            client = Client("T", base_url=bale.base_url, metrics=registry)
+            for chat_id in range(3):
+                await client.make_get(f"{client.requests_base}/sendSticker?chat_id={chat_id}&sticker=s{chat_id}")
+            await client.close_session()
+            return client.metrics.api_requests
+
+    counter = asyncio.run(scenario())
+    assert counter.get(method="sendSticker", status=200) == 3
+    assert "chat_id" not in counter.render()
+
+
+def test_duplicate_updates_are_not_counted():
+    async def scenario():
+        async with FakeBale() as bale:
+            registry = MetricsRegistry()
+            client = Client("T", base_url=bale.base_url, metrics=registry)
+            for update_id in (1, 2, 1, 2):
+                await client.process_update(message_update(update_id=update_id))
+            await client.stop()
+            return client.metrics.updates_processed
+
+    assert asyncio.run(scenario()).get(type="message") == 2
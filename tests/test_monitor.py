@@ -0,0 +1,57 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyrobale.monitor import LoopMonitor, executor_stats
+
+
+def run_monitored(monitor, scenario):
+    async def main():
+        monitor.start()
+        try:
+            await scenario()
+        finally:
+            await monitor.stop()
+
+    asyncio.run(main())
+
+
+def test_a_blocking_callback_is_sampled_once():
+    def block_the_loop():
+        time.sleep(0.4)
+
+    async def scenario():
+        await asyncio.sleep(0.1)
+        block_the_loop()
+        await asyncio.sleep(0.1)
+
+    monitor = LoopMonitor(interval=0.05, block_threshold=0.1)
+    run_monitored(monitor, scenario)
+
+    assert monitor.blocked_count == 1
+    assert any("block_the_loop" in line for line in monitor.samples[0].stack)
+    assert monitor.samples[0].blocked_for >= 0.1
+    assert monitor.max_lag >= 0.3
+
+
+def test_an_idle_loop_is_not_blocked():
+    monitor = LoopMonitor(interval=0.05, block_threshold=0.1)
+    run_monitored(monitor, lambda: asyncio.sleep(0.3))
+
+    assert monitor.blocked_count == 0
+    assert monitor.max_lag < 0.1
+    assert not monitor.running
+
+
+def test_executor_saturation():
+    executor = ThreadPoolExecutor(2)
+    try:
+        futures = [executor.submit(time.sleep, 0.2) for _ in range(5)]
+        stats = executor_stats(executor)
+        assert stats["max_workers"] == 2
+        assert stats["active_threads"] == 2
+        assert stats["queue_size"] == 3
+        for future in futures:
+            future.result()
+    finally:
+        executor.shutdown()
@@ -0,0 +1,114 @@
+import asyncio
+
+from pyrobale.client import Client
+from pyrobale.client.offsets import UpdateOffsets
+from pyrobale.StateMachine import SQLiteStorage
+
+from fakebale import FakeBale, message_update
+
+
+def test_offset_and_recent_ids_survive_a_restart(tmp_path):
+    path = str(tmp_path / "offsets.db")
+
+    async def first_run():
+        offsets = UpdateOffsets(SQLiteStorage(path))
+        await offsets.open()
+        for update_id in (5, 6, 8):
+            assert offsets.begin(update_id)
+            offsets.commit(update_id)
+        await offsets.close()
+
+    async def second_run():
+        offsets = UpdateOffsets(SQLiteStorage(path))
+        await offsets.open()
+        result = offsets.offset, offsets.begin(6), offsets.begin(7), offsets.stats()["duplicates"]
+        await offsets.close()
+        return result
+
+    asyncio.run(first_run())
+    assert asyncio.run(second_run()) == (8, False, True, 1)
+
+
+def test_window_bounds_the_remembered_ids():
+    offsets = UpdateOffsets(window=3)
+    for update_id in range(1, 6):
+        assert offsets.begin(update_id)
+        offsets.commit(update_id)
+    assert not offsets.begin(5)
+    assert offsets.begin(1)
+
+
+def test_aborted_updates_can_be_delivered_again():
+    offsets = UpdateOffsets()
+    assert offsets.begin(1)
+    assert not offsets.begin(1)
+    offsets.abort(1)
+    assert offsets.begin(1)
+
+
+def test_duplicate_updates_are_dispatched_once(tmp_path):
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url, offset_storage=SQLiteStorage(str(tmp_path / "o.db")))
+            seen = []
+
+            @client.on_message()
+            async def handler(message):
+                seen.append(message.text)
+
+            await client._start()
+            for update_id, text in ((1, "a"), (2, "b"), (1, "a again"), (2, "b again"), (3, "c")):
+                await client.process_update(message_update(update_id=update_id, text=text))
+            await client.stop()
+            return seen, client.last_update_id
+
+    seen, last = asyncio.run(scenario())
+    assert seen == ["a", "b", "c"]
+    assert last == 3
+
+
+def test_polling_resumes_after_the_last_dispatched_update(tmp_path):
+    path = str(tmp_path / "o.db")
+
+    async def poll(updates):
+        async with FakeBale() as bale:
+            bale.updates = updates
+            client = Client("T", base_url=bale.base_url, offset_storage=SQLiteStorage(path))
+            seen = []
+
+            @client.on_message()
+            async def handler(message):
+                seen.append(message.text)
+                if len(seen) == len(updates) or message.text == "last":
+                    client.running = False
+
+            task = asyncio.ensure_future(client.start_polling(timeout=0))
+            await asyncio.wait_for(task, 5)
+            await client.stop()
+            offsets = [data.get("offset") for method, data in bale.calls if method == "getUpdates"]
+            return seen, offsets
+
+    first, _ = asyncio.run(poll([message_update(1, text="one"), message_update(2, text="two")]))
+    assert first == ["one", "two"]
+    second, offsets = asyncio.run(poll([message_update(2, text="two"), message_update(3, text="last")]))
+    assert second == ["last"]
+    assert int(offsets[0]) == 3
+
+
+def test_recent_ids_are_serialized_once_per_flush(tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(str(tmp_path / "offsets.db"), flush_interval=60)
+        offsets = UpdateOffsets(storage)
+        await offsets.open()
+        for update_id in range(1, 101):
+            offsets.begin(update_id)
+            offsets.commit(update_id)
+        queued = set(offsets.storage._pending)
+        await offsets.storage.flush()
+        stored = await offsets.storage.get("recent")
+        await offsets.close()
+        return queued, stored
+
+    queued, stored = asyncio.run(scenario())
+    assert queued == {"offset"}
+    assert stored == ",".join(map(str, range(1, 101)))
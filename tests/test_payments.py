@@ -0,0 +1,96 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from pyrobale.client.payments import TransactionWatcher
+from pyrobale.objects.enums import TransactionStatus
+
+
+class FakeClient:
+    """Answers inquiries from a list of statuses per transaction, the last one repeating."""
+
+    def __init__(self, statuses, delay=0):
+        self.statuses = statuses
+        self.delay = delay
+        self.inquiries = {}
+        self.in_flight = self.max_in_flight = 0
+        self.payments = []
+
+    async def inquire_transaction(self, transaction_id):
+        times = self.inquiries.setdefault(transaction_id, [])
+        times.append(time.monotonic())
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        statuses = self.statuses[transaction_id]
+        status = statuses[min(len(times), len(statuses)) - 1]
+        return SimpleNamespace(status=status, provider_payment_charge_id=None)
+
+    async def _dispatch_payment(self, payment):
+        self.payments.append(payment)
+
+
+def query(transaction_id):
+    return SimpleNamespace(id=transaction_id, currency="IRR", total_amount=1000, invoice_payload="order")
+
+
+PENDING, PAID, FAILED = TransactionStatus.PENDING, TransactionStatus.PAID, TransactionStatus.FAILED
+
+
+def test_paid_transactions_dispatch_the_payment():
+    async def scenario():
+        client = FakeClient({"t1": [PENDING, PAID], "t2": [FAILED]})
+        watcher = TransactionWatcher(client, interval=0.01)
+        results = await asyncio.gather(watcher.watch(query("t1")), watcher.watch(query("t2")))
+        return client, watcher, results
+
+    client, watcher, (paid, failed) = asyncio.run(scenario())
+    assert (paid.status, failed.status) == (PAID, FAILED)
+    assert [payment.telegram_payment_charge_id for payment in client.payments] == ["t1"]
+    assert watcher.stats() == {"pending": 0, "paid": 1, "failed": 1, "expired": 0}
+
+
+def test_inquiries_back_off_up_to_max_interval():
+    async def scenario():
+        client = FakeClient({"t": [PENDING] * 5 + [PAID]})
+        watcher = TransactionWatcher(client, interval=0.02, backoff=2, max_interval=0.05)
+        await watcher.watch(query("t"))
+        return client.inquiries["t"]
+
+    times = asyncio.run(scenario())
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert len(times) == 6
+    assert gaps[0] >= 0.035
+    assert all(gap >= 0.045 for gap in gaps[1:])
+    # without the cap the later gaps would be 0.08, 0.16 and 0.32
+    assert max(gaps) < 0.075
+
+
+def test_transactions_are_dropped_at_their_deadline():
+    async def scenario():
+        client = FakeClient({"t": [PENDING]})
+        watcher = TransactionWatcher(client, interval=0.02, backoff=1, deadline=0.1)
+        started = time.monotonic()
+        last = await watcher.watch(query("t"))
+        return last, time.monotonic() - started, client, watcher
+
+    last, waited, client, watcher = asyncio.run(scenario())
+    assert last.status == PENDING
+    assert 0.1 <= waited < 0.3
+    assert client.payments == []
+    assert watcher.stats()["expired"] == 1
+
+
+def test_due_inquiries_are_bounded():
+    async def scenario():
+        client = FakeClient({f"t{i}": [PAID] for i in range(6)}, delay=0.02)
+        watcher = TransactionWatcher(client, interval=0.01, max_concurrent=2)
+        await asyncio.gather(*(watcher.watch(query(f"t{i}")) for i in range(6)))
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.max_in_flight == 2
+    assert len(client.payments) == 6
@@ -0,0 +1,76 @@
+import asyncio
+import os
+
+import pytest
+
+from pyrobale.client import Client
+from pyrobale.client.process import RecordingClient
+from pyrobale.exceptions import PyroBaleException
+from pyrobale.objects.enums import UpdatesTypes
+
+from fakebale import FakeBale, message_update
+
+
+# process handlers are pickled, so they live at module level
+def reply_pid(message):
+    if message.text == "fail":
+        message.reply("before failing")
+        raise ValueError("handler failed")
+    if message.text == "read":
+        message.client.get_chat(message.chat.id)
+    message.reply(f"pid={os.getpid()}")
+
+
+async def send_sticker(message):
+    await message.client.send_sticker(message.chat.id, "sticker-id")
+
+
+def run(handler, updates):
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url, process_workers=2)
+            client.add_handler(UpdatesTypes.MESSAGE, handler, process=True)
+            await client._start()
+            for update in updates:
+                await client.process_update(update)
+            await client.stop()
+            return bale
+
+    return asyncio.run(scenario())
+
+
+def test_replies_of_process_handlers_are_sent_by_the_parent():
+    bale = run(reply_pid, [message_update(update_id=i, text=str(i)) for i in range(1, 5)])
+
+    sent = [data["text"] for data in bale.sent()]
+    assert len(sent) == 4
+    assert all(text.startswith("pid=") for text in sent)
+    assert f"pid={os.getpid()}" not in sent
+    # the parent made every call, workers have no session
+    assert all(method in ("getMe", "sendMessage") for method, _ in bale.calls)
+
+
+def test_failing_and_reading_handlers_send_nothing():
+    bale = run(reply_pid, [message_update(update_id=1, text="fail"), message_update(update_id=2, text="read")])
+
+    assert bale.sent() == []
+
+
+def test_get_calls_of_process_handlers_are_sent():
+    bale = run(send_sticker, [message_update(update_id=1, chat_id=7)])
+
+    assert [(data["chat_id"], data["sticker"]) for data in bale.sent("sendSticker")] == [("7", "sticker-id")]
+
+
+def test_recording_client_refuses_reads():
+    client = RecordingClient("T", "http://127.0.0.1:1/bot")
+    client.send_message(3, "hi")
+    with pytest.raises(PyroBaleException, match="getChat"):
+        client.get_chat(3)
+    assert [(method, data["text"]) for method, data in client.actions] == [("sendMessage", "hi")]
+
+
+def test_get_calls_are_recorded_with_their_query():
+    client = RecordingClient("T", "http://127.0.0.1:1/bot")
+    client.send_sticker(3, "sticker-id")
+    assert client.actions == [("sendSticker", {"chat_id": "3", "sticker": "sticker-id"})]
@@ -0,0 +1,145 @@
+import asyncio
+
+from pyrobale.client.runner import HandlerRunner
+from pyrobale.objects.enums import OverflowPolicy
+
+
+def blocking(started, name, release):
+    async def run():
+        started.append(name)
+        await release.wait()
+    return run
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_global_limit_waits_in_order():
+    async def scenario():
+        runner = HandlerRunner(max_concurrent=2)
+        started, gate = [], asyncio.Event()
+        handler = {}
+        submits = [asyncio.ensure_future(runner.submit(handler, blocking(started, i, gate))) for i in range(5)]
+        await settle()
+        assert started == [0, 1]
+        gate.set()
+        await asyncio.gather(*submits)
+        await runner.drain(1)
+        return started
+
+    assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+
+
+def test_handler_limit_does_not_strand_a_global_slot():
+    async def scenario():
+        runner = HandlerRunner(max_concurrent=2)
+        started = []
+        gates = {name: asyncio.Event() for name in ("b1", "b2", "a2", "a3", "d")}
+        limited, free = {"concurrency": 1}, {}
+        await runner.submit(free, blocking(started, "b1", gates["b1"]))
+        await runner.submit(free, blocking(started, "b2", gates["b2"]))
+        waiting = [
+            asyncio.ensure_future(runner.submit(limited, blocking(started, "a2", gates["a2"]))),
+            asyncio.ensure_future(runner.submit(limited, blocking(started, "a3", gates["a3"]))),
+            asyncio.ensure_future(runner.submit(free, blocking(started, "d", gates["d"]))),
+        ]
+        await settle()
+        gates["b1"].set()
+        await settle()
+        assert started == ["b1", "b2", "a2"]
+        # a3 is woken for this slot but its handler is busy with a2, d must get it
+        gates["b2"].set()
+        await settle()
+        assert started == ["b1", "b2", "a2", "d"]
+        for gate in gates.values():
+            gate.set()
+        await asyncio.gather(*waiting)
+        await runner.drain(1)
+        return started
+
+    assert asyncio.run(scenario()) == ["b1", "b2", "a2", "d", "a3"]
+
+
+def test_cancelled_waiter_passes_its_wakeup_on():
+    async def scenario():
+        runner = HandlerRunner(max_concurrent=1)
+        started, gate, hold = [], asyncio.Event(), asyncio.Event()
+        await runner.submit({}, blocking(started, "first", hold))
+        cancelled = asyncio.ensure_future(runner.submit({}, blocking(started, "cancelled", gate)))
+        waiting = asyncio.ensure_future(runner.submit({}, blocking(started, "next", gate)))
+        await settle()
+        hold.set()
+        # the wakeup reaches the first waiter, which is cancelled before it runs
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await settle()
+        gate.set()
+        await waiting
+        await runner.drain(1)
+        return started
+
+    assert asyncio.run(scenario()) == ["first", "next"]
+
+
+def test_drop_policy():
+    async def scenario():
+        runner = HandlerRunner(max_concurrent=1, overflow_policy=OverflowPolicy.DROP)
+        started, gate = [], asyncio.Event()
+        assert await runner.submit({}, blocking(started, 1, gate)) is not None
+        assert await runner.submit({}, blocking(started, 2, gate)) is None
+        gate.set()
+        await runner.drain(1)
+        return runner.stats()["dropped"], started
+
+    assert asyncio.run(scenario()) == (1, [1])
+
+
+def test_shed_oldest_policy():
+    async def scenario():
+        runner = HandlerRunner(max_concurrent=1, overflow_policy=OverflowPolicy.SHED_OLDEST)
+        started, gate = [], asyncio.Event()
+        first = await runner.submit({}, blocking(started, 1, gate))
+        await settle()
+        second = await runner.submit({}, blocking(started, 2, gate))
+        await settle()
+        gate.set()
+        await runner.drain(1)
+        return first.cancelled(), second.cancelled(), runner.stats()["shed"], started
+
+    assert asyncio.run(scenario()) == (True, False, 1, [1, 2])
+
+
+def test_drain_waits_for_shed_handlers_to_unwind():
+    async def scenario():
+        runner = HandlerRunner(max_concurrent=1, overflow_policy=OverflowPolicy.SHED_OLDEST)
+        unwound = []
+
+        async def slow_to_cancel():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.1)
+                unwound.append(1)
+                raise
+
+        first = await runner.submit({}, slow_to_cancel)
+        await settle()
+        second = asyncio.ensure_future(runner.submit({}, blocking([], 2, asyncio.Event())))
+        await settle()
+        await runner.drain(1)
+        second.cancel()
+        return unwound, first.done()
+
+    assert asyncio.run(scenario()) == ([1], True)
+
+
+def test_timeout():
+    async def scenario():
+        runner = HandlerRunner(default_timeout=0.05)
+        await runner.submit({}, blocking([], 1, asyncio.Event()))
+        await runner.drain(1)
+        return runner.stats()["timed_out"]
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from pyrobale.client import Client
+from pyrobale.filters import Filter
+from pyrobale.StateMachine import SQLiteStorage
+
+from fakebale import message_update
+
+
+class CountingStorage(SQLiteStorage):
+    fetches = 0
+
+    async def _fetch(self, key):
+        self.fetches += 1
+        return await super()._fetch(key)
+
+
+def test_routing_reads_the_state_index(tmp_path):
+    async def scenario():
+        storage = CountingStorage(str(tmp_path / "states.db"))
+        client = Client("T", state_storage=storage)
+        await client.state_machine.open()
+        signup = client.scene("signup")
+        seen = []
+
+        @signup.step("name")
+        async def name(message, ctx):
+            seen.append((ctx.user_id, message.text))
+
+        client.enter_scene(5, signup)
+        for user_id in range(100, 150):
+            assert not await client.scenes.dispatch(message_update(user_id=user_id, chat_id=user_id))
+        assert await client.scenes.dispatch(message_update(user_id=5, chat_id=5, text="Ali"))
+        await client.handler_runner.drain(1)
+        await client.state_machine.close()
+        return storage.fetches, seen
+
+    fetches, seen = asyncio.run(scenario())
+    assert fetches == 0
+    assert seen == [(5, "Ali")]
+
+
+def test_routing_before_open_asks_the_storage(tmp_path):
+    async def scenario():
+        client = Client("T", state_storage=CountingStorage(str(tmp_path / "states.db")))
+        signup = client.scene("signup")
+        signup.add_step("name", lambda message, ctx: None)
+        await client.scenes.dispatch(message_update(user_id=7))
+        return client.state_machine.storage.fetches
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_step_filters_use_the_compiled_path():
+    calls = []
+
+    def only_ali(message, client):
+        calls.append(message.text)
+        return message.text == "Ali"
+
+    async def scenario():
+        client = Client("T")
+        await client.state_machine.open()
+        signup = client.scene("signup")
+        seen = []
+
+        @signup.step("name", Filter(only_ali))
+        async def name(message, ctx):
+            seen.append(message.text)
+
+        client.enter_scene(5, signup)
+        assert not await client.scenes.dispatch(message_update(user_id=5, text="Bob"))
+        assert await client.scenes.dispatch(message_update(user_id=5, text="Ali"))
+        await client.handler_runner.drain(1)
+        await client.state_machine.close()
+        return seen
+
+    assert asyncio.run(scenario()) == ["Ali"]
+    assert calls == ["Bob", "Ali"]
+
+
+def test_restored_scenes_keep_their_remaining_ttl(tmp_path):
+    path = str(tmp_path / "states.db")
+
+    def make_client():
+        client = Client("T", state_storage=SQLiteStorage(path))
+        signup = client.scene("signup")
+        signup.add_step("name", lambda message, ctx: None, ttl=0.2)
+        signup.add_step("age", lambda message, ctx: None, ttl=60)
+        return client, signup
+
+    async def first_run():
+        client, signup = make_client()
+        await client.state_machine.open()
+        client.enter_scene(1, signup)
+        client.enter_scene(2, signup, step="age")
+        await client.state_machine.close()
+
+    async def second_run():
+        client, _ = make_client()
+        await client.state_machine.open()
+        client.scenes.restore()
+        storage = client.state_machine.storage
+        # restoring rewrites nothing but the deletion of the expired state
+        pending = dict(storage._pending), dict(client.state_machine.expiry_storage._pending)
+        expires_in = client.state_machine._expires[2] - time.monotonic()
+        current = client.scenes.current(1), client.scenes.current(2)
+        await client.state_machine.close()
+        return pending, expires_in, current
+
+    asyncio.run(first_run())
+    time.sleep(0.3)
+    pending, expires_in, current = asyncio.run(second_run())
+    assert list(pending[0]) == [1] and list(pending[1]) == [1]
+    assert 50 < expires_in <= 60
+    assert current == (None, ("signup", "age"))
@@ -0,0 +1,52 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from pyrobale.client import Client
+from pyrobale.exceptions import PyroBaleException
+from pyrobale.objects.messageid import MessageId
+
+from fakebale import FakeBale
+
+
+def test_nowait_from_the_loop():
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url)
+            futures = [client.send_message_nowait(1, f"m{i}") for i in range(5)]
+            results = await asyncio.gather(*futures)
+            await client.stop()
+            return results, [data["text"] for data in bale.sent()]
+
+    results, sent = asyncio.run(scenario())
+    assert all(isinstance(result, MessageId) for result in results)
+    assert sorted(sent) == [f"m{i}" for i in range(5)]
+
+
+def test_nowait_from_a_sync_handler_thread():
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url)
+            await client.get_me()
+
+            def handler():
+                future = client.send_message_nowait(1, "from thread")
+                assert isinstance(future, concurrent.futures.Future)
+                return future.result(5)
+
+            result = await asyncio.get_running_loop().run_in_executor(client.handler_executor, handler)
+            loop_tasks = client.sender._loop is asyncio.get_running_loop()
+            await client.stop()
+            return result, loop_tasks, [data["text"] for data in bale.sent()]
+
+    result, on_client_loop, sent = asyncio.run(scenario())
+    assert isinstance(result, MessageId)
+    assert on_client_loop
+    assert sent == ["from thread"]
+
+
+def test_nowait_without_a_loop_fails_clearly():
+    client = Client("T", async_mode=False)
+    with pytest.raises(PyroBaleException):
+        client.send_message_nowait(1, "nowhere")
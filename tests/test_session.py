@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+from pyrobale.client import Client
+
+from fakebale import FakeBale
+
+
+def test_calls_on_the_client_loop_share_one_session():
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url)
+            await client.send_message(1, "a")
+            session = client._session
+            await client.send_message(1, "b")
+            assert client._session is session
+            await client.close_session()
+            assert session.closed
+
+    asyncio.run(scenario())
+
+
+def test_sync_call_from_a_thread_keeps_the_pooled_session():
+    async def scenario():
+        async with FakeBale(delay=0.3) as bale:
+            client = Client("T", base_url=bale.base_url)
+            await client.send_message(1, "warm up")
+            session = client._session
+            in_flight = asyncio.ensure_future(client.send_message(1, "main loop"))
+            await asyncio.sleep(0.05)
+
+            def handler():
+                # what a sync handler does: its own short-lived loop
+                return client.send_message(1, "from thread")
+
+            loop = asyncio.get_running_loop()
+            threaded = await loop.run_in_executor(client.handler_executor, handler)
+            assert threaded.text == "from thread"
+            assert (await in_flight).text == "main loop"
+            assert client._session is session and not session.closed
+            await client.stop()
+
+    asyncio.run(scenario())
+
+
+def test_session_of_a_closed_loop_is_replaced():
+    client = Client("T", async_mode=False)
+
+    async def scenario(close: bool):
+        async with FakeBale() as bale:
+            client.base_url, client.requests_base = bale.base_url, bale.base_url + "T"
+            await client.send_message(1, "a")
+            session = client._session
+            if close:
+                assert not session.closed
+                await client.close_session()
+            return session
+
+    first = asyncio.run(scenario(close=False))
+    second = asyncio.run(scenario(close=True))
+    assert first is not second
+    assert first.closed
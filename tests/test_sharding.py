@@ -0,0 +1,98 @@
+import asyncio
+import os
+
+import pytest
+
+from pyrobale.client import Client
+from pyrobale.sharding import ShardedRunner, shard_key, shard_of
+
+from fakebale import FakeBale, message_update
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="workers are forked")
+
+
+def test_updates_of_a_chat_go_to_one_shard():
+    update = message_update(chat_id=-100123, user_id=5)
+    assert shard_key(update) == -100123
+    assert shard_of(update, 4) == shard_of(message_update(update_id=9, chat_id=-100123, user_id=6), 4)
+    callback = {"update_id": 3, "callback_query": {"id": "q", "from": {"id": 7}, "data": "x"}}
+    assert shard_key(callback) == 7
+    assert shard_of({"update_id": 1, "poll": {}}, 3) in range(3)
+
+
+def make_factory(base_url, directory):
+    def factory():
+        client = Client("T", base_url=base_url)
+
+        @client.on_message()
+        async def echo(message):
+            crash_marker = os.path.join(directory, "crashed")
+            if message.text == "crash" and not os.path.exists(crash_marker):
+                open(crash_marker, "w").close()
+                os._exit(1)
+            # handlers start in dispatch order, their replies may finish in any order
+            with open(os.path.join(directory, f"chat{message.chat.id}"), "a") as log:
+                log.write(f"{os.getpid()}:{message.text}\n")
+            await message.reply(f"{os.getpid()}:{message.text}")
+
+        return client
+
+    return factory
+
+
+def handled(directory, chat_id):
+    path = os.path.join(directory, f"chat{chat_id}")
+    if not os.path.exists(path):
+        return []
+    with open(path) as log:
+        return [tuple(line.split(":")) for line in log.read().split()]
+
+
+def run_runner(bale, updates, directory, done):
+    bale.updates = updates
+
+    async def scenario():
+        async with bale:
+            runner = ShardedRunner(make_factory(bale.base_url, directory), workers=2, drain_timeout=5,
+                                   mp_context="fork")
+            runner.start_workers()
+            polling = asyncio.ensure_future(runner.poll(timeout=0))
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + 15
+            while not done(bale.sent()) and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+            runner.stop()
+            await polling
+            await loop.run_in_executor(None, runner.stop_workers)
+            return runner
+
+    return asyncio.run(scenario())
+
+
+def test_chats_keep_their_worker_and_order(tmp_path):
+    bale = FakeBale()
+    updates = [message_update(update_id=i, chat_id=i % 4 + 1, text=str(i)) for i in range(1, 21)]
+    runner = run_runner(bale, updates, str(tmp_path), lambda sent: len(sent) == 20)
+
+    assert len(bale.sent()) == 20
+    for chat_id in range(1, 5):
+        chat = handled(str(tmp_path), chat_id)
+        assert len({pid for pid, _ in chat}) == 1
+        assert [int(text) for _, text in chat] == [i for i in range(1, 21) if i % 4 + 1 == chat_id]
+    assert sum(runner.stats()["dispatched"]) == 20
+    assert runner.stats()["alive"] == 0
+
+
+def test_a_crashed_worker_is_restarted(tmp_path):
+    bale = FakeBale()
+    updates = [message_update(update_id=1, chat_id=1, text="crash")]
+    updates += [message_update(update_id=i, chat_id=1, text=str(i)) for i in range(2, 6)]
+    last_sent = lambda sent: any(data["text"].endswith(":5") for data in sent)
+    runner = run_runner(bale, updates, str(tmp_path), last_sent)
+
+    texts = [text for _, text in handled(str(tmp_path), 1)]
+    # updates whose handlers were running when the worker died are lost, queued ones are not
+    assert texts[-3:] == ["3", "4", "5"]
+    assert texts == sorted(texts)
+    assert len({pid for pid, _ in handled(str(tmp_path), 1)}) == 1
+    assert sum(runner.stats()["restarts"]) == 1
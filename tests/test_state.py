@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from pyrobale.StateMachine import StateMachine
+
+
+def test_states_expire_after_their_ttl():
+    expired = []
+    machine = StateMachine(ttl=0.05, on_expire=lambda *args: expired.append(args))
+    machine.set_state(1, "menu")
+    machine.set_state(2, "cart", ttl=None)
+    machine.set_state(3, "pay", ttl=10)
+    time.sleep(0.06)
+
+    with pytest.raises(KeyError):
+        machine.get_state(1)
+    assert machine.get_state(2) == "cart"
+    assert machine.get_state(3) == "pay"
+    assert expired == [(1, "menu", "expired")]
+    assert machine.expire_due() == 0
+
+
+def test_setting_a_state_again_restarts_its_ttl():
+    machine = StateMachine(ttl=0.05)
+    machine.set_state(1, "menu")
+    time.sleep(0.03)
+    machine.set_state(1, "cart")
+    time.sleep(0.03)
+
+    assert machine.expire_due() == 0
+    assert machine.get_state(1) == "cart"
+
+
+def test_least_recently_used_states_are_evicted():
+    dropped = []
+    machine = StateMachine(max_size=2, on_expire=lambda *args: dropped.append(args))
+    machine.set_state(1, "a")
+    machine.set_state(2, "b")
+    machine.get_state(1)
+    machine.set_state(3, "c")
+
+    assert dropped == [(2, "b", "evicted")]
+    assert machine.get_state(1) == "a"
+    with pytest.raises(KeyError):
+        machine.get_state(2)
+
+
+def test_the_sweeper_calls_async_callbacks():
+    async def scenario():
+        expired = []
+
+        async def on_expire(user_id, state, reason):
+            expired.append((user_id, state, reason))
+
+        machine = StateMachine(ttl=0.05, on_expire=on_expire, sweep_interval=0.02)
+        await machine.open()
+        machine.set_state(1, "menu")
+        await asyncio.sleep(0.15)
+        await machine.close()
+        return expired
+
+    assert asyncio.run(scenario()) == [(1, "menu", "expired")]
+
+
+def test_update_data_changes_some_fields():
+    machine = StateMachine()
+    machine.set_data({"name": "Ali"}, user_id=1)
+    assert machine.update_data(user_id=1, age=30) == {"name": "Ali", "age": 30}
+    assert machine.get_data(user_id=1) == {"name": "Ali", "age": 30}
+    # user, chat and user in chat data are kept apart
+    machine.update_data(chat_id=1, title="group")
+    machine.update_data(user_id=1, chat_id=1, role="admin")
+    assert machine.get_data(chat_id=1) == {"title": "group"}
+    assert machine.get_data(user_id=1, chat_id=1) == {"role": "admin"}
+
+
+def test_data_read_is_a_copy():
+    machine = StateMachine()
+    machine.set_data({"items": [1]}, user_id=1)
+    data = machine.get_data(user_id=1)
+    data["items"].append(2)
+    assert machine.get_data(user_id=1) == {"items": [1]}
+
+
+def test_compare_and_set():
+    machine = StateMachine()
+    assert machine.compare_and_set(None, {"step": 1}, user_id=1)
+    before = machine.get_data(user_id=1)
+    # another handler changed the data meanwhile
+    machine.update_data(user_id=1, step=2)
+    assert not machine.compare_and_set(before, {"step": 3}, user_id=1)
+    assert machine.get_data(user_id=1) == {"step": 2}
+    assert machine.compare_and_set({"step": 2}, {"step": 3}, user_id=1)
+    assert machine.get_data(user_id=1) == {"step": 3}
+
+
+def test_empty_data_is_deleted_and_snapshots_restore_it(tmp_path):
+    machine = StateMachine()
+    machine.set_data({"a": 1}, user_id=1)
+    machine.set_state(1, "menu")
+    snapshot = str(tmp_path / "snapshot")
+    machine.save_snapshot(snapshot)
+    machine.set_data({}, user_id=1)
+    assert not machine.del_data(user_id=1)
+
+    restored = StateMachine()
+    restored.load_snapshot(snapshot)
+    assert restored.get_data(user_id=1) == {"a": 1}
+    assert restored.get_state(1) == "menu"
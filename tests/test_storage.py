@@ -0,0 +1,84 @@
+import asyncio
+import sqlite3
+
+from pyrobale.StateMachine import SQLiteStorage, StateMachine
+
+
+class CountingStorage(SQLiteStorage):
+    fetches = 0
+
+    async def _fetch(self, key):
+        self.fetches += 1
+        return await super()._fetch(key)
+
+
+def test_absent_keys_are_fetched_once(tmp_path):
+    async def scenario():
+        storage = CountingStorage(str(tmp_path / "s.db"))
+        await storage.open()
+        for _ in range(20):
+            assert await storage.get(1, "none") == "none"
+        assert storage.fetches == 1
+
+        storage.set_nowait(1, "menu")
+        assert await storage.get(1) == "menu"
+        storage.delete_nowait(1)
+        await storage.flush()
+        assert await storage.get(1) is None
+        assert storage.fetches == 1
+        await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_misses_expire_to_see_other_processes(tmp_path):
+    path = str(tmp_path / "s.db")
+
+    async def scenario():
+        reader = CountingStorage(path)
+        reader.miss_ttl = 0.05
+        await reader.open()
+        assert await reader.get(7) is None
+
+        writer = SQLiteStorage(path)
+        await writer.open()
+        writer.set_nowait(7, "written elsewhere")
+        await writer.close()
+
+        assert await reader.get(7) is None
+        await asyncio.sleep(0.06)
+        assert await reader.get(7) == "written elsewhere"
+        assert reader.fetches == 2
+        await reader.close()
+
+    asyncio.run(scenario())
+
+
+def test_fetch_state_of_stateless_users_stays_in_memory(tmp_path):
+    async def scenario():
+        storage = CountingStorage(str(tmp_path / "s.db"))
+        machine = StateMachine(storage)
+        await machine.open()
+        for _ in range(10):
+            assert await machine.fetch_state(42) is None
+        await machine.close()
+        return storage.fetches
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_writes_from_threads_are_flushed(tmp_path):
+    path = str(tmp_path / "s.db")
+
+    async def scenario():
+        storage = SQLiteStorage(path, flush_interval=0.1)
+        await storage.open()
+        await asyncio.get_running_loop().run_in_executor(None, storage.set_nowait, 1, "menu")
+        assert storage.get_nowait(1) == "menu"
+        await asyncio.sleep(0.5)
+        with sqlite3.connect(path) as connection:
+            rows = connection.execute("SELECT key, value FROM states").fetchall()
+        await storage.close()
+        return rows
+
+    assert asyncio.run(scenario()) == [("1", "menu")]
@@ -0,0 +1,21 @@
+import asyncio
+
+from pyrobale.client import Client
+from pyrobale.tracing import InMemorySpanExporter, Tracer
+
+from fakebale import FakeBale
+
+
+def test_api_call_spans_are_named_by_method():
+    exporter = InMemorySpanExporter()
+
+    async def scenario():
+        async with FakeBale() as bale:
+            client = Client("T", base_url=bale.base_url, tracer=Tracer(exporter))
+            await client.make_get(f"{client.requests_base}/sendSticker?chat_id=1&sticker=file-id")
+            await client.send_message(1, "hi")
+            await client.close_session()
+
+    asyncio.run(scenario())
+    methods = [span.attributes["method"] for span in exporter.get_spans("api_call")]
+    assert methods == ["sendSticker", "sendMessage"]